@@ -0,0 +1,158 @@
+"""Message throughput of the A2A transports of the Python agents.
+
+Sends the same A2A messages to minimal_a2a_agent and instag_runpod_agent (real
+uvicorn servers) over each transport and reports messages per second:
+
+    post        one message per POST /api/a2a, on keep-alive connections
+    batch       arrays of --batch-size messages per POST /api/a2a/batch
+    ws-json     the /api/a2a/ws channel, JSON text frames, --window messages in flight per connection
+    ws-msgpack  the same channel with the a2a.msgpack subprotocol (binary frames)
+
+    python bench_a2a_channel.py --messages 5000 --connections 4 --output channel.json
+"""
+import argparse
+import asyncio
+import json
+import platform
+import sys
+import time
+from typing import Any, Callable, Dict, List
+
+import msgpack
+from websockets.asyncio.client import connect
+
+from bench_a2a_load import AGENTS, _git_commit, _http_client, uvicorn_server
+
+RESULTS_VERSION = 1
+TRANSPORTS = ("post", "batch", "ws-json", "ws-msgpack")
+
+
+def _message(agent: str, n: int) -> Dict[str, Any]:
+    # A message both agents answer straight away, so the transport is what gets measured.
+    return {"type": "agent_discovery_request", "sender": "bench", "recipient": agent,
+            "payload": {"task_id": f"bench-{n}"}, "ref": n}
+
+
+def _split(total: int, parts: int) -> List[int]:
+    return [total // parts + (1 if i < total % parts else 0) for i in range(parts)]
+
+
+async def bench_post(base_url: str, messages: List[Dict[str, Any]], connections: int) -> int:
+    client = _http_client(base_url, connections)
+    queue = iter(messages)
+    replies = 0
+
+    async def worker():
+        nonlocal replies
+        for message in queue:
+            r = await client.post("/api/a2a", content=json.dumps(message), headers={"content-type": "application/json"})
+            replies += r.status_code == 200
+    try:
+        await asyncio.gather(*(worker() for _ in range(connections)))
+    finally:
+        await client.aclose()
+    return replies
+
+
+async def bench_batch(base_url: str, messages: List[Dict[str, Any]], connections: int, batch_size: int) -> int:
+    client = _http_client(base_url, connections)
+    queue = iter([messages[i:i + batch_size] for i in range(0, len(messages), batch_size)])
+    replies = 0
+
+    async def worker():
+        nonlocal replies
+        for batch in queue:
+            r = await client.post("/api/a2a/batch", content=msgpack.packb(batch),
+                                  headers={"content-type": "application/msgpack", "accept": "application/msgpack"})
+            replies += len(msgpack.unpackb(r.content))
+    try:
+        await asyncio.gather(*(worker() for _ in range(connections)))
+    finally:
+        await client.aclose()
+    return replies
+
+
+async def bench_channel(base_url: str, messages: List[Dict[str, Any]], connections: int, window: int,
+                        subprotocol: str) -> int:
+    dumps: Callable[[Any], Any] = msgpack.packb if subprotocol == "a2a.msgpack" else json.dumps
+    loads: Callable[[Any], Any] = msgpack.unpackb if subprotocol == "a2a.msgpack" else json.loads
+    url = base_url.replace("http://", "ws://") + "/api/a2a/ws"
+    counts = _split(len(messages), connections)
+    offsets = [sum(counts[:i]) for i in range(connections)]
+
+    async def one(part: List[Dict[str, Any]]) -> int:
+        async with connect(url, subprotocols=[subprotocol], compression=None, max_size=None) as ws:
+            assert ws.subprotocol == subprotocol, f"server did not accept {subprotocol}"
+            credit = asyncio.Semaphore(window)
+
+            async def send():
+                for message in part:
+                    await credit.acquire()
+                    await ws.send(dumps(message))
+
+            sender = asyncio.ensure_future(send())
+            received = 0
+            while received < len(part):
+                reply = loads(await ws.recv())
+                if "ref" in reply:
+                    received += 1
+                    credit.release()
+            await sender
+            return received
+
+    done = await asyncio.gather(*(one(messages[o:o + c]) for o, c in zip(offsets, counts)))
+    return sum(done)
+
+
+async def run(base_url: str, transport: str, agent: str, args) -> Dict[str, Any]:
+    async def once(count: int) -> int:
+        messages = [_message(agent, n) for n in range(count)]
+        if transport == "post":
+            return await bench_post(base_url, messages, args.connections)
+        if transport == "batch":
+            return await bench_batch(base_url, messages, args.connections, args.batch_size)
+        return await bench_channel(base_url, messages, args.connections, args.window, f"a2a.{transport[3:]}")
+
+    await once(min(500, args.messages))  # warm-up
+    started = time.perf_counter()
+    replies = await once(args.messages)
+    elapsed = time.perf_counter() - started
+    return {"agent": agent, "transport": transport, "messages": args.messages, "replies": replies,
+            "connections": args.connections, "seconds": round(elapsed, 3),
+            "messages_per_second": round(args.messages / elapsed, 1)}
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--agents", nargs="+", choices=list(AGENTS), default=list(AGENTS))
+    parser.add_argument("--transports", nargs="+", choices=TRANSPORTS, default=list(TRANSPORTS))
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--connections", type=int, default=4, help="Concurrent HTTP connections / WebSocket channels")
+    parser.add_argument("--batch-size", type=int, default=100)
+    parser.add_argument("--window", type=int, default=64, help="Messages in flight per WebSocket channel")
+    parser.add_argument("--output", help="Write results as JSON")
+    args = parser.parse_args(argv)
+
+    results = []
+    for agent in args.agents:
+        spec = AGENTS[agent]
+        with uvicorn_server(spec["app"], spec["health"], 1) as (base_url, _):
+            baseline = None
+            for transport in args.transports:
+                result = asyncio.run(run(base_url, transport, agent, args))
+                if transport == "post":
+                    baseline = result["messages_per_second"]
+                if baseline:
+                    result["speedup_vs_post"] = round(result["messages_per_second"] / baseline, 2)
+                results.append(result)
+                print(f"{agent:<20} {transport:<11} {result['messages_per_second']:>10.1f} msg/s"
+                      f"  {result.get('speedup_vs_post', '-')}x vs post  replies {result['replies']}/{args.messages}")
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"version": RESULTS_VERSION, "commit": _git_commit(), "python": sys.version.split()[0],
+                       "platform": platform.platform(), "args": vars(args), "results": results}, f, indent=2)
+    return 0 if all(r["replies"] == r["messages"] for r in results) else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,481 @@
+"""Load and latency benchmark for the Python A2A agents.
+
+Drives minimal_a2a_agent and instag_runpod_agent with a weighted mix of A2A
+messages (task_request, streaming task_request, task_chunk, agent_event,
+agent_discovery_request and malformed messages), either in-process by calling
+the ASGI app directly or over HTTP against real uvicorn workers. Reports
+throughput, p50/p95/p99 latency per message kind, time to first byte for
+streamed replies and memory per open connection, and writes everything to a
+JSON file that later runs can be compared against:
+
+    python bench_a2a_load.py --mode asgi uvicorn --requests 2000 --concurrency 32 --output results.json
+    python bench_a2a_load.py --requests 2000 --compare results.json   # exits 1 on regression
+"""
+import argparse
+import asyncio
+import contextlib
+import gc
+import itertools
+import json
+import os
+import platform
+import random
+import socket
+import subprocess
+import sys
+import time
+import tracemalloc
+from typing import Any, Callable, Dict, List, Optional
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+RESULTS_VERSION = 1
+
+
+def _minimal_messages(n: int) -> Dict[str, Dict[str, Any]]:
+    base = {"sender": "bench", "recipient": "pyagent1"}
+    return {
+        "task_request": {**base, "type": "task_request", "payload": {"task_id": f"t{n}"}},
+        "stream_task_request": {**base, "type": "task_request", "payload": {"task_id": f"t{n}", "stream": True}},
+        "task_chunk": {**base, "type": "task_chunk", "payload": {"chunk_id": f"c{n}"}},
+        "agent_event": {**base, "type": "agent_event", "payload": {"event_id": f"e{n}", "detail": "bench"}},
+        "agent_discovery_request": {**base, "type": "agent_discovery_request", "payload": {}},
+        "malformed": {**base, "type": [None, 123][n % 2], "payload": {}} if n % 3 else {**base, "payload": {}},
+    }
+
+
+def _instag_messages(n: int) -> Dict[str, Dict[str, Any]]:
+    # Mock operations (no pod SSH endpoint) so the agent itself is measured, not a pod.
+    task = {"task_id": f"bench-{os.getpid()}-{n}", "operation": "instag_setup_environment",
+            "params": {"pod_id": f"bench-pod-{n}"}}
+    return {
+        "task_request": {"type": "task_request", "payload": task},
+        "stream_task_request": {"type": "task_request", "payload": {**task, "stream": True}},
+        "task_chunk": {"type": "task_chunk", "payload": {"task_id": task["task_id"], "data": "partial"}},
+        "agent_event": {"type": "agent_event", "payload": {"task_id": task["task_id"], "detail": "bench"}},
+        "agent_discovery_request": {"type": "agent_discovery_request", "payload": {"task_id": task["task_id"]}},
+        "malformed": {"payload": {}} if n % 2 else {"type": 123, "payload": {}},
+    }
+
+
+AGENTS = {
+    "minimal_a2a_agent": {"app": "minimal_a2a_agent.app.main:app", "health": "/api/agent_card",
+                          "messages": _minimal_messages},
+    "instag_runpod_agent": {"app": "instag_runpod_agent.app.main:app", "health": "/",
+                            "messages": _instag_messages},
+}
+
+DEFAULT_MIX = {"task_request": 25, "stream_task_request": 5, "task_chunk": 5, "agent_event": 25,
+               "agent_discovery_request": 30, "malformed": 10}
+
+
+def _import_app(target: str):
+    module, attr = target.split(":")
+    if HERE not in sys.path:
+        sys.path.insert(0, HERE)
+    return getattr(__import__(module, fromlist=[attr]), attr)
+
+
+class Sample:
+    __slots__ = ("kind", "status", "latency", "ttfb", "size")
+
+    def __init__(self, kind: str, status: int, latency: float, ttfb: float, size: int):
+        self.kind = kind
+        self.status = status
+        self.latency = latency
+        self.ttfb = ttfb
+        self.size = size
+
+
+class ASGIClient:
+    """Calls the app directly with ASGI messages and records when the first body byte is sent.
+
+    httpx's ASGITransport buffers the whole body before returning, which would hide
+    time to first byte for streamed replies.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def post(self, path: str, body: bytes) -> Dict[str, Any]:
+        started = time.perf_counter()
+        first: Optional[float] = None
+        status, size, sent = 0, 0, False
+        done = asyncio.Event()
+
+        async def receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": body, "more_body": False}
+            await done.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal status, size, first
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                if message.get("body"):
+                    size += len(message["body"])
+                    if first is None:
+                        first = time.perf_counter()
+                if not message.get("more_body", False):
+                    done.set()
+
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST",
+                 "scheme": "http", "path": path, "raw_path": path.encode(), "query_string": b"", "root_path": "",
+                 "headers": [(b"host", b"bench"), (b"content-type", b"application/json"),
+                             (b"content-length", str(len(body)).encode())],
+                 "server": ("bench", 80), "client": ("127.0.0.1", 0)}
+        await self.app(scope, receive, send)
+        done.set()
+        end = time.perf_counter()
+        return {"status": status, "ttfb": (first or end) - started, "latency": end - started, "size": size}
+
+    async def aclose(self):
+        pass
+
+
+def _http_client(base_url: str, connections: int = 1) -> httpx.AsyncClient:
+    # httpx writes request headers and body separately; without TCP_NODELAY, Nagle plus
+    # delayed ACKs add ~40 ms to every request and swamp what is being measured.
+    transport = httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+        socket_options=[(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)])
+    return httpx.AsyncClient(base_url=base_url, transport=transport, timeout=60.0)
+
+
+class HTTPClient:
+    def __init__(self, base_url: str, concurrency: int):
+        self.client = _http_client(base_url, concurrency)
+
+    async def post(self, path: str, body: bytes) -> Dict[str, Any]:
+        started = time.perf_counter()
+        first: Optional[float] = None
+        size = 0
+        async with self.client.stream("POST", path, content=body, headers={"content-type": "application/json"}) as r:
+            async for chunk in r.aiter_raw():
+                if first is None:
+                    first = time.perf_counter()
+                size += len(chunk)
+        end = time.perf_counter()
+        return {"status": r.status_code, "ttfb": (first or end) - started, "latency": end - started, "size": size}
+
+    async def aclose(self):
+        await self.client.aclose()
+
+
+async def run_load(client, messages: Callable[[int], Dict[str, Dict[str, Any]]], mix: Dict[str, int],
+                   requests: int, concurrency: int, seed: int = 0) -> Dict[str, Any]:
+    rng = random.Random(seed)
+    kinds = rng.choices(list(mix), weights=list(mix.values()), k=requests)
+    counter = itertools.count()
+    samples: List[Sample] = []
+    errors: Dict[str, int] = {}
+
+    async def worker():
+        while True:
+            n = next(counter)
+            if n >= requests:
+                return
+            kind = kinds[n]
+            body = json.dumps(messages(n)[kind]).encode()
+            try:
+                r = await client.post("/api/a2a", body)
+            except Exception as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                continue
+            samples.append(Sample(kind, r["status"], r["latency"], r["ttfb"], r["size"]))
+            if r["status"] >= 500:
+                errors[f"http_{r['status']}"] = errors.get(f"http_{r['status']}", 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return summarize(samples, elapsed, errors)
+
+
+def _percentiles(values: List[float]) -> Dict[str, float]:
+    if not values:
+        return {}
+    ms = sorted(v * 1000 for v in values)
+
+    def at(q: float) -> float:
+        # Linear interpolation between closest ranks (numpy's default method).
+        pos = (len(ms) - 1) * q
+        low = int(pos)
+        high = min(low + 1, len(ms) - 1)
+        return round(ms[low] + (ms[high] - ms[low]) * (pos - low), 3)
+
+    return {"p50": at(0.50), "p95": at(0.95), "p99": at(0.99), "mean": round(sum(ms) / len(ms), 3),
+            "max": round(ms[-1], 3)}
+
+
+def summarize(samples: List[Sample], elapsed: float, errors: Dict[str, int]) -> Dict[str, Any]:
+    by_kind = {}
+    for kind in sorted({s.kind for s in samples}):
+        group = [s for s in samples if s.kind == kind]
+        by_kind[kind] = {
+            "requests": len(group),
+            "statuses": {str(code): sum(1 for s in group if s.status == code) for code in sorted({s.status for s in group})},
+            "latency_ms": _percentiles([s.latency for s in group]),
+            "ttfb_ms": _percentiles([s.ttfb for s in group]),
+            "bytes_mean": round(sum(s.size for s in group) / len(group), 1),
+        }
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "seconds": round(elapsed, 3),
+        "throughput_rps": round(len(samples) / elapsed, 2) if elapsed else 0.0,
+        "latency_ms": _percentiles([s.latency for s in samples]),
+        "by_kind": by_kind,
+    }
+
+
+def _rss_kb(pid: int) -> int:
+    """Resident memory of a process and all of its descendants (uvicorn workers), from /proc."""
+    total = 0
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            total = next(int(line.split()[1]) for line in f if line.startswith("VmRSS:"))
+        for task in os.listdir(f"/proc/{pid}/task"):
+            with open(f"/proc/{pid}/task/{task}/children") as f:
+                total += sum(_rss_kb(int(child)) for child in f.read().split())
+    except (OSError, StopIteration):
+        pass
+    return total
+
+
+async def memory_per_connection_http(base_url: str, server_pid: int, health: str, connections: int,
+                                     stream_body: Optional[bytes]) -> Dict[str, Any]:
+    """Server RSS growth per idle keep-alive connection, and per in-flight streamed reply."""
+    result: Dict[str, Any] = {"connections": connections}
+    before = _rss_kb(server_pid)
+    clients = [_http_client(base_url) for _ in range(connections)]
+    try:
+        await asyncio.gather(*(c.get(health) for c in clients))
+        await asyncio.sleep(0.5)
+        result["idle_keepalive_kb"] = round((_rss_kb(server_pid) - before) / connections, 2)
+        if stream_body is not None:
+            before = _rss_kb(server_pid)
+            streams = [c.stream("POST", "/api/a2a", content=stream_body, headers={"content-type": "application/json"})
+                       for c in clients]
+            responses = await asyncio.gather(*(s.__aenter__() for s in streams))
+            await asyncio.gather(*(r.aiter_raw().__anext__() for r in responses))
+            result["open_stream_kb"] = round((_rss_kb(server_pid) - before) / connections, 2)
+            await asyncio.gather(*(s.__aexit__(None, None, None) for s in streams))
+    finally:
+        await asyncio.gather(*(c.aclose() for c in clients))
+    return result
+
+
+async def memory_per_connection_asgi(app, connections: int, stream_body: Optional[bytes]) -> Dict[str, Any]:
+    """Python heap held per in-flight streamed reply (tracemalloc), with each stream paused after its first frame."""
+    if stream_body is None:
+        return {"connections": connections}
+    release = asyncio.Event()
+    started = 0
+    all_started = asyncio.Event()
+
+    async def one():
+        nonlocal started
+        counted = False
+
+        async def receive():
+            await release.wait()
+            return {"type": "http.disconnect"}
+
+        async def send(message):
+            nonlocal started, counted
+            if message["type"] == "http.response.body" and message.get("body") and not counted:
+                counted = True
+                started += 1
+                if started == connections:
+                    all_started.set()
+                await release.wait()
+
+        scope = {"type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "POST", "scheme": "http",
+                 "path": "/api/a2a", "raw_path": b"/api/a2a", "query_string": b"", "root_path": "",
+                 "headers": [(b"content-type", b"application/json")], "server": ("bench", 80), "client": ("127.0.0.1", 0)}
+        sent = False
+
+        async def first_receive():
+            nonlocal sent
+            if not sent:
+                sent = True
+                return {"type": "http.request", "body": stream_body, "more_body": False}
+            return await receive()
+
+        with contextlib.suppress(Exception):
+            await app(scope, first_receive, send)
+
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    tasks = [asyncio.ensure_future(one()) for _ in range(connections)]
+    await asyncio.wait_for(all_started.wait(), 60)
+    held = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+    release.set()
+    await asyncio.gather(*tasks)
+    return {"connections": connections, "open_stream_kb": round(held / connections / 1024, 2)}
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+@contextlib.contextmanager
+def uvicorn_server(target: str, health: str, workers: int):
+    port = _free_port()
+    proc = subprocess.Popen([sys.executable, "-m", "uvicorn", target, "--port", str(port), "--workers", str(workers),
+                             "--log-level", "warning", "--no-access-log"],
+                            cwd=HERE, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    base_url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if httpx.get(base_url + health, timeout=1.0).status_code < 500:
+                    break
+            except httpx.TransportError:
+                pass
+            if proc.poll() is not None or time.monotonic() > deadline:
+                raise RuntimeError(f"uvicorn {target} did not start")
+            time.sleep(0.2)
+        time.sleep(0.5 * workers)  # let every worker finish importing before measuring
+        yield base_url, proc.pid
+    finally:
+        proc.terminate()
+        proc.wait(10)
+
+
+async def bench_asgi(name: str, spec: Dict[str, Any], args) -> Dict[str, Any]:
+    app = _import_app(spec["app"])
+    client = ASGIClient(app)
+    await run_load(client, spec["messages"], args.mix, min(200, args.requests), args.concurrency, seed=1)  # warm-up
+    result = await run_load(client, spec["messages"], args.mix, args.requests, args.concurrency)
+    stream_body = json.dumps(spec["messages"](10 ** 9)["stream_task_request"]).encode()
+    result["memory"] = await memory_per_connection_asgi(app, args.connections, stream_body)
+    return {"agent": name, "mode": "asgi", "workers": 1, "concurrency": args.concurrency, **result}
+
+
+async def bench_uvicorn(name: str, spec: Dict[str, Any], args, base_url: str, pid: int) -> Dict[str, Any]:
+    client = HTTPClient(base_url, args.concurrency)
+    try:
+        await run_load(client, spec["messages"], args.mix, min(200, args.requests), args.concurrency, seed=1)
+        result = await run_load(client, spec["messages"], args.mix, args.requests, args.concurrency)
+    finally:
+        await client.aclose()
+    stream_body = json.dumps(spec["messages"](10 ** 9)["stream_task_request"]).encode()
+    result["memory"] = await memory_per_connection_http(base_url, pid, spec["health"], args.connections, stream_body)
+    result["memory"]["server_rss_kb"] = _rss_kb(pid)
+    return {"agent": name, "mode": "uvicorn", "workers": args.workers, "concurrency": args.concurrency, **result}
+
+
+def compare(results: List[Dict[str, Any]], baseline_path: str, tolerance: float, min_delta_ms: float = 1.0) -> List[str]:
+    """Regressions against a previous results file: throughput down or p99 up by more than tolerance
+    (p99 changes under min_delta_ms are ignored as noise on sub-millisecond requests)."""
+    with open(baseline_path) as f:
+        baseline = {(r["agent"], r["mode"], r["workers"], r["concurrency"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        old = baseline.get((r["agent"], r["mode"], r["workers"], r["concurrency"]))
+        if old is None:
+            continue
+        label = f"{r['agent']}/{r['mode']}"
+        if r["throughput_rps"] < old["throughput_rps"] * (1 - tolerance):
+            regressions.append(f"{label}: throughput {old['throughput_rps']} -> {r['throughput_rps']} req/s")
+        for kind, stats in r["by_kind"].items():
+            before = old["by_kind"].get(kind, {}).get("latency_ms", {}).get("p99")
+            after = stats["latency_ms"]["p99"]
+            if before and after > before * (1 + tolerance) and after - before > min_delta_ms:
+                regressions.append(f"{label} {kind}: p99 {before} -> {after} ms")
+    return regressions
+
+
+def report(result: Dict[str, Any]):
+    lat = result["latency_ms"]
+    print(f"\n{result['agent']} [{result['mode']}, workers={result['workers']}, concurrency={result['concurrency']}]"
+          f"  {result['throughput_rps']:.1f} req/s  p50 {lat['p50']:.2f} ms  p95 {lat['p95']:.2f} ms  p99 {lat['p99']:.2f} ms"
+          f"  errors {sum(result['errors'].values())}")
+    for kind, stats in result["by_kind"].items():
+        print(f"  {kind:<26} {stats['requests']:>6}  p50 {stats['latency_ms']['p50']:9.2f}  p95 {stats['latency_ms']['p95']:9.2f}"
+              f"  p99 {stats['latency_ms']['p99']:9.2f} ms  ttfb p50 {stats['ttfb_ms']['p50']:9.2f} ms  {stats['statuses']}")
+    print(f"  memory per connection: {result['memory']}")
+
+
+def _git_commit() -> Optional[str]:
+    with contextlib.suppress(Exception):
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=HERE, capture_output=True, text=True).stdout.strip() or None
+    return None
+
+
+def _parse_mix(text: Optional[str]) -> Dict[str, int]:
+    if not text:
+        return DEFAULT_MIX
+    mix = {}
+    for part in text.split(","):
+        kind, weight = part.split("=")
+        if kind not in DEFAULT_MIX:
+            raise SystemExit(f"Unknown message kind {kind!r}; choose from {', '.join(DEFAULT_MIX)}")
+        mix[kind] = int(weight)
+    return mix
+
+
+async def main(args) -> int:
+    results = []
+    for name in args.agents:
+        spec = AGENTS[name]
+        if "asgi" in args.mode:
+            with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+                result = await bench_asgi(name, spec, args)
+            report(result)
+            results.append(result)
+        if "uvicorn" in args.mode:
+            with uvicorn_server(spec["app"], spec["health"], args.workers) as (base_url, pid):
+                result = await bench_uvicorn(name, spec, args, base_url, pid)
+            report(result)
+            results.append(result)
+
+    document = {
+        "version": RESULTS_VERSION,
+        "timestamp": time.time(),
+        "git_commit": _git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "config": {"requests": args.requests, "concurrency": args.concurrency, "workers": args.workers,
+                   "connections": args.connections, "mix": args.mix},
+        "results": results,
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(document, f, indent=2)
+        print(f"\nwrote {args.output}")
+    if args.compare:
+        regressions = compare(results, args.compare, args.tolerance)
+        for line in regressions:
+            print(f"REGRESSION {line}")
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--agents", nargs="+", choices=list(AGENTS), default=list(AGENTS))
+    parser.add_argument("--mode", nargs="+", choices=["asgi", "uvicorn"], default=["asgi", "uvicorn"])
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=2, help="uvicorn worker processes")
+    parser.add_argument("--connections", type=int, default=50, help="open connections for the memory measurement")
+    parser.add_argument("--mix", type=_parse_mix, default=DEFAULT_MIX,
+                        help="message weights, e.g. task_request=5,agent_event=1 (default: %(default)s)")
+    parser.add_argument("--output", help="write machine-readable results (JSON) here")
+    parser.add_argument("--compare", help="previous results file; exit 1 if throughput or p99 regressed")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative regression")
+    sys.exit(asyncio.run(main(parser.parse_args())))
@@ -0,0 +1,98 @@
+# A2A message validation and wire encodings for the batch endpoint and WebSocket channel.
+# Validation mirrors A2aAgentWebWeb.A2AMessage.validate/1 on the Elixir side (same
+# required fields, type list and error strings) and is built once per agent, so
+# checking a message is a few set lookups. Messages are JSON by default; msgpack is
+# used when the client asks for it (WebSocket subprotocol or Content-Type/Accept)
+# and the msgpack package is installed.
+
+import json
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional
+    msgpack = None
+
+# A2aAgentWebWeb.A2AMessage: @enforce_keys and @allowed_types.
+REQUIRED_FIELDS = ("type", "sender", "recipient", "payload")
+ALLOWED_TYPES = ("task_request", "result", "status_update", "agent_discovery", "negotiation")
+
+Validator = Callable[[Any], Optional[str]]
+
+
+def compile_validator(extra_types: Iterable[str] = ()) -> Validator:
+    """Build validate(message) -> error string or None for the Elixir types plus this agent's own."""
+    required = REQUIRED_FIELDS
+    allowed = frozenset(ALLOWED_TYPES) | frozenset(extra_types)
+    listing = "[" + ", ".join(f":{t}" for t in (*ALLOWED_TYPES, *sorted(set(extra_types) - set(ALLOWED_TYPES)))) + "]"
+
+    def validate(message: Any) -> Optional[str]:
+        if not isinstance(message, dict):
+            return "Message must be an object"
+        missing = [field for field in required if field not in message]
+        if missing:
+            return f"Missing required fields: {', '.join(missing)}"
+        message_type = message["type"]
+        if not isinstance(message_type, str) or message_type not in allowed:
+            return f"Invalid type: {json.dumps(message_type)}. Allowed types: {listing}"
+        payload = message["payload"]
+        if payload is not None and not isinstance(payload, dict):
+            return "Invalid payload: must be an object"
+        task_id = message.get("task_id")
+        if task_id is not None and not isinstance(task_id, str):
+            return "Invalid task_id: must be a string"
+        return None
+
+    return validate
+
+
+class Codec:
+    """One wire encoding: its WebSocket subprotocol / media type and how to (de)serialize."""
+
+    def __init__(self, name: str, media_type: str, binary: bool, dumps: Callable[[Any], Any],
+                 loads: Callable[[Any], Any]):
+        self.name = name
+        self.media_type = media_type
+        self.binary = binary
+        self.dumps = dumps
+        self.loads = loads
+
+
+JSON = Codec("a2a.json", "application/json", False,
+             lambda value: json.dumps(value, separators=(",", ":"), default=str), json.loads)
+CODECS: Dict[str, Codec] = {JSON.name: JSON}
+if msgpack is not None:
+    MSGPACK = Codec("a2a.msgpack", "application/msgpack", True,
+                    lambda value: msgpack.packb(value, default=str), lambda data: msgpack.unpackb(data))
+    CODECS[MSGPACK.name] = MSGPACK
+
+
+def negotiate(offered: List[str]) -> Codec:
+    """Pick the first WebSocket subprotocol the client offered that we support; JSON otherwise."""
+    for name in offered:
+        if name in CODECS:
+            return CODECS[name]
+    return JSON
+
+
+def codec_for_media_type(content_type: Optional[str]) -> Optional[Codec]:
+    """Codec for a Content-Type/Accept value (application/msgpack or application/x-msgpack); JSON by default."""
+    media_type = (content_type or "application/json").split(";")[0].strip().lower()
+    if media_type in ("application/msgpack", "application/x-msgpack"):
+        return CODECS.get("a2a.msgpack")
+    if media_type in ("application/json", "*/*", ""):
+        return JSON
+    return None
+
+
+def error_reply(message: Any, error: str) -> Dict[str, Any]:
+    """Reply for a message that failed validation, keeping its task_id/ref so the sender can match it."""
+    reply: Dict[str, Any] = {"type": "error", "status": "error", "error": error}
+    if isinstance(message, dict):
+        payload = message.get("payload")
+        task_id = message.get("task_id") or (payload.get("task_id") if isinstance(payload, dict) else None)
+        if task_id is not None:
+            reply["task_id"] = task_id
+        if "ref" in message:
+            reply["ref"] = message["ref"]
+    return reply
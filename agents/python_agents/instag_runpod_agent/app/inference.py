@@ -0,0 +1,389 @@
+# Warm inference workers with request micro-batching and an audio-feature cache.
+#
+# Each adapted model (-M output/...) gets one long-lived worker process that loads
+# the model once. Workers speak newline-delimited JSON on stdin/stdout:
+#   worker -> {"ready": true, "memory_bytes": N}          once the model is loaded
+#   agent  -> {"batch": [request, ...]}                   one line per micro-batch
+#   worker -> {"results": [result, ...]} | {"error": msg} one line per batch
+# Idle workers are evicted (least recently used first) to stay under a memory budget.
+
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional
+
+from . import telemetry
+from .ssh_pool import SSHPool
+
+if TYPE_CHECKING:
+    # Only the feature cache needs numpy; it is imported there so agent startup does not pay for it.
+    import numpy as np
+
+
+class WorkerError(Exception):
+    """Raised when a model worker fails to start or reports an error for a batch."""
+
+
+class FeatureCache:
+    """Content-addressed cache of extracted audio features (.npy files), memory-mapped on read.
+
+    Keys are the SHA-256 of the audio bytes plus the extractor name, so repeated or shared
+    driving audio is extracted once no matter what the file is called.
+    """
+
+    def __init__(self, root: str, max_open: int = 64):
+        self.root = root
+        self.max_open = max_open
+        self.hits = 0
+        self.misses = 0
+        self._open: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._digests: Dict[Any, str] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def key(self, audio_path: str, extractor: str) -> str:
+        st = os.stat(audio_path)
+        memo = (os.path.abspath(audio_path), st.st_size, st.st_mtime_ns)
+        digest = self._digests.get(memo)
+        if digest is None:
+            h = hashlib.sha256()
+            with open(audio_path, "rb") as f:
+                for block in iter(lambda: f.read(1024 * 1024), b""):
+                    h.update(block)
+            digest = self._digests[memo] = h.hexdigest()
+        return f"{digest}_{extractor}"
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.npy")
+
+    def get(self, audio_path: str, extractor: str, extract: Callable[[str], "np.ndarray"]) -> "np.ndarray":
+        """Return features for audio_path, running extract(audio_path) only on a cache miss."""
+        import numpy as np
+        key = self.key(audio_path, extractor)
+        with self._lock:
+            features = self._open.get(key)
+            if features is not None:
+                self._open.move_to_end(key)
+                self.hits += 1
+                return features
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        # Single-flight per key: concurrent requests for the same new audio extract once.
+        with key_lock:
+            path = self.path(key)
+            if os.path.exists(path):
+                self.hits += 1
+            else:
+                self.misses += 1
+                tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp.npy"
+                np.save(tmp, extract(audio_path))
+                os.replace(tmp, path)
+            features = np.load(path, mmap_mode="r")
+        with self._lock:
+            self._open[key] = features
+            while len(self._open) > self.max_open:
+                self._open.popitem(last=False)
+        return features
+
+
+class ProcessWorkerBackend:
+    """A model worker running as a local subprocess."""
+
+    def __init__(self, command: List[str], cwd: Optional[str] = None, start_timeout: float = 600.0):
+        self.command = command
+        self.cwd = cwd
+        self.start_timeout = start_timeout
+        self.memory_bytes = 0
+        self._proc: Optional[asyncio.subprocess.Process] = None
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        self._proc = await asyncio.create_subprocess_exec(
+            *self.command, cwd=self.cwd, stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE)
+        try:
+            ready = await asyncio.wait_for(self._read(), self.start_timeout)
+        except BaseException:
+            await self.close()
+            raise
+        self.memory_bytes = int(ready.get("memory_bytes", 0))
+
+    def alive(self) -> bool:
+        return self._proc is not None and self._proc.returncode is None
+
+    async def infer_batch(self, requests: List[Dict[str, Any]]) -> List[Any]:
+        async with self._lock:
+            self._proc.stdin.write((json.dumps({"batch": requests}) + "\n").encode())
+            await self._proc.stdin.drain()
+            reply = await self._read()
+        if "error" in reply:
+            raise WorkerError(reply["error"])
+        return reply["results"]
+
+    async def close(self):
+        if self._proc is not None and self._proc.returncode is None:
+            self._proc.stdin.close()
+            try:
+                await asyncio.wait_for(self._proc.wait(), 5)
+            except asyncio.TimeoutError:
+                self._proc.kill()
+                await self._proc.wait()
+
+    async def _read(self) -> Dict[str, Any]:
+        line = await self._proc.stdout.readline()
+        if not line:
+            raise WorkerError(f"Worker exited: {' '.join(self.command)}")
+        return json.loads(line)
+
+
+class SSHWorkerBackend:
+    """A model worker running on a pod, attached through a channel of the pooled SSH transport."""
+
+    def __init__(self, pool: SSHPool, pod_id: str, command: str, start_timeout: float = 600.0):
+        self.pool = pool
+        self.pod_id = pod_id
+        self.command = command
+        self.start_timeout = start_timeout
+        self.memory_bytes = 0
+        self._channel = None
+        self._stdin = None
+        self._stdout = None
+        self._lock = asyncio.Lock()
+
+    async def load(self):
+        self._channel = await asyncio.to_thread(self.pool.open_session, self.pod_id, self.command)
+        self._channel.settimeout(self.start_timeout)
+        self._stdin = self._channel.makefile_stdin("wb")
+        self._stdout = self._channel.makefile("rb")
+        try:
+            ready = await asyncio.to_thread(self._read)
+        except BaseException:
+            await self.close()
+            raise
+        self._channel.settimeout(None)
+        self.memory_bytes = int(ready.get("memory_bytes", 0))
+
+    def alive(self) -> bool:
+        return self._channel is not None and not self._channel.exit_status_ready()
+
+    async def infer_batch(self, requests: List[Dict[str, Any]]) -> List[Any]:
+        async with self._lock:
+            reply = await asyncio.to_thread(self._exchange, requests)
+        if "error" in reply:
+            raise WorkerError(reply["error"])
+        return reply["results"]
+
+    async def close(self):
+        if self._channel is not None:
+            await asyncio.to_thread(self.pool.close_session, self.pod_id, self._channel)
+            self._channel = None
+
+    def _exchange(self, requests: List[Dict[str, Any]]) -> Dict[str, Any]:
+        self._stdin.write((json.dumps({"batch": requests}) + "\n").encode())
+        self._stdin.flush()
+        return self._read()
+
+    def _read(self) -> Dict[str, Any]:
+        line = self._stdout.readline()
+        if not line:
+            raise WorkerError(f"Worker on {self.pod_id} exited: {self.command}")
+        return json.loads(line)
+
+
+class ModelWorker:
+    """Queues requests for one loaded model and feeds them to its backend in micro-batches.
+
+    A batch the backend has not answered within ``batch_timeout`` seconds fails, and the
+    backend is closed since its next reply could no longer be matched to a batch.
+    """
+
+    def __init__(self, key: str, backend, max_batch: int, max_wait: float, batch_timeout: Optional[float] = None):
+        self.key = key
+        self.backend = backend
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batch_timeout = batch_timeout
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.busy = False
+        self.last_used = time.monotonic()
+        self._batch: List[Any] = []
+        self.batches = 0
+        self.requests = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._loop())
+
+    def idle(self) -> bool:
+        return not self.busy and self.queue.empty()
+
+    async def submit(self, request: Dict[str, Any]) -> Any:
+        future = asyncio.get_running_loop().create_future()
+        self.last_used = time.monotonic()
+        await self.queue.put((request, future))
+        return await future
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        # Fail the batch being collected or run as well as whatever is still queued.
+        pending = self._batch
+        while not self.queue.empty():
+            pending.append(self.queue.get_nowait())
+        for _, future in pending:
+            if not future.done():
+                future.set_exception(WorkerError(f"Model {self.key} was unloaded"))
+        await self.backend.close()
+
+    async def _loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = self._batch = [await self.queue.get()]
+            # Busy from the first request on, so the worker is not evicted while it collects a batch.
+            self.busy = True
+            # Wait up to max_wait for more requests to share this forward pass.
+            deadline = loop.time() + self.max_wait
+            while len(batch) < self.max_batch:
+                if not self.queue.empty():
+                    batch.append(self.queue.get_nowait())
+                    continue
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            try:
+                telemetry.INFERENCE_BATCH_SIZE.observe(len(batch))
+                results = await asyncio.wait_for(self.backend.infer_batch([request for request, _ in batch]),
+                                                 self.batch_timeout)
+                if not isinstance(results, list) or len(results) != len(batch):
+                    count = len(results) if isinstance(results, list) else type(results).__name__
+                    raise WorkerError(f"Model {self.key} returned {count} results for {len(batch)} requests")
+                for (_, future), result in zip(batch, results):
+                    if not future.done():
+                        future.set_result(result)
+            except asyncio.TimeoutError:
+                error = WorkerError(f"Model {self.key} did not answer a batch of {len(batch)} "
+                                    f"within {self.batch_timeout}s")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                await self.backend.close()
+            except Exception as e:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+            finally:
+                self.busy = False
+                self._batch = []
+                self.batches += 1
+                self.requests += len(batch)
+                self.last_used = time.monotonic()
+
+
+class InferenceServer:
+    """Keeps one warm worker per model key and evicts idle ones under a memory budget."""
+
+    def __init__(self, backend_factory: Callable[[str], Any], memory_budget: int = 20 * 1024 ** 3,
+                 idle_ttl: float = 900.0, max_batch: int = 8, max_wait: float = 0.02,
+                 batch_timeout: Optional[float] = None):
+        self.backend_factory = backend_factory
+        self.memory_budget = memory_budget
+        self.idle_ttl = idle_ttl
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batch_timeout = batch_timeout
+        self.workers: Dict[str, ModelWorker] = {}
+        self.evictions = 0
+        self._sizes: Dict[str, int] = {}
+        self._loading: Dict[str, asyncio.Task] = {}
+        self._reaper: Optional[asyncio.Task] = None
+
+    async def infer(self, model_key: str, request: Dict[str, Any]) -> Any:
+        worker = self.workers.get(model_key) or await self._load(model_key)
+        try:
+            return await worker.submit(request)
+        except WorkerError:
+            # A crashed worker is dropped so the next request for the model starts a fresh one.
+            if self.workers.get(model_key) is worker and not worker.backend.alive():
+                await self._evict(model_key)
+            raise
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": {key: {"memory_bytes": w.backend.memory_bytes, "queued": w.queue.qsize(), "batches": w.batches,
+                              "requests": w.requests} for key, w in self.workers.items()},
+            "memory_bytes": self._memory(),
+            "memory_budget": self.memory_budget,
+            "evictions": self.evictions,
+        }
+
+    async def close(self):
+        if self._reaper is not None:
+            self._reaper.cancel()
+        for key in list(self.workers):
+            await self._evict(key)
+
+    async def _load(self, model_key: str) -> ModelWorker:
+        # Concurrent first requests for one model share a single load.
+        task = self._loading.get(model_key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._start_worker(model_key))
+            self._loading[model_key] = task
+            task.add_done_callback(lambda _: self._loading.pop(model_key, None))
+        return await asyncio.shield(task)
+
+    async def _start_worker(self, model_key: str) -> ModelWorker:
+        if self._reaper is None:
+            self._reaper = asyncio.get_running_loop().create_task(self._reap())
+        # Free memory before loading when this model's size is known from an earlier load.
+        await self._make_room(self._sizes.get(model_key, 0))
+        backend = self.backend_factory(model_key)
+        await backend.load()
+        self._sizes[model_key] = backend.memory_bytes
+        await self._make_room(backend.memory_bytes)
+        worker = ModelWorker(model_key, backend, self.max_batch, self.max_wait, self.batch_timeout)
+        worker.start()
+        self.workers[model_key] = worker
+        return worker
+
+    def _memory(self) -> int:
+        return sum(w.backend.memory_bytes for w in self.workers.values())
+
+    async def _make_room(self, needed: int):
+        idle = sorted((w for w in self.workers.values() if w.idle()), key=lambda w: w.last_used)
+        while idle and self._memory() + needed > self.memory_budget:
+            await self._evict(idle.pop(0).key)
+        if self._memory() + needed > self.memory_budget:
+            print(f"[inference] Memory budget exceeded: {self._memory() + needed} > {self.memory_budget} bytes")
+
+    async def _evict(self, model_key: str):
+        worker = self.workers.pop(model_key, None)
+        if worker is not None:
+            self.evictions += 1
+            await worker.close()
+
+    async def _reap(self):
+        while True:
+            await asyncio.sleep(min(self.idle_ttl, 60.0))
+            now = time.monotonic()
+            for worker in list(self.workers.values()):
+                if worker.idle() and now - worker.last_used > self.idle_ttl:
+                    await self._evict(worker.key)
+
+
+def server_from_env(backend_factory: Callable[[str], Any]) -> InferenceServer:
+    return InferenceServer(
+        backend_factory,
+        memory_budget=int(float(os.environ.get("INSTAG_INFERENCE_MEMORY_GB", "20")) * 1024 ** 3),
+        idle_ttl=float(os.environ.get("INSTAG_INFERENCE_IDLE_TTL", "900")),
+        max_batch=int(os.environ.get("INSTAG_INFERENCE_MAX_BATCH", "8")),
+        max_wait=float(os.environ.get("INSTAG_INFERENCE_MAX_WAIT_MS", "20")) / 1000,
+        batch_timeout=float(os.environ.get("INSTAG_INFERENCE_BATCH_TIMEOUT", "300")),
+    )
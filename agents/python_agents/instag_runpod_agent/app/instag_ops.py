@@ -1,26 +1,219 @@
-# Placeholder for instag_ops.py
-# This file will contain functions for InsTaG-specific tasks.
+# InsTaG-specific tasks executed on a RunPod pod over pooled SSH sessions.
+# Commands follow docs/instag_setup_guide/instag_runpod_setup_guide.md.
 
-# Example function (actual implementation would require SSH, script execution, etc.)
-def setup_instag_environment(pod_id: str):
+import asyncio
+import json
+import os
+import shlex
+from typing import Any, Dict, List, Optional
+
+from .inference import SSHWorkerBackend, server_from_env
+from .jobs import report_progress
+from .pipeline import AUDIO_EXTRACTORS, PreprocessPipeline, SSHBackend, build_dataset_dag
+from .progress import LogProgressParser
+from .ssh_pool import SSHPool
+from .transfer import ArtifactTransfer
+
+PROJECT_DIR = "/workspace/instag_project"
+SSH_KEY_FILE = os.environ.get("INSTAG_SSH_KEY_FILE")
+# Agent-side files named in task params (uploads, downloads, bfm_path) must live under this directory.
+ARTIFACT_DIR = os.path.abspath(os.environ.get("INSTAG_ARTIFACT_DIR", "artifacts"))
+FEATURE_CACHE_DIR = "/workspace/.instag_feature_cache"
+# Command (run from the project root) that starts a resident worker for one model, e.g.
+# "python synthesize_worker.py -S {data_dir} -M {model_dir}"; it must speak the
+# app.inference worker protocol. Unset: every request runs synthesize_fuse.py.
+INFERENCE_WORKER = os.environ.get("INSTAG_INFERENCE_WORKER")
+
+# File each extractor writes next to the input .wav.
+_FEATURE_SUFFIX = {"deepspeech": ".npy", "wav2vec": "_eo.npy", "hubert": "_hu.npy"}
+
+# Arguments: audio, cache dir, extractor, project dir, extractor command (uses $wav), output suffix.
+# Features are stored under the SHA-256 of the audio, so a clip is extracted once per pod.
+_CACHED_FEATURES = r'''set -e
+h=$(sha256sum "$1" | cut -c1-64)
+out="$2/${h}_$3.npy"
+if [ ! -f "$out" ]; then
+  work="$2/$h.$$"
+  mkdir -p "$work"
+  wav="$work/$h.wav"
+  cp "$1" "$wav"
+  (cd "$4" && eval "$5")
+  mv -f "$work/$h$6" "$out"
+  rm -rf "$work"
+fi
+echo "$out"
+'''
+
+# Shared by every operation so consecutive steps on a pod reuse one SSH transport.
+ssh_pool = SSHPool()
+transfer = ArtifactTransfer(ssh_pool)
+
+def _in_project(command: str) -> str:
+    """Run a command from the project root inside the instag conda env."""
+    return f"cd {PROJECT_DIR} && conda run --no-capture-output -n instag {command}"
+
+# paramiko connect kwargs that authenticate; the task store never keeps them.
+_SSH_AUTH_KEYS = ("password", "pkey", "key_filename")
+
+def _connect(pod_id: str, ssh: Optional[Dict[str, Any]]) -> bool:
+    """Register the pod's SSH endpoint if given; returns whether the pod is reachable over SSH."""
+    if ssh:
+        if SSH_KEY_FILE and not any(key in ssh for key in _SSH_AUTH_KEYS):
+            # Params of a task resumed from the store carry no credentials.
+            ssh = {**ssh, "key_filename": SSH_KEY_FILE}
+        ssh_pool.register(pod_id, **ssh)
+    return ssh_pool.has(pod_id)
+
+def remote_path(path: str) -> str:
+    """Resolve a pod path; relative paths are taken from the project root."""
+    return path if path.startswith("/") else f"{PROJECT_DIR}/{path}"
+
+def local_path(path: str) -> str:
+    """Resolve an agent-side path under ARTIFACT_DIR; absolute paths and ``..`` are rejected."""
+    if not isinstance(path, str) or not path or os.path.isabs(path) or ".." in path.replace("\\", "/").split("/"):
+        raise ValueError(f"Local artifact paths must be relative to INSTAG_ARTIFACT_DIR: {path!r}")
+    root = os.path.realpath(ARTIFACT_DIR)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root:
+        raise ValueError(f"Local artifact path leaves INSTAG_ARTIFACT_DIR: {path!r}")
+    return resolved
+
+def _resolve(files: List[Dict[str, str]]) -> List[Dict[str, str]]:
+    return [{"local": local_path(f["local"]), "remote": remote_path(f["remote"])} for f in files]
+
+def register_pod(pod_id: str, endpoint: Dict[str, Any]) -> bool:
+    """Register a pod's SSH endpoint (from runpod_ops.ssh_endpoint) using INSTAG_SSH_KEY_FILE."""
+    if not SSH_KEY_FILE:
+        return False
+    ssh_pool.register(pod_id, key_filename=SSH_KEY_FILE, **endpoint)
+    return True
+
+def unregister_pod(pod_id: str):
+    """Drop a terminated pod's SSH endpoint and close its pooled transport."""
+    ssh_pool.unregister(pod_id)
+
+def _run_with_progress(pod_id: str, command: str) -> Dict[str, Any]:
+    """Run a long command, reporting iteration/loss/ETA parsed from its output as it streams in."""
+    parser = LogProgressParser(report_progress)
+    try:
+        return ssh_pool.run(pod_id, command, on_output=parser.feed)
+    finally:
+        parser.close()
+
+def _summary(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{"command": r["command"], "exit_status": r["exit_status"], "stdout_tail": r["stdout"][-2000:]} for r in results]
+
+def setup_instag_environment(pod_id: str, ssh: Optional[Dict[str, Any]] = None, bfm_path: Optional[str] = None):
     print(f"Setting up InsTaG environment on pod: {pod_id}...")
-    # Mock logic
-    return {"status": "success", "message": f"InsTaG environment setup initiated on {pod_id}."}
+    bfm_path = local_path(bfm_path) if bfm_path else None
+    if not _connect(pod_id, ssh):
+        return {"status": "success", "message": f"InsTaG environment setup initiated on {pod_id}."}
+    if bfm_path:
+        # 01_MorphableModel.mat must be in place before convert_BFM.py runs.
+        transfer.upload(pod_id, bfm_path, remote_path("data_utils/face_tracking/3DMM/01_MorphableModel.mat"))
+    # Each step depends on the previous one, so they run in order on the same transport.
+    commands = [
+        f"cd {PROJECT_DIR} && git submodule update --init --recursive",
+        _in_project("bash scripts/prepare.sh"),
+        f"cd {PROJECT_DIR}/data_utils/face_tracking && conda run --no-capture-output -n instag python convert_BFM.py",
+    ]
+    results = [ssh_pool.run(pod_id, command) for command in commands]
+    return {"status": "success", "message": f"InsTaG environment set up on {pod_id}.", "steps": _summary(results)}
 
-def prepare_instag_data(pod_id: str, dataset_name: str):
+def prepare_instag_data(pod_id: str, dataset_name: str, video_ids: Optional[List[str]] = None,
+                        data_dir: str = "data/pretrain", audio_extractor: str = "deepspeech",
+                        uploads: Optional[List[Dict[str, str]]] = None, split: bool = False,
+                        extract_au: bool = False, cpu_slots: int = 4, gpu_slots: int = 1,
+                        ssh: Optional[Dict[str, Any]] = None):
     print(f"Preparing InsTaG data ({dataset_name}) on pod: {pod_id}...")
-    # Mock logic
-    return {"status": "success", "message": f"Data preparation for {dataset_name} initiated on {pod_id}."}
+    uploads = _resolve(uploads or [])
+    if not _connect(pod_id, ssh) or not video_ids:
+        return {"status": "success", "message": f"Data preparation for {dataset_name} initiated on {pod_id}."}
+    if uploads:
+        # Videos and per-video au.csv files; anything already on the volume is skipped.
+        transfer.upload_many(pod_id, uploads)
+    # One graph across all videos: stages of different videos, and independent stages of
+    # the same video (teeth masks, audio features), overlap within the CPU/GPU slots.
+    nodes = build_dataset_dag(video_ids, data_dir=data_dir, audio_extractor=audio_extractor,
+                              split=split, extract_au=extract_au,
+                              easyportrait_dir=f"{PROJECT_DIR}/data_utils/easyportrait")
+    backend = SSHBackend(transfer, pod_id, PROJECT_DIR, prefix="conda run --no-capture-output -n instag ")
+    pipeline = PreprocessPipeline(backend, cpu_slots=cpu_slots, gpu_slots=gpu_slots, on_progress=report_progress)
+    summary = pipeline.run(nodes)
+    return {"status": "success", "message": f"Prepared {len(video_ids)} videos of {dataset_name} on {pod_id}.", **summary}
 
-def run_instag_training(pod_id: str, training_params: dict):
+def run_instag_training(pod_id: str, training_params: dict, ssh: Optional[Dict[str, Any]] = None):
     print(f"Running InsTaG training on pod: {pod_id} with params: {training_params}...")
-    # Mock logic
-    return {"status": "success", "message": f"InsTaG training initiated on {pod_id}."}
+    if not _connect(pod_id, ssh):
+        return {"status": "success", "message": f"InsTaG training initiated on {pod_id}."}
+    script = training_params.get("script", "scripts/pretrain_con.sh")
+    data_dir = training_params.get("data_dir", "data/pretrain")
+    output_dir = training_params.get("output_dir", "output/instag_pretrain")
+    gpu_id = training_params.get("gpu_id", 0)
+    command = _in_project(f"bash {shlex.quote(script)} {shlex.quote(data_dir)} {shlex.quote(output_dir)} {int(gpu_id)}")
+    result = _run_with_progress(pod_id, f"mkdir -p {PROJECT_DIR}/{shlex.quote(output_dir)} && {command}")
+    return {"status": "success", "message": f"InsTaG training finished on {pod_id}.", "output_dir": output_dir, "steps": _summary([result])}
+
+def cached_audio_features(pod_id: str, audio: str, extractor: str = "deepspeech") -> str:
+    """Extract features for a driving .wav on the pod, reusing earlier extractions of the same audio."""
+    command = "conda run --no-capture-output -n instag " + AUDIO_EXTRACTORS[extractor][0].format(wav='"$wav"')
+    args = [remote_path(audio), FEATURE_CACHE_DIR, extractor, PROJECT_DIR, command, _FEATURE_SUFFIX[extractor]]
+    result = ssh_pool.run(pod_id, "sh -c " + " ".join(shlex.quote(a) for a in [_CACHED_FEATURES, "sh"] + args))
+    return result["stdout"].strip().splitlines()[-1]
 
-def run_instag_inference(pod_id: str, inference_params: dict):
+def run_instag_inference(pod_id: str, inference_params: dict, ssh: Optional[Dict[str, Any]] = None):
     print(f"Running InsTaG inference on pod: {pod_id} with params: {inference_params}...")
-    # Mock logic
-    return {"status": "success", "message": f"InsTaG inference initiated on {pod_id}."}
+    if not _connect(pod_id, ssh):
+        return {"status": "success", "message": f"InsTaG inference initiated on {pod_id}."}
+    args = ["-S", inference_params["data_dir"], "-M", inference_params["model_dir"]]
+    audio = inference_params.get("audio")
+    if audio:
+        extractor = inference_params.get("audio_extractor", "deepspeech")
+        if audio.endswith(".wav"):
+            audio = cached_audio_features(pod_id, audio, extractor)
+        args += ["--audio", audio, "--audio_extractor", extractor, "--dilate", "--use_train"]
+    else:
+        args.append("--eval")
+    result = _run_with_progress(pod_id, _in_project("python synthesize_fuse.py " + " ".join(shlex.quote(a) for a in args)))
+    return {"status": "success", "message": f"InsTaG inference finished on {pod_id}.", "steps": _summary([result])}
+
+def _worker_backend(model_key: str) -> SSHWorkerBackend:
+    pod_id, data_dir, model_dir = json.loads(model_key)
+    command = INFERENCE_WORKER.format(data_dir=shlex.quote(data_dir), model_dir=shlex.quote(model_dir))
+    return SSHWorkerBackend(ssh_pool, pod_id, _in_project(command))
+
+# One resident worker per (pod, dataset, model); idle ones are unloaded under INSTAG_INFERENCE_MEMORY_GB.
+inference_server = server_from_env(_worker_backend)
+
+async def serve_instag_inference(pod_id: str, inference_params: dict, ssh: Optional[Dict[str, Any]] = None):
+    """Run inference on the model's resident worker, micro-batched with concurrent requests for it."""
+    if not INFERENCE_WORKER or not _connect(pod_id, ssh) or not inference_params.get("audio"):
+        return await asyncio.to_thread(run_instag_inference, pod_id, inference_params, ssh)
+    request = {k: v for k, v in inference_params.items() if k not in ("data_dir", "model_dir")}
+    if request["audio"].endswith(".wav"):
+        request["audio"] = await asyncio.to_thread(cached_audio_features, pod_id, request["audio"],
+                                                   request.get("audio_extractor", "deepspeech"))
+    model_key = json.dumps([pod_id, inference_params["data_dir"], inference_params["model_dir"]])
+    result = await inference_server.infer(model_key, request)
+    return {"status": "success", "message": f"InsTaG inference finished on {pod_id}.", "result": result}
+
+def upload_artifacts(pod_id: str, files: List[Dict[str, str]], ssh: Optional[Dict[str, Any]] = None):
+    """Upload [{"local", "remote"}] files, sending only chunks the pod does not already hold."""
+    print(f"Uploading {len(files)} artifacts to pod: {pod_id}...")
+    files = _resolve(files)
+    if not _connect(pod_id, ssh):
+        return {"status": "error", "message": f"No SSH endpoint known for {pod_id}."}
+    results = transfer.upload_many(pod_id, files)
+    return {"status": "success", "message": f"Uploaded {len(files)} artifacts to {pod_id}.", "transfers": results}
+
+def download_artifacts(pod_id: str, files: List[Dict[str, str]], ssh: Optional[Dict[str, Any]] = None):
+    """Download [{"remote", "local"}] files (checkpoints, rendered clips), resuming partial copies."""
+    print(f"Downloading {len(files)} artifacts from pod: {pod_id}...")
+    files = _resolve(files)
+    if not _connect(pod_id, ssh):
+        return {"status": "error", "message": f"No SSH endpoint known for {pod_id}."}
+    results = transfer.download_many(pod_id, files)
+    return {"status": "success", "message": f"Downloaded {len(files)} artifacts from {pod_id}.", "transfers": results}
 
 if __name__ == '__main__':
     # Example usage (optional)
@@ -28,4 +221,3 @@ if __name__ == '__main__':
     print(setup_result)
     data_prep_result = prepare_instag_data("pod123", "CelebV-HQ")
     print(data_prep_result)
-
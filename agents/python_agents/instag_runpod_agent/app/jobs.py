@@ -0,0 +1,356 @@
+# Asynchronous job engine for long-running InsTaG/RunPod operations.
+# Task requests are accepted immediately and executed on a bounded worker pool;
+# callers poll for progress with status_update messages or GET /api/tasks/{task_id},
+# or subscribe to a job's live events (payload.stream on /api/a2a).
+# With a TaskStore the engine is shared by several worker processes: each task runs
+# in the worker that owns it, the others follow it through the store, and tasks of a
+# worker that died are reclaimed and rerun.
+
+import asyncio
+import contextvars
+import inspect
+import os
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from . import telemetry
+from .progress import Broadcaster
+from .task_store import TaskStore, store_from_env
+
+ACCEPTED = "accepted"
+RUNNING = "running"
+COMPLETED = "completed"
+ERROR = "error"
+
+FINISHED_STATES = (COMPLETED, ERROR)
+
+# The job whose operation is executing in the current context (thread or task).
+_current_job: contextvars.ContextVar = contextvars.ContextVar("instag_current_job", default=None)
+
+
+def report_progress(event: Dict[str, Any]):
+    """Attach a progress event to the job running in this context; a no-op outside a job."""
+    job = _current_job.get()
+    if job is not None:
+        job.publish({**event, "time": time.time()})
+
+
+def current_job() -> Optional["Job"]:
+    """The job whose operation is running in this context, if any."""
+    return _current_job.get()
+
+
+class Job:
+    """State of a single task_request tracked by the engine."""
+
+    def __init__(self, task_id: str, operation: str, params: Dict[str, Any]):
+        self.task_id = task_id
+        self.operation = operation
+        self.params = params
+        self.pod_id = params.get("pod_id")
+        self.status = ACCEPTED
+        self.result: Optional[Dict[str, Any]] = None
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self.progress: deque = deque(maxlen=100)
+        self.events = Broadcaster()
+        self.done = asyncio.Event()
+        self._loop = asyncio.get_running_loop()
+        self.trace_id = telemetry.current_trace_id()
+        self.attempts = 0
+        self.published = 0
+
+    @classmethod
+    def from_row(cls, row: Dict[str, Any]) -> "Job":
+        """Rebuild a job from its TaskStore row (a task owned by another worker, or one being resumed)."""
+        job = cls(row["task_id"], row["operation"], row["params"])
+        for field in ("status", "result", "error", "created_at", "started_at", "finished_at", "trace_id", "attempts"):
+            setattr(job, field, row[field])
+        job.progress.extend(row["progress"])
+        return job
+
+    def publish(self, event: Dict[str, Any]):
+        """Record a progress event and fan it out to live subscribers; safe from any thread."""
+        self.progress.append(event)
+        self.published += 1
+        self._loop.call_soon_threadsafe(self.events.publish, event)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "task_id": self.task_id,
+            "operation": self.operation,
+            "pod_id": self.pod_id,
+            "status": self.status,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "progress": list(self.progress),
+            "trace_id": self.trace_id,
+        }
+
+
+class JobEngine:
+    """Runs operations in the background with global and per-pod concurrency limits.
+
+    Synchronous operations run on a bounded thread pool so blocking SSH/HTTP work
+    never stalls the event loop; coroutine operations are awaited directly.
+
+    With a ``store``, ``resolve`` maps an operation name back to its function for
+    tasks resumed from the store, and ``reconcile`` is awaited before a resumed task
+    reruns (raising fails the task, e.g. when its pod no longer exists). A task is
+    given up after ``max_attempts`` resumes.
+    """
+
+    def __init__(self, max_workers: int = 16, per_pod_limit: int = 2, max_finished: int = 1000,
+                 store: Optional[TaskStore] = None,
+                 resolve: Optional[Callable[[str], Optional[Callable[[Dict[str, Any]], Any]]]] = None,
+                 reconcile: Optional[Callable[[Job], Awaitable[None]]] = None,
+                 max_attempts: int = 3, follow_interval: float = 1.0):
+        self.max_workers = max_workers
+        self.per_pod_limit = per_pod_limit
+        self.max_finished = max_finished
+        self.store = store
+        self.resolve = resolve
+        self.reconcile = reconcile
+        self.max_attempts = max_attempts
+        self.follow_interval = follow_interval
+        self._jobs: Dict[str, Job] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._pod_slots: Dict[str, asyncio.Semaphore] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._followers: Dict[str, asyncio.Task] = {}
+        self._saved: Dict[str, int] = {}
+        self._maintainer: Optional[asyncio.Task] = None
+        self._closing = False
+
+    async def start(self):
+        """Resume tasks left behind by exited workers, then keep heartbeating and reclaiming."""
+        if self.store is None or self._maintainer is not None:
+            return
+        self._reclaim()
+        self._maintainer = asyncio.get_running_loop().create_task(self._maintain())
+
+    def submit(self, task_id: str, operation: str, func: Callable[[Dict[str, Any]], Any], params: Dict[str, Any]) -> Job:
+        """Register a job and schedule it; resubmitting a known task_id returns the existing job."""
+        existing = self._jobs.get(task_id)
+        if existing is not None:
+            return existing
+        job = Job(task_id, operation, params)
+        if self.store is not None and not self.store.create(task_id, operation, params, job.trace_id):
+            # Another worker (or an earlier run of this one) already has the task; never run it twice.
+            return self._follow(self.store.get(task_id))
+        self._start(job, func)
+        return job
+
+    def get(self, task_id: str) -> Optional[Job]:
+        job = self._jobs.get(task_id)
+        if job is None and self.store is not None:
+            row = self.store.get(task_id)
+            if row is not None:
+                job = self._follow(row)
+        return job
+
+    async def wait(self, task_id: str, timeout: Optional[float] = None) -> Optional[Job]:
+        """Block until the job finishes (or timeout elapses) and return it."""
+        job = self._jobs.get(task_id)
+        if job is None:
+            return None
+        try:
+            await asyncio.wait_for(job.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return job
+
+    def stats(self) -> Dict[str, int]:
+        counts = {ACCEPTED: 0, RUNNING: 0, COMPLETED: 0, ERROR: 0}
+        for job in self._jobs.values():
+            counts[job.status] += 1
+        return counts
+
+    def subscribers(self) -> int:
+        """Live stream subscriptions across all jobs."""
+        return sum(len(job.events.subscribers) for job in self._jobs.values())
+
+    async def shutdown(self):
+        """Cancel outstanding jobs and release the thread pool.
+
+        With a store, unfinished tasks are handed back rather than failed, so another
+        worker (or this one after a restart) resumes them.
+        """
+        self._closing = True
+        background = [t for t in (self._maintainer, *self._followers.values()) if t is not None]
+        for task in (*background, *self._tasks.values()):
+            task.cancel()
+        if self._tasks or background:
+            await asyncio.gather(*background, *self._tasks.values(), return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+    def _pod_slot(self, pod_id: str) -> asyncio.Semaphore:
+        slot = self._pod_slots.get(pod_id)
+        if slot is None:
+            slot = self._pod_slots[pod_id] = asyncio.Semaphore(self.per_pod_limit)
+        return slot
+
+    def _start(self, job: Job, func: Optional[Callable[[Dict[str, Any]], Any]]):
+        self._jobs[job.task_id] = job
+        self._tasks[job.task_id] = asyncio.get_running_loop().create_task(self._run(job, func))
+
+    def _save(self, job: Job, **fields):
+        if self.store is not None and not self.store.update(job.task_id, **fields):
+            print(f"[jobs] Task {job.task_id} was reclaimed by another worker; not recording {sorted(fields)}")
+
+    async def _run(self, job: Job, func: Optional[Callable[[Dict[str, Any]], Any]]):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_workers)
+        # Take the per-pod slot first so a job queued behind a busy pod never
+        # holds one of the global worker slots while it waits.
+        pod_slot = self._pod_slot(job.pod_id) if job.pod_id else None
+        try:
+            if pod_slot is not None:
+                await pod_slot.acquire()
+            try:
+                async with self._slots:
+                    job.status = RUNNING
+                    job.started_at = time.time()
+                    self._save(job, status=RUNNING, started_at=job.started_at)
+                    if job.attempts:
+                        await self._prepare_resume(job, func)
+                    telemetry.QUEUE_WAIT_SECONDS.labels(job.operation).observe(job.started_at - job.created_at)
+                    with telemetry.span(f"instag {job.operation}", **{"instag.task_id": job.task_id}):
+                        job.result = await self._call(job, func)
+                    job.status = COMPLETED
+            finally:
+                if pod_slot is not None:
+                    pod_slot.release()
+        except asyncio.CancelledError:
+            job.status = ERROR
+            job.error = "cancelled"
+            if self._closing and self.store is not None:
+                self.store.release(job.task_id)
+            raise
+        except Exception as e:
+            print(f"[jobs] Task {job.task_id} ({job.operation}) failed: {e!r}")
+            job.status = ERROR
+            job.error = str(e)
+        finally:
+            job.finished_at = time.time()
+            if job.started_at is not None:
+                telemetry.OPERATION_SECONDS.labels(job.operation, job.status).observe(job.finished_at - job.started_at)
+            if job.error != "cancelled" or not self._closing:
+                self._save(job, status=job.status, result=job.result, error=job.error,
+                           finished_at=job.finished_at, progress=list(job.progress))
+            job.done.set()
+            job.events.close()
+            self._tasks.pop(job.task_id, None)
+            self._saved.pop(job.task_id, None)
+            self._retire(job.task_id)
+
+    async def _call(self, job: Job, func: Callable[[Dict[str, Any]], Any]) -> Any:
+        _current_job.set(job)
+        if inspect.iscoroutinefunction(func):
+            return await func(job.params)
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="instag-job")
+        # run_in_executor does not carry context over; copy it so report_progress works in the thread.
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(self._executor, context.run, func, job.params)
+
+    async def _prepare_resume(self, job: Job, func: Optional[Callable[[Dict[str, Any]], Any]]):
+        if func is None:
+            raise RuntimeError(f"Cannot resume task: unknown operation {job.operation}")
+        if job.attempts > self.max_attempts:
+            raise RuntimeError(f"Gave up after {job.attempts} attempts; the workers running it kept exiting")
+        if self.reconcile is not None:
+            await self.reconcile(job)
+
+    def _follow(self, row: Dict[str, Any]) -> Job:
+        """Track a task owned by another worker, mirroring its status and progress from the store."""
+        job = Job.from_row(row)
+        self._jobs[job.task_id] = job
+        if job.status in FINISHED_STATES:
+            job.done.set()
+            job.events.close()
+            self._retire(job.task_id)
+        else:
+            self._followers[job.task_id] = asyncio.get_running_loop().create_task(self._watch(job))
+        return job
+
+    async def _watch(self, job: Job):
+        try:
+            while True:
+                await asyncio.sleep(self.follow_interval)
+                row = self.store.get(job.task_id)
+                if row is None:
+                    return
+                seen = job.progress[-1].get("time", 0) if job.progress else 0
+                for event in row["progress"]:
+                    if event.get("time", 0) > seen:
+                        job.progress.append(event)
+                        job.events.publish(event)
+                job.status, job.started_at = row["status"], row["started_at"]
+                if job.status in FINISHED_STATES:
+                    job.result, job.error, job.finished_at = row["result"], row["error"], row["finished_at"]
+                    job.done.set()
+                    job.events.close()
+                    self._retire(job.task_id)
+                    return
+        finally:
+            if self._followers.get(job.task_id) is asyncio.current_task():
+                del self._followers[job.task_id]
+
+    def _reclaim(self):
+        for row in self.store.reclaim():
+            # Keep the Job a follower may have handed out, so its stream subscribers carry on.
+            follower = self._followers.pop(row["task_id"], None)
+            if follower is not None:
+                follower.cancel()
+            job = self._jobs.get(row["task_id"]) or Job.from_row(row)
+            job.status, job.attempts = ACCEPTED, row["attempts"]
+            print(f"[jobs] Resuming task {job.task_id} ({job.operation}), attempt {job.attempts}")
+            self._start(job, self.resolve(job.operation) if self.resolve is not None else None)
+
+    async def _maintain(self):
+        # Heartbeat well inside the lease so a slow loop never looks like a dead worker.
+        interval = self.store.lease_ttl / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                progress = {}
+                for task_id in self._tasks:
+                    job = self._jobs[task_id]
+                    if self._saved.get(task_id) != job.published:
+                        self._saved[task_id] = job.published
+                        progress[task_id] = list(job.progress)
+                self.store.heartbeat(progress)
+                self._reclaim()
+            except Exception as e:
+                print(f"[jobs] Task store maintenance failed: {e!r}")
+
+    def _retire(self, task_id: str):
+        # Keep a bounded history of finished jobs so pollers can still read results.
+        self._finished[task_id] = None
+        while len(self._finished) > self.max_finished:
+            old_id, _ = self._finished.popitem(last=False)
+            self._jobs.pop(old_id, None)
+
+
+def engine_from_env(resolve=None, reconcile=None) -> JobEngine:
+    return JobEngine(
+        max_workers=int(os.environ.get("INSTAG_MAX_WORKERS", "16")),
+        per_pod_limit=int(os.environ.get("INSTAG_PER_POD_CONCURRENCY", "2")),
+        max_finished=int(os.environ.get("INSTAG_MAX_FINISHED_TASKS", "1000")),
+        store=store_from_env(),
+        resolve=resolve,
+        reconcile=reconcile,
+        max_attempts=int(os.environ.get("INSTAG_TASK_MAX_ATTEMPTS", "3")),
+    )
@@ -1,9 +1,20 @@
-from fastapi import FastAPI
-from typing import Dict, Any
+import asyncio
+import json
+import os
+import time
+import uuid
+import httpx
+from fastapi import FastAPI, HTTPException, Request, WebSocket
+from fastapi.responses import Response, StreamingResponse
+from typing import Any, AsyncIterator, Dict, Mapping
 
-# Placeholder for operator imports, will be added as they are developed
-# from . import runpod_ops
-# from . import instag_ops
+from . import a2a_protocol
+from . import runpod_ops
+from . import instag_ops
+from . import telemetry
+from .jobs import current_job, engine_from_env
+from .task_store import without_secrets
+from .warm_pool import pool_from_env
 
 app = FastAPI(
     title="InsTaG RunPod Agent",
@@ -11,44 +22,251 @@ app = FastAPI(
     version="0.1.0",
 )
 
+# Long-running operations are executed by the job engine; each entry takes the
+# task_request params dict and returns the operation result.
+# Operations that reach the pod accept an optional "ssh" dict
+# ({"host", "port", "username", "key_filename" | "password"}) for the SSH pool.
+async def provision_pod_op(params: dict):
+    """Lease a warm pod when the warm pool is enabled, otherwise provision from scratch."""
+    job = current_job()
+    if jobs.store is not None and job is not None and job.attempts:
+        # Resumed after a worker died: reattach to the pod it had already leased for this task.
+        for lease in jobs.store.pod_leases(job.task_id):
+            instag_ops.register_pod(lease["pod_id"], lease["ssh"])
+            return {"status": "success", "message": f"Reattached to pod {lease['pod_id']}.", "pod_id": lease["pod_id"],
+                    "ssh": lease["ssh"]}
+    if warm_pool is None:
+        return await asyncio.to_thread(runpod_ops.provision_pod, params)
+    gpu_type = params.get("gpu_type") or next(iter(warm_pool.targets))
+    task_id = job.task_id if job is not None else None
+    pod = await warm_pool.lease(gpu_type, artifacts=params.get("artifacts", []), timeout=params.get("timeout"),
+                                task_id=task_id)
+    instag_ops.register_pod(pod.pod_id, pod.ssh)
+    if jobs.store is not None:
+        jobs.store.lease_pod(pod.pod_id, task_id, gpu_type, pod.ssh)
+    return {"status": "success", "message": f"Leased warm {gpu_type} pod {pod.pod_id}.", "pod_id": pod.pod_id, "ssh": pod.ssh,
+            "artifacts": sorted(pod.artifacts)}
+
+async def terminate_pod_op(params: dict):
+    """Return warm-pool pods to the pool (recording artifacts left on their volume); terminate others."""
+    pod_id = params.get("pod_id")
+    if jobs.store is not None:
+        jobs.store.release_pod(pod_id)
+    if warm_pool is None or not warm_pool.is_managed(pod_id):
+        result = await asyncio.to_thread(runpod_ops.terminate_pod, pod_id)
+        instag_ops.unregister_pod(pod_id)
+        return result
+    force = bool(params.get("force", False))
+    await warm_pool.release(pod_id, artifacts=params.get("artifacts", []), terminate=force)
+    action = "terminated" if force else "returned to the warm pool"
+    return {"status": "success", "message": f"Pod {pod_id} {action}."}
+
+async def inference_op(params: dict):
+    return await instag_ops.serve_instag_inference(params.get("pod_id"), params.get("inference_params", {}), ssh=params.get("ssh"))
+
+async def prepare_warm_pod(pod):
+    """Make a freshly booted warm pod environment-ready before it is leased."""
+    if instag_ops.register_pod(pod.pod_id, pod.ssh):
+        await asyncio.to_thread(instag_ops.setup_instag_environment, pod.pod_id)
+
+OPERATIONS = {
+    "provision_pod": provision_pod_op,
+    "terminate_pod": terminate_pod_op,
+    "instag_setup_environment": lambda params: instag_ops.setup_instag_environment(
+        params.get("pod_id"), ssh=params.get("ssh"), bfm_path=params.get("bfm_path")),
+    "instag_prepare_data": lambda params: instag_ops.prepare_instag_data(
+        params.get("pod_id"), params.get("dataset_name"), video_ids=params.get("video_ids"),
+        data_dir=params.get("data_dir", "data/pretrain"), audio_extractor=params.get("audio_extractor", "deepspeech"),
+        uploads=params.get("uploads"), split=params.get("split", False), extract_au=params.get("extract_au", False),
+        cpu_slots=params.get("cpu_slots", 4), gpu_slots=params.get("gpu_slots", 1), ssh=params.get("ssh")),
+    "instag_run_training": lambda params: instag_ops.run_instag_training(params.get("pod_id"), params.get("training_params", {}), ssh=params.get("ssh")),
+    "instag_run_inference": inference_op,
+    "instag_upload_artifacts": lambda params: instag_ops.upload_artifacts(params.get("pod_id"), params.get("files", []), ssh=params.get("ssh")),
+    "instag_download_artifacts": lambda params: instag_ops.download_artifacts(params.get("pod_id"), params.get("files", []), ssh=params.get("ssh")),
+}
+
+async def reconcile_task(job):
+    """Before a task left behind by an exited worker reruns, check that its pod still exists."""
+    pod_id = job.pod_id or next((lease["pod_id"] for lease in jobs.store.pod_leases(job.task_id)), None)
+    if pod_id is None or not runpod_ops.RUNPOD_API_KEY:
+        return
+    try:
+        await runpod_ops.shared_client().get_pod(pod_id)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code != 404:
+            raise
+        jobs.store.release_pod(pod_id)
+        raise RuntimeError(f"Pod {pod_id} no longer exists; not resuming {job.operation}") from e
+
+jobs = engine_from_env(resolve=OPERATIONS.get, reconcile=reconcile_task)
+warm_pool = None
+# Seconds of silence after which a streaming reply sends a heartbeat frame.
+STREAM_HEARTBEAT_SECONDS = float(os.environ.get("INSTAG_STREAM_HEARTBEAT", "15"))
+
+# Message types this agent handles; anything else is counted under "other" to bound label cardinality.
+A2A_MESSAGE_TYPES = {"task_request", "status_update", "agent_discovery", "agent_discovery_request"}
+# Batch and channel messages are checked against A2aAgentWebWeb.A2AMessage, plus our own discovery request.
+validate_message = a2a_protocol.compile_validator(extra_types=["agent_discovery_request"])
+A2A_MAX_BATCH = int(os.environ.get("INSTAG_A2A_MAX_BATCH", "1000"))
+# Frames queued per WebSocket channel before progress pushes wait for the client to catch up.
+A2A_CHANNEL_QUEUE = int(os.environ.get("INSTAG_A2A_CHANNEL_QUEUE", "256"))
+
+def state_gauges():
+    """Queue, pool and worker gauges, computed from the live objects on every scrape."""
+    for status, count in jobs.stats().items():
+        yield "instag_tasks", "Tasks tracked by the job engine by status", {"status": status}, count
+    yield "instag_task_stream_subscribers", "Clients following a task's live progress", {}, jobs.subscribers()
+    ssh = instag_ops.ssh_pool.stats()
+    yield "instag_ssh_transports_active", "Pooled SSH transports currently connected", {}, sum(p["active"] for p in ssh.values())
+    yield "instag_ssh_channels_in_use", "SSH channels open on pooled transports", {}, sum(p["in_use"] for p in ssh.values())
+    yield ("instag_ssh_channel_capacity", "SSH channels available across registered pods", {},
+           instag_ops.ssh_pool.max_channels * len(ssh))
+    inference = instag_ops.inference_server.stats()
+    yield "instag_inference_workers", "Resident model workers", {}, len(inference["workers"])
+    yield ("instag_inference_queued", "Inference requests waiting for a batch", {},
+           sum(w["queued"] for w in inference["workers"].values()))
+    yield "instag_inference_memory_bytes", "Memory held by resident model workers", {}, inference["memory_bytes"]
+
+def pool_gauges():
+    """Warm pool gauges; with a task store every worker sees the same shared pool."""
+    if warm_pool is not None:
+        for state, count in warm_pool.metrics()["pods"].items():
+            yield "instag_warm_pool_pods", "Warm pool pods by state", {"state": state}, count
+
+telemetry.register_gauges("agent", state_gauges)
+telemetry.register_gauges("warm_pool", pool_gauges, multiprocess_mode="livemax")
+gauge_publisher = None
+
+@app.on_event("startup")
+async def start_warm_pool():
+    global warm_pool, gauge_publisher
+    telemetry.setup_tracing()
+    gauge_publisher = asyncio.get_running_loop().create_task(telemetry.publish_gauges())
+    await jobs.start()
+    warm_pool = pool_from_env(prepare=prepare_warm_pod, store=jobs.store,
+                              on_terminate=lambda pod: instag_ops.unregister_pod(pod.pod_id))
+    if warm_pool is not None:
+        await warm_pool.start()
+
+@app.on_event("shutdown")
+async def shutdown_jobs():
+    if gauge_publisher is not None:
+        gauge_publisher.cancel()
+    await jobs.shutdown()
+    if warm_pool is not None:
+        await warm_pool.stop()
+    await instag_ops.inference_server.close()
+    await runpod_ops.close_shared_client()
+    instag_ops.ssh_pool.close()
+
+def status_message(job) -> Dict[str, Any]:
+    """Render a job as a status_update A2A message."""
+    message = {"type": "status_update", "task_id": job.task_id, "operation": job.operation, "status": job.status}
+    if job.result is not None:
+        message["result"] = job.result
+    if job.error is not None:
+        message["error"] = job.error
+    if job.progress:
+        message["progress"] = list(job.progress)
+    if job.trace_id is not None:
+        message["trace_id"] = job.trace_id
+    return message
+
+def ndjson(message: Dict[str, Any]) -> bytes:
+    return (json.dumps(message, separators=(",", ":"), default=str) + "\n").encode()
+
+async def job_events(job) -> AsyncIterator[Dict[str, Any]]:
+    """A job's task_progress events as they happen (heartbeats while quiet), then its final status_update."""
+    subscription = job.events.subscribe()
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), STREAM_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield {"type": "heartbeat", "task_id": job.task_id, "status": job.status, "time": time.time()}
+                continue
+            if event is None:
+                break
+            yield {"type": "task_progress", "task_id": job.task_id, "payload": event}
+        final = status_message(job)
+        final.pop("progress", None)
+        yield final
+    finally:
+        job.events.unsubscribe(subscription)
+
+async def stream_job(job) -> AsyncIterator[bytes]:
+    """NDJSON stream of a job: its current status, then job_events."""
+    yield ndjson({"type": "task_response", "task_id": job.task_id, "status": job.status})
+    async for message in job_events(job):
+        yield ndjson(message)
+
 @app.post("/api/a2a")
-async def handle_a2a_message(message: Dict[str, Any]):
+async def handle_a2a_message(message: Dict[str, Any], request: Request):
     """
     Handles incoming A2A messages from the Elixir XCS.
     The message payload will determine which operation to perform.
     """
+    return await process_a2a_message(message, request.headers, int(request.headers.get("content-length") or 0))
+
+async def process_a2a_message(message: Dict[str, Any], headers: Mapping[str, str], size: int, allow_stream: bool = True):
+    """Dispatch one message with metrics and tracing; shared by the POST, batch and channel paths."""
+    label = message.get("type") if message.get("type") in A2A_MESSAGE_TYPES else "other"
+    telemetry.A2A_MESSAGES.labels(label).inc()
+    telemetry.A2A_SIZE.labels(label).observe(size)
+    # Continue the caller's trace (W3C traceparent) so RunPod/SSH work shows up under the Elixir span.
+    with telemetry.timed(telemetry.A2A_LATENCY.labels(label)), telemetry.span(f"a2a {label}", headers):
+        reply = await dispatch_a2a_message(message, allow_stream)
+    if isinstance(reply, dict) and reply.get("status") == "error":
+        telemetry.A2A_ERRORS.labels(label).inc()
+    return reply
+
+def reject_a2a_message(message: Any, error: str) -> Dict[str, Any]:
+    telemetry.A2A_MESSAGES.labels("other").inc()
+    telemetry.A2A_ERRORS.labels("other").inc()
+    return a2a_protocol.error_reply(message, error)
+
+async def dispatch_a2a_message(message: Dict[str, Any], allow_stream: bool = True):
     message_type = message.get("type")
-    payload = message.get("payload", {})
-    task_id = payload.get("task_id", "unknown_task")
+    payload = message.get("payload") or {}
+    if not isinstance(payload, dict):
+        return {"type": "task_response", "status": "error", "error": "Invalid payload: must be an object"}
+    task_id = payload.get("task_id", message.get("task_id"))
+    if task_id is None and message_type == "task_request":
+        # Task ids key the job table, so a request without one gets a fresh id rather than a shared default.
+        task_id = uuid.uuid4().hex
 
-    print(f"Received A2A message: Type={message_type}, TaskID={task_id}, Payload={payload}")
+    print(f"Received A2A message: Type={message_type}, TaskID={task_id}, Payload={without_secrets(payload)}")
 
     if message_type == "task_request":
         operation = payload.get("operation")
         params = payload.get("params", {})
+        if not isinstance(params, dict):
+            return {"type": "task_response", "task_id": task_id, "status": "error",
+                    "error": "Invalid params: must be an object"}
 
-        # Dispatch to appropriate operator based on 'operation'
-        # This will be expanded as operators are implemented
-        if operation == "provision_pod":
-            # result = await runpod_ops.provision_pod_op(params)
-            # For now, placeholder:
-            result = {"status": "success", "message": f"Pod provisioning for {params.get('pod_name')} initiated.", "pod_id": "temp_pod_id_123"}
-            return {"type": "task_response", "task_id": task_id, "status": "completed", "result": result}
-        elif operation == "terminate_pod":
-            # result = await runpod_ops.terminate_pod_op(params)
-            # For now, placeholder:
-            result = {"status": "success", "message": f"Pod termination for {params.get('pod_id')} initiated."}
-            return {"type": "task_response", "task_id": task_id, "status": "completed", "result": result}
-        elif operation == "instag_setup_environment":
-            # result = await instag_ops.setup_environment_op(params)
-            # For now, placeholder:
-            result = {"status": "success", "message": f"InsTaG environment setup for pod {params.get('pod_id')} initiated."}
-            return {"type": "task_response", "task_id": task_id, "status": "completed", "result": result}
-        # Add more operations as they are developed
-        else:
+        # Dispatch to the job engine; the reply only acknowledges acceptance and
+        # callers follow up with status_update messages or GET /api/tasks/{task_id}.
+        func = OPERATIONS.get(operation)
+        if func is None:
             return {"type": "task_response", "task_id": task_id, "status": "error", "error": f"Unknown operation: {operation}"}
-    
-    elif message_type == "agent_discovery_request":
+        job = jobs.submit(task_id, operation, func, params)
+        if allow_stream and payload.get("stream"):
+            # Live telemetry instead of polling; the stream ends with the final status_update.
+            return StreamingResponse(stream_job(job), media_type="application/x-ndjson")
+        return {"type": "task_response", "task_id": task_id, "status": job.status}
+
+    elif message_type == "status_update":
+        if task_id is None:
+            return {"type": "status_update", "status": "error", "error": "status_update needs a task_id"}
+        job = jobs.get(task_id)
+        if job is None:
+            return {"type": "status_update", "task_id": task_id, "status": "error", "error": f"Unknown task: {task_id}"}
+        if allow_stream and payload.get("stream"):
+            # Any number of clients can follow the same task; each gets its own bounded queue.
+            return StreamingResponse(stream_job(job), media_type="application/x-ndjson")
+        return status_message(job)
+
+    elif message_type in ("agent_discovery_request", "agent_discovery"):
         # Respond with agent card information
         # This should ideally be loaded from a config or the README's agent_card.json example
         agent_card = {
@@ -62,37 +280,180 @@ async def handle_a2a_message(message: Dict[str, Any]):
                 "instag_setup_environment", 
                 "instag_prepare_data", 
                 "instag_run_training", 
-                "instag_run_inference"
+                "instag_run_inference",
+                "instag_transfer_artifacts"
             ],
-            "endpoints": {"a2a": "/api/a2a"} # Assuming agent_card endpoint is handled by Elixir layer or not needed for direct A2A
+            "endpoints": {"a2a": "/api/a2a", "a2a_batch": "/api/a2a/batch", "a2a_ws": "/api/a2a/ws", "tasks": "/api/tasks/{task_id}"} # Assuming agent_card endpoint is handled by Elixir layer or not needed for direct A2A
         }
         return {"type": "agent_discovery_response", "task_id": task_id, "agent_card": agent_card}
 
     return {"type": "task_response", "task_id": task_id, "status": "error", "error": f"Unsupported message type: {message_type}"}
 
-@app.get("/")
-async def read_root():
-    return {"message": "Welcome to the InsTaG RunPod Agent. Use the /api/a2a endpoint for A2A communication."}
+@app.post("/api/a2a/batch")
+async def handle_a2a_batch(request: Request):
+    """Many A2A messages in one request: a JSON (or msgpack) array in, the replies in the same order out.
+
+    Messages are validated like A2aAgentWebWeb.A2AMessage and run in order, so a batch
+    can submit a task and ask for its status. Streaming is not available in a batch;
+    use the /api/a2a/ws channel for live updates.
+    """
+    codec = a2a_protocol.codec_for_media_type(request.headers.get("content-type"))
+    if codec is None:
+        raise HTTPException(status_code=415, detail="Send application/json or application/msgpack")
+    body = await request.body()
+    try:
+        messages = codec.loads(body)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Undecodable batch: {e}")
+    if not isinstance(messages, list):
+        raise HTTPException(status_code=400, detail="A batch must be an array of messages")
+    if len(messages) > A2A_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {A2A_MAX_BATCH} messages per batch")
+    size = len(body) // max(len(messages), 1)
+    replies = [await reply_to_message(message, request.headers, size) for message in messages]
+    out = a2a_protocol.codec_for_media_type(request.headers.get("accept")) or a2a_protocol.JSON
+    return Response(out.dumps(replies), media_type=out.media_type)
+
+async def reply_to_message(message: Any, headers: Mapping[str, str], size: int) -> Dict[str, Any]:
+    """Validate and run one batch or channel message; a message that fails gets an error reply of its own
+    instead of failing the batch or closing the channel."""
+    error = validate_message(message)
+    if error:
+        return reject_a2a_message(message, error)
+    try:
+        reply = await process_a2a_message(message, headers, size, allow_stream=False)
+    except Exception as e:
+        print(f"[a2a] {message['type']} failed: {e!r}")
+        telemetry.A2A_ERRORS.labels(message["type"] if message["type"] in A2A_MESSAGE_TYPES else "other").inc()
+        return a2a_protocol.error_reply(message, str(e))
+    return _with_ref(message, reply)
+
+def _with_ref(message: Dict[str, Any], reply: Dict[str, Any]) -> Dict[str, Any]:
+    # A client-chosen "ref" is echoed so replies can be matched when one task has several messages in flight.
+    if "ref" in message:
+        reply = {**reply, "ref": message["ref"]}
+    return reply
+
+@app.websocket("/api/a2a/ws")
+async def a2a_channel(websocket: WebSocket):
+    """Long-lived A2A channel multiplexing any number of tasks over one connection.
+
+    Each frame holds one message or an array of them, validated like A2aAgentWebWeb.A2AMessage.
+    Every message gets its reply in order. Tasks submitted (or status_update'd with
+    payload.stream) on the channel then get server-pushed task_progress, heartbeat and
+    final status_update frames, tagged with their task_id. The encoding is chosen per
+    connection by WebSocket subprotocol: "a2a.msgpack" (binary frames) or "a2a.json".
+    """
+    offered = [p.strip() for p in websocket.headers.get("sec-websocket-protocol", "").split(",") if p.strip()]
+    codec = a2a_protocol.negotiate(offered)
+    await websocket.accept(subprotocol=codec.name if codec.name in offered else None)
+    outbox: asyncio.Queue = asyncio.Queue(A2A_CHANNEL_QUEUE)
+    followers: Dict[str, asyncio.Task] = {}
 
-# Placeholder: In a real scenario, these would be in separate operator files (e.g., runpod_ops.py, instag_ops.py)
-# and imported. For now, defining simple placeholders if needed for basic structure.
+    async def writer():
+        while True:
+            frame = codec.dumps(await outbox.get())
+            await (websocket.send_bytes(frame) if codec.binary else websocket.send_text(frame))
 
-# async def provision_pod_op(params: dict):
-#     print(f"Operator: Provisioning pod with params: {params}")
-#     # Actual RunPod API call would go here
-#     return {"status": "success", "pod_id": "mock_pod_123", "details": params}
+    async def follow(job):
+        try:
+            async for message in job_events(job):
+                await outbox.put(message)
+        finally:
+            followers.pop(job.task_id, None)
 
-# async def terminate_pod_op(params: dict):
-#     print(f"Operator: Terminating pod with params: {params}")
-#     # Actual RunPod API call would go here
-#     return {"status": "success", "message": f"Pod {params.get('pod_id')} terminated."}
+    sender = asyncio.get_running_loop().create_task(writer())
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                break
+            data = frame.get("bytes") if frame.get("bytes") is not None else frame.get("text")
+            try:
+                decoded = codec.loads(data)
+            except Exception as e:
+                await outbox.put(reject_a2a_message(None, f"Undecodable frame: {e}"))
+                continue
+            for message in decoded if isinstance(decoded, list) else [decoded]:
+                reply = await reply_to_message(message, websocket.headers, len(data))
+                await outbox.put(reply)
+                if reply.get("status") == "error":
+                    continue
+                payload = message["payload"] or {}
+                wants_updates = (message["type"] == "task_request" and payload.get("stream", True)) or \
+                    (message["type"] == "status_update" and payload.get("stream"))
+                task_id = reply.get("task_id")
+                if wants_updates and task_id not in followers:
+                    job = jobs.get(task_id)
+                    if job is not None:
+                        followers[task_id] = asyncio.get_running_loop().create_task(follow(job))
+    finally:
+        for task in (sender, *followers.values()):
+            task.cancel()
+        await asyncio.gather(sender, *followers.values(), return_exceptions=True)
 
-# async def setup_environment_op(params: dict):
-#     print(f"Operator: Setting up InsTaG environment with params: {params}")
-#     # Actual SSH commands and setup logic would go here
-#     return {"status": "success", "message": f"Environment setup on pod {params.get('pod_id')} complete."}
+@app.get("/api/tasks/{task_id}")
+async def get_task(task_id: str):
+    """Return the current status_update for a task submitted via /api/a2a."""
+    job = jobs.get(task_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Unknown task: {task_id}")
+    return status_message(job)
+
+@app.get("/api/pods")
+async def list_pods():
+    """Pod inventory, served from the shared client's cache (mock data without RUNPOD_API_KEY)."""
+    if not runpod_ops.RUNPOD_API_KEY:
+        return runpod_ops.get_pods()
+    return await runpod_ops.shared_client().list_pods()
+
+@app.get("/api/pods/{pod_id}")
+async def get_pod(pod_id: str):
+    """Status of one pod, served from the shared client's cache."""
+    if not runpod_ops.RUNPOD_API_KEY:
+        pod = next((p for p in runpod_ops.get_pods() if p["id"] == pod_id), None)
+        if pod is None:
+            raise HTTPException(status_code=404, detail=f"Unknown pod: {pod_id}")
+        return pod
+    return await runpod_ops.shared_client().get_pod(pod_id)
+
+@app.get("/api/pods/{pod_id}/artifacts")
+async def stream_artifact(pod_id: str, path: str):
+    """Stream a file (checkpoint, rendered clip) from a pod without buffering it in memory."""
+    if not instag_ops.ssh_pool.has(pod_id):
+        raise HTTPException(status_code=404, detail=f"No SSH endpoint known for pod: {pod_id}")
+    # Starlette iterates the synchronous generator on a worker thread.
+    return StreamingResponse(instag_ops.transfer.stream(pod_id, instag_ops.remote_path(path)), media_type="application/octet-stream")
+
+@app.get("/api/warm_pool")
+async def get_warm_pool():
+    """Warm pool metrics (lease hit rate, time to first command) and pod states."""
+    if warm_pool is None:
+        return {"enabled": False}
+    return {"enabled": True, "metrics": warm_pool.metrics(), "pods": [pod.to_dict() for pod in warm_pool.pods.values()]}
+
+@app.get("/api/inference")
+async def get_inference():
+    """Resident inference workers, their memory use and batching counters."""
+    return instag_ops.inference_server.stats()
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus exposition of the agent's metrics (scraped alongside the Elixir agent)."""
+    body, content_type = telemetry.exposition()
+    return Response(body, media_type=content_type)
+
+@app.get("/")
+async def read_root():
+    return {"message": "Welcome to the InsTaG RunPod Agent. Use the /api/a2a endpoint for A2A communication."}
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=5002) # Port can be configured
+    from .supervisor import serve
+    # More than one worker needs INSTAG_TASK_DB so the workers share task state.
+    workers = int(os.environ.get("INSTAG_WORKERS", "1"))
+    if workers > 1:
+        serve("app.main:app", "0.0.0.0", 5002, workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=5002) # Port can be configured
 
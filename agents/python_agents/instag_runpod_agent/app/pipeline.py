@@ -0,0 +1,252 @@
+# Per-video preprocessing DAG for prepare_instag_data.
+# Builds one dependency graph over every video of a dataset (process.py, split.py,
+# AU extraction, teeth masks, audio features), runs independent stages
+# concurrently under CPU/GPU slot limits, and skips stages whose completion
+# marker matches the hash of their inputs.
+
+import hashlib
+import json
+import os
+import shlex
+import subprocess
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+
+from .transfer import ArtifactTransfer, local_manifest
+
+CPU = "cpu"
+GPU = "gpu"
+
+AUDIO_EXTRACTORS = {
+    # DeepSpeech feature extraction runs on the CPU; wav2vec/HuBERT use the GPU.
+    "deepspeech": ("python data_utils/deepspeech_features/extract_ds_features.py --input {wav}", CPU),
+    "wav2vec": ("python data_utils/wav2vec.py --wav {wav} --save_feats", GPU),
+    "hubert": ("python data_utils/hubert.py --wav {wav}", GPU),
+}
+
+
+class PipelineError(Exception):
+    """Raised when one or more stages failed; ``summary`` holds every stage's outcome."""
+
+    def __init__(self, message: str, summary: Dict[str, Any]):
+        super().__init__(message)
+        self.summary = summary
+
+
+class StageNode:
+    """One stage of one video in the dataset graph."""
+
+    def __init__(self, video_id: str, stage: str, command: str, resource: str,
+                 deps: Optional[List[str]] = None, inputs: Optional[List[str]] = None, marker_dir: str = ""):
+        self.video_id = video_id
+        self.stage = stage
+        self.command = command
+        self.resource = resource
+        self.deps = deps or []
+        self.inputs = inputs or []
+        self.marker = f"{marker_dir}/.instag_stages/{stage}.done"
+
+    @property
+    def id(self) -> str:
+        return f"{self.video_id}/{self.stage}"
+
+
+def build_dataset_dag(video_ids: List[str], data_dir: str = "data/pretrain", audio_extractor: str = "deepspeech",
+                      split: bool = False, extract_au: bool = False,
+                      easyportrait_dir: str = "data_utils/easyportrait") -> List[StageNode]:
+    """Stages of the setup guide's Phases 5-8 for every video; each video depends only on itself."""
+    q = shlex.quote
+    audio_command, audio_resource = AUDIO_EXTRACTORS[audio_extractor]
+    nodes = []
+    for video_id in video_ids:
+        video_dir = f"{data_dir}/{video_id}"
+        mp4 = f"{video_dir}/{video_id}.mp4"
+        process = f"{video_id}/process"
+        nodes.append(StageNode(video_id, "process", f"python data_utils/process.py {q(mp4)}", GPU,
+                               inputs=[mp4], marker_dir=video_dir))
+        if split:
+            nodes.append(StageNode(video_id, "split", f"python data_utils/split.py {q(mp4)}", CPU,
+                                   deps=[process], inputs=[mp4], marker_dir=video_dir))
+        if extract_au:
+            # OpenFace works on the original video, so it overlaps process.py.
+            nodes.append(StageNode(video_id, "au", f"FeatureExtraction -f {q(mp4)} -out_dir {q(video_dir + '/openface')}"
+                                   f" && cp {q(f'{video_dir}/openface/{video_id}.csv')} {q(video_dir + '/au.csv')}",
+                                   CPU, inputs=[mp4], marker_dir=video_dir))
+        nodes.append(StageNode(video_id, "teeth_mask",
+                               f"env PYTHONPATH={easyportrait_dir} python {easyportrait_dir}/create_teeth_mask.py {q(video_dir)}",
+                               GPU, deps=[process], inputs=[mp4], marker_dir=video_dir))
+        nodes.append(StageNode(video_id, f"audio_{audio_extractor}", audio_command.format(wav=q(f"{video_dir}/{video_id}.wav")),
+                               audio_resource, deps=[process], inputs=[mp4], marker_dir=video_dir))
+    return nodes
+
+
+class LocalBackend:
+    """Runs stages with /bin/sh in a local directory (stub stages in tests, or directly on a pod)."""
+
+    def __init__(self, cwd: str):
+        self.cwd = cwd
+
+    def input_digests(self, paths: List[str]) -> Dict[str, str]:
+        return {p: _digest(local_manifest(os.path.join(self.cwd, p))) for p in paths}
+
+    def read_markers(self, paths: List[str]) -> Dict[str, str]:
+        markers = {}
+        for path in paths:
+            try:
+                with open(os.path.join(self.cwd, path)) as f:
+                    markers[path] = f.read().strip()
+            except OSError:
+                pass
+        return markers
+
+    def run(self, command: str, marker: str, key: str) -> Dict[str, Any]:
+        proc = subprocess.run(["/bin/sh", "-c", command], cwd=self.cwd, capture_output=True, text=True)
+        if proc.returncode == 0:
+            path = os.path.join(self.cwd, marker)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path, "w") as f:
+                f.write(key)
+        return {"exit_status": proc.returncode, "stdout": proc.stdout, "stderr": proc.stderr}
+
+
+class SSHBackend:
+    """Runs stages on a pod through the pooled SSH transport, from the project directory."""
+
+    def __init__(self, transfer: ArtifactTransfer, pod_id: str, project_dir: str, prefix: str = ""):
+        self.transfer = transfer
+        self.pool = transfer.pool
+        self.pod_id = pod_id
+        self.project_dir = project_dir
+        self.prefix = prefix
+
+    def input_digests(self, paths: List[str]) -> Dict[str, str]:
+        manifests = self.transfer.remote_manifests(self.pod_id, [f"{self.project_dir}/{p}" for p in paths])
+        return {p: _digest(manifests[f"{self.project_dir}/{p}"]) for p in paths}
+
+    def read_markers(self, paths: List[str]) -> Dict[str, str]:
+        quoted = " ".join(shlex.quote(p) for p in paths)
+        script = f'cd {shlex.quote(self.project_dir)} && for p in {quoted}; do [ -f "$p" ] && printf "%s\\t%s\\n" "$p" "$(cat "$p")"; done; true'
+        lines = self.pool.run(self.pod_id, script)["stdout"].splitlines()
+        return dict(line.split("\t", 1) for line in lines if "\t" in line)
+
+    def run(self, command: str, marker: str, key: str) -> Dict[str, Any]:
+        q = shlex.quote
+        # The marker is written by the same remote command, so it exists only if the stage succeeded.
+        remote = (f"cd {q(self.project_dir)} && {self.prefix}{command}"
+                  f" && mkdir -p {q(os.path.dirname(marker))} && printf %s {q(key)} > {q(marker)}")
+        return self.pool.run(self.pod_id, remote, check=False)
+
+
+def _digest(manifest: Dict[str, Any]) -> str:
+    if not manifest["exists"]:
+        return "missing"
+    return hashlib.sha256(json.dumps([manifest["size"], manifest["chunks"]]).encode()).hexdigest()
+
+
+class PreprocessPipeline:
+    """Schedules a stage graph with per-resource slot limits and resumable completion markers."""
+
+    def __init__(self, backend, cpu_slots: int = 4, gpu_slots: int = 1,
+                 on_progress: Optional[Callable[[Dict[str, Any]], None]] = None):
+        if cpu_slots < 1 or gpu_slots < 1:
+            raise ValueError(f"cpu_slots and gpu_slots must be at least 1, got {cpu_slots} and {gpu_slots}")
+        self.backend = backend
+        self.slots = {CPU: cpu_slots, GPU: gpu_slots}
+        self.on_progress = on_progress or (lambda event: None)
+
+    def stage_keys(self, nodes: List[StageNode]) -> Dict[str, str]:
+        """Hash each stage's command, raw inputs and upstream keys, so a changed video or
+        command invalidates that stage and everything downstream of it."""
+        digests = self.backend.input_digests(sorted({p for n in nodes for p in n.inputs}))
+        keys: Dict[str, str] = {}
+        by_id = {n.id: n for n in nodes}
+
+        def key(node: StageNode) -> str:
+            if node.id not in keys:
+                h = hashlib.sha256(node.command.encode())
+                for path in node.inputs:
+                    h.update(f"{path}={digests[path]}".encode())
+                for dep in node.deps:
+                    h.update(key(by_id[dep]).encode())
+                keys[node.id] = h.hexdigest()
+            return keys[node.id]
+
+        for node in nodes:
+            key(node)
+        return keys
+
+    def run(self, nodes: List[StageNode]) -> Dict[str, Any]:
+        started = time.monotonic()
+        keys = self.stage_keys(nodes)
+        markers = self.backend.read_markers([n.marker for n in nodes])
+        status: Dict[str, str] = {}
+        for node in nodes:
+            if markers.get(node.marker) == keys[node.id]:
+                status[node.id] = "skipped"
+                self._emit(node, "skipped", status, len(nodes))
+        pending = [n for n in nodes if n.id not in status]
+        running: Dict[Any, StageNode] = {}
+        busy = {CPU: 0, GPU: 0}
+        errors: Dict[str, str] = {}
+        children = {n.id: 0 for n in nodes}
+        for node in nodes:
+            for dep in node.deps:
+                children[dep] += 1
+
+        with ThreadPoolExecutor(max_workers=sum(self.slots.values())) as executor:
+            while pending or running:
+                for node in list(pending):
+                    if any(status.get(dep) in ("failed", "blocked") for dep in node.deps):
+                        pending.remove(node)
+                        status[node.id] = "blocked"
+                        self._emit(node, "blocked", status, len(nodes))
+                # Stages that unblock the most work (process.py) go first.
+                ready = sorted((n for n in pending if all(status.get(d) in ("completed", "skipped") for d in n.deps)),
+                               key=lambda n: -children[n.id])
+                for node in ready:
+                    if busy[node.resource] < self.slots[node.resource]:
+                        busy[node.resource] += 1
+                        pending.remove(node)
+                        status[node.id] = "running"
+                        self._emit(node, "started", status, len(nodes))
+                        running[executor.submit(self._run_stage, node, keys[node.id])] = node
+                if not running:
+                    # Nothing runs and nothing can start: the rest can never become ready.
+                    for node in pending:
+                        status[node.id] = "blocked"
+                        errors[node.id] = f"never became ready (no free {node.resource} slot or dependency left)"
+                        self._emit(node, "blocked", status, len(nodes))
+                    break
+                finished, _ = wait(list(running), return_when=FIRST_COMPLETED)
+                for future in finished:
+                    node = running.pop(future)
+                    busy[node.resource] -= 1
+                    result, elapsed = future.result()
+                    if result["exit_status"] == 0:
+                        status[node.id] = "completed"
+                    else:
+                        status[node.id] = "failed"
+                        errors[node.id] = (result.get("stderr") or result.get("stdout") or "")[-2000:]
+                    self._emit(node, status[node.id], status, len(nodes), elapsed=elapsed)
+
+        summary = {"stages": status, "errors": errors, "seconds": time.monotonic() - started}
+        if errors:
+            raise PipelineError(f"{len(errors)} preprocessing stage(s) failed: {', '.join(sorted(errors))}", summary)
+        return summary
+
+    def _run_stage(self, node: StageNode, key: str):
+        started = time.monotonic()
+        try:
+            result = self.backend.run(node.command, node.marker, key)
+        except Exception as e:
+            result = {"exit_status": -1, "stderr": repr(e)}
+        return result, time.monotonic() - started
+
+    def _emit(self, node: StageNode, event: str, status: Dict[str, str], total: int, elapsed: Optional[float] = None):
+        done = sum(1 for s in status.values() if s in ("completed", "skipped", "failed", "blocked"))
+        progress = {"type": "stage_progress", "video_id": node.video_id, "stage": node.stage, "status": event,
+                    "done": done, "total": total}
+        if elapsed is not None:
+            progress["seconds"] = round(elapsed, 3)
+        self.on_progress(progress)
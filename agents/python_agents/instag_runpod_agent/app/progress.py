@@ -0,0 +1,155 @@
+# Live progress for running tasks.
+# Remote training/inference output is parsed as it streams off the SSH channel
+# into structured progress events, and each task's events are fanned out to any
+# number of subscribers through bounded per-subscriber queues.
+
+import asyncio
+import codecs
+import re
+import time
+from typing import Any, Callable, Dict, Optional, Set
+
+# tqdm bars as printed by InsTaG's train/synthesize scripts, e.g.
+# "Training progress:  45%|████▌     | 4500/10000 [01:23<01:42, 53.51it/s, Loss=0.0123457]"
+_TQDM = re.compile(r"(?:(?P<desc>[^|\r\n]*?):\s*)?(?P<percent>\d+)%\|[^|]*\|\s*(?P<n>\d+)/(?P<total>\d+)"
+                   r"\s*\[(?P<elapsed>[\d:]+)<(?P<remaining>[\d:?]+)")
+_LOSS = re.compile(r"\b[Ll]oss[=:]\s*(?P<loss>[-+]?\d*\.?\d+(?:[eE][-+]?\d+)?)")
+# Milestones such as "[ITER 7000] Evaluating test: L1 0.0123 PSNR 31.2" or "[ITER 7000] Saving Gaussians".
+_ITER = re.compile(r"\[ITER (?P<n>\d+)\]\s*(?P<message>.*)")
+
+
+def _seconds(clock: str) -> Optional[int]:
+    if "?" in clock:
+        return None
+    seconds = 0
+    for part in clock.split(":"):
+        seconds = seconds * 60 + int(part)
+    return seconds
+
+
+def parse_progress(line: str) -> Optional[Dict[str, Any]]:
+    """Turn one line of training/inference output into a progress event, or None."""
+    match = _TQDM.search(line)
+    if match:
+        event: Dict[str, Any] = {
+            "type": "log_progress",
+            "stage": (match["desc"] or "").strip() or None,
+            "iteration": int(match["n"]),
+            "total": int(match["total"]),
+            "progress": int(match["percent"]),
+            "elapsed_seconds": _seconds(match["elapsed"]),
+            "eta_seconds": _seconds(match["remaining"]),
+        }
+        loss = _LOSS.search(line[match.end():])
+        if loss:
+            event["loss"] = float(loss["loss"])
+        return event
+    match = _ITER.search(line)
+    if match:
+        return {"type": "log_progress", "iteration": int(match["n"]), "message": match["message"].strip()}
+    return None
+
+
+class LogProgressParser:
+    """Feeds streamed stdout/stderr bytes through parse_progress and reports what it finds.
+
+    tqdm redraws its bar with carriage returns, so lines are split on both \\r and \\n;
+    bar updates are throttled to one per min_interval while milestones are always reported.
+    """
+
+    def __init__(self, emit: Callable[[Dict[str, Any]], None], min_interval: float = 0.5):
+        self.emit = emit
+        self.min_interval = min_interval
+        self.last: Optional[Dict[str, Any]] = None
+        self._decoders = {False: codecs.getincrementaldecoder("utf-8")("replace"),
+                          True: codecs.getincrementaldecoder("utf-8")("replace")}
+        self._partial = {False: "", True: ""}
+        self._last_emit = 0.0
+        self._pending: Optional[Dict[str, Any]] = None
+
+    def feed(self, data: bytes, stderr: bool = False):
+        text = self._partial[stderr] + self._decoders[stderr].decode(data)
+        *lines, self._partial[stderr] = re.split(r"[\r\n]", text)
+        for line in lines:
+            self._line(line)
+
+    def close(self):
+        for stderr in (False, True):
+            self._line(self._partial[stderr] + self._decoders[stderr].decode(b"", final=True))
+            self._partial[stderr] = ""
+        if self._pending is not None:
+            self._report(self._pending)
+
+    def _line(self, line: str):
+        event = parse_progress(line)
+        if event is None:
+            return
+        now = time.monotonic()
+        stage_changed = self.last is not None and event.get("stage") != self.last.get("stage")
+        if "progress" not in event or stage_changed or now - self._last_emit >= self.min_interval:
+            self._report(event)
+        else:
+            self._pending = event
+
+    def _report(self, event: Dict[str, Any]):
+        self._pending = None
+        self._last_emit = time.monotonic()
+        self.last = event
+        self.emit(event)
+
+
+class Subscription:
+    """One consumer's view of a task's events: a bounded queue that drops the oldest
+    progress event when the consumer falls behind, so it never blocks the producer."""
+
+    def __init__(self, maxsize: int):
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def offer(self, event: Optional[Dict[str, Any]]):
+        if self.queue.full():
+            self.queue.get_nowait()
+            self.dropped += 1
+        self.queue.put_nowait(event)
+
+    async def get(self) -> Optional[Dict[str, Any]]:
+        """Next event; None once the task has finished and every event was delivered."""
+        return await self.queue.get()
+
+
+class Broadcaster:
+    """Fans one task's progress events out to every subscriber; must be used from the event loop."""
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self.subscribers: Set[Subscription] = set()
+        self.closed = False
+        self._last: Optional[Dict[str, Any]] = None
+
+    def publish(self, event: Dict[str, Any]):
+        if self.closed:
+            return
+        self._last = event
+        for subscription in self.subscribers:
+            subscription.offer(event)
+
+    def subscribe(self) -> Subscription:
+        subscription = Subscription(self.maxsize)
+        # Late subscribers start from the latest state instead of replaying history.
+        if self._last is not None:
+            subscription.offer(self._last)
+        if self.closed:
+            subscription.offer(None)
+        else:
+            self.subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        self.subscribers.discard(subscription)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            for subscription in self.subscribers:
+                subscription.offer(None)
+            self.subscribers.clear()
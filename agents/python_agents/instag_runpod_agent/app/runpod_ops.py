@@ -0,0 +1,245 @@
+# Functions for interacting with the RunPod API.
+# Without RUNPOD_API_KEY the module-level helpers return mock data so the agent
+# can be exercised locally; RunPodClient talks to the RunPod REST API.
+
+import asyncio
+import os
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from . import telemetry
+from .task_store import without_secrets
+
+RUNPOD_API_URL = os.environ.get("RUNPOD_API_URL", "https://rest.runpod.io/v1")
+RUNPOD_API_KEY = os.environ.get("RUNPOD_API_KEY", "")
+INSTAG_IMAGE = "batmanosama/instag-runpod:latest"
+
+# Example function (actual implementation would require RunPod SDK or API calls)
+def get_pods():
+    # This is a simplified example. In a real scenario, you'd interact with the RunPod API.
+    print("Fetching list of pods...")
+    # Mock data for now
+    pods = [
+        {"id": "pod1", "name": "MyPod1", "status": "Running"},
+        {"id": "pod2", "name": "MyPod2", "status": "Stopped"}
+    ]
+    return pods
+
+def provision_pod(params: dict):
+    print(f"Provisioning pod with params: {without_secrets(params)}...")
+    # Mock logic
+    return {"status": "success", "message": f"Pod provisioning for {params.get('pod_name')} initiated.", "pod_id": "temp_pod_id_123"}
+
+def terminate_pod(pod_id: str):
+    print(f"Terminating pod: {pod_id}...")
+    # Mock logic
+    return {"status": "success", "message": f"Pod termination for {pod_id} initiated."}
+
+def pod_spec(name: str, gpu_type: str, image: str = INSTAG_IMAGE, volume_gb: int = 100,
+             container_disk_gb: int = 50, volume_mount_path: str = "/workspace/persistent_storage") -> Dict[str, Any]:
+    """Build a create-pod request body matching the setup guide's deployment settings."""
+    return {
+        "name": name,
+        "imageName": image,
+        "gpuTypeIds": [gpu_type],
+        "gpuCount": 1,
+        "containerDiskInGb": container_disk_gb,
+        "volumeInGb": volume_gb,
+        "volumeMountPath": volume_mount_path,
+        "ports": ["22/tcp"],
+    }
+
+def ssh_endpoint(pod: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """Return SSH connection params for a running pod, or None while it is still booting."""
+    port = (pod.get("portMappings") or {}).get("22")
+    if pod.get("desiredStatus") != "RUNNING" or not pod.get("publicIp") or not port:
+        return None
+    return {"host": pod["publicIp"], "port": int(port), "username": "root"}
+
+class RunPodClient:
+    """Async client for the RunPod REST API (pods endpoints), shared by every operation.
+
+    - one keep-alive connection pool for all requests
+    - identical concurrent GETs are coalesced into a single API call
+    - pod inventory/status is cached for ``cache_ttl`` seconds and served stale for up
+      to ``stale_ttl`` more while it is refreshed in the background; create/delete
+      invalidate the affected entries
+    - ``wait_for_pod`` waiters share one background poller of the pod list instead of
+      each polling the API
+    """
+
+    def __init__(self, api_key: Optional[str] = None, base_url: str = RUNPOD_API_URL,
+                 transport: Optional[httpx.AsyncBaseTransport] = None, timeout: float = 30.0,
+                 cache_ttl: float = 2.0, stale_ttl: float = 30.0, poll_interval: float = 2.0,
+                 max_connections: int = 20):
+        api_key = api_key or RUNPOD_API_KEY
+        self.cache_ttl = cache_ttl
+        self.stale_ttl = stale_ttl
+        self.poll_interval = poll_interval
+        self._http = httpx.AsyncClient(
+            base_url=base_url, transport=transport, timeout=timeout,
+            headers={"Authorization": f"Bearer {api_key}"},
+            limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections,
+                                keepalive_expiry=60.0),
+        )
+        self._cache: Dict[str, Tuple[float, Any]] = {}
+        self._generation: Dict[str, int] = {}
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._waiters: Dict[str, List[Tuple[Callable[[Dict[str, Any]], bool], asyncio.Future]]] = {}
+        self._poller: Optional[asyncio.Task] = None
+        self.api_calls = 0
+        self.in_flight = 0
+
+    async def list_pods(self) -> List[Dict[str, Any]]:
+        return await self._cached_get("/pods")
+
+    async def get_pod(self, pod_id: str) -> Dict[str, Any]:
+        return await self._cached_get(f"/pods/{pod_id}")
+
+    async def create_pod(self, spec: Dict[str, Any]) -> Dict[str, Any]:
+        pod = await self._request("POST", "/pods", json=spec)
+        self.invalidate("/pods")
+        return pod
+
+    async def delete_pod(self, pod_id: str):
+        await self._request("DELETE", f"/pods/{pod_id}")
+        self.invalidate("/pods", f"/pods/{pod_id}")
+
+    def invalidate(self, *paths: str):
+        """Drop cached entries; fetches already in flight for them will not repopulate the cache."""
+        for path in paths:
+            self._cache.pop(path, None)
+            self._generation[path] = self._generation.get(path, 0) + 1
+
+    async def wait_for_pod(self, pod_id: str, predicate: Callable[[Dict[str, Any]], bool],
+                           timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Wait until the pod's status satisfies predicate, fed by the shared poller."""
+        cached = self._cache.get(f"/pods/{pod_id}")
+        if cached is not None and predicate(cached[1]):
+            return cached[1]
+        future = asyncio.get_running_loop().create_future()
+        waiters = self._waiters.setdefault(pod_id, [])
+        waiters.append((predicate, future))
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.get_running_loop().create_task(self._poll())
+        try:
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            if (predicate, future) in waiters:
+                waiters.remove((predicate, future))
+            if not waiters:
+                self._waiters.pop(pod_id, None)
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+            await asyncio.gather(self._poller, return_exceptions=True)
+        await self._http.aclose()
+
+    async def _cached_get(self, path: str) -> Any:
+        entry = self._cache.get(path)
+        if entry is not None:
+            age = time.monotonic() - entry[0]
+            if age < self.cache_ttl:
+                return entry[1]
+            if age < self.cache_ttl + self.stale_ttl:
+                self._fetch(path)  # stale-while-revalidate
+                return entry[1]
+        return await asyncio.shield(self._fetch(path))
+
+    def _fetch(self, path: str) -> asyncio.Task:
+        """Start a GET for path, or join the one already in flight (single-flight)."""
+        task = self._inflight.get(path)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._get_and_store(path))
+            self._inflight[path] = task
+            task.add_done_callback(lambda t: (self._inflight.pop(path, None), t.cancelled() or t.exception()))
+        return task
+
+    async def _get_and_store(self, path: str) -> Any:
+        generation = self._generation.get(path, 0)
+        value = await self._request("GET", path)
+        if self._generation.get(path, 0) == generation:
+            now = time.monotonic()
+            self._cache[path] = (now, value)
+            if path == "/pods":
+                # The inventory refreshes every per-pod status entry as well.
+                for pod in value:
+                    self._cache[f"/pods/{pod['id']}"] = (now, pod)
+        self._dispatch(value if path == "/pods" else [value])
+        return value
+
+    def _dispatch(self, pods: List[Dict[str, Any]]):
+        for pod in pods:
+            for predicate, future in self._waiters.get(pod.get("id"), []):
+                if not future.done() and predicate(pod):
+                    future.set_result(pod)
+
+    async def _poll(self):
+        while self._waiters:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                pods = await asyncio.shield(self._fetch("/pods"))
+            except Exception as e:
+                print(f"[runpod_ops] Pod status poll failed: {e!r}")
+                continue
+            known = {pod["id"] for pod in pods}
+            missing = [pod_id for pod_id in self._waiters if pod_id not in known]
+            if missing:
+                await asyncio.gather(*(self._confirm_gone(pod_id) for pod_id in missing))
+
+    async def _confirm_gone(self, pod_id: str):
+        # The list may predate the pod (it was fetched while create_pod ran), so only a 404 for
+        # the pod itself fails its waiters; a pod that is found is dispatched like a poll result.
+        try:
+            await asyncio.shield(self._fetch(f"/pods/{pod_id}"))
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code != 404:
+                print(f"[runpod_ops] Could not check pod {pod_id}: {e!r}")
+                return
+            for _, future in self._waiters.get(pod_id, []):
+                if not future.done():
+                    future.set_exception(LookupError(f"Pod {pod_id} no longer exists"))
+        except Exception as e:
+            print(f"[runpod_ops] Could not check pod {pod_id}: {e!r}")
+
+    async def _request(self, method: str, path: str, **kwargs) -> Any:
+        self.api_calls += 1
+        self.in_flight += 1
+        started = time.perf_counter()
+        status = "error"
+        try:
+            with telemetry.span(f"runpod {method}", **{"http.method": method, "url.path": path}):
+                headers = telemetry.inject(dict(kwargs.pop("headers", None) or {}))
+                response = await self._http.request(method, path, headers=headers, **kwargs)
+                status = str(response.status_code)
+                response.raise_for_status()
+                return response.json() if response.content else None
+        finally:
+            self.in_flight -= 1
+            telemetry.RUNPOD_REQUEST_SECONDS.labels(method, status).observe(time.perf_counter() - started)
+
+_shared_client: Optional[RunPodClient] = None
+
+def shared_client() -> RunPodClient:
+    """The process-wide RunPodClient, so every operation shares its pool, cache and poller."""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = RunPodClient()
+        telemetry.register_gauges("runpod", lambda: [
+            ("instag_runpod_requests_in_flight", "RunPod API requests awaiting a response", {}, _shared_client.in_flight),
+        ] if _shared_client is not None else [])
+    return _shared_client
+
+async def close_shared_client():
+    global _shared_client
+    if _shared_client is not None:
+        await _shared_client.close()
+        _shared_client = None
+
+if __name__ == '__main__':
+    # Example usage (optional)
+    pods_data = get_pods()
+    print(pods_data)
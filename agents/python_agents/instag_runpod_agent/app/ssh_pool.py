@@ -0,0 +1,326 @@
+# Pooled SSH sessions for reaching RunPod pods.
+# One authenticated paramiko Transport is kept per pod; every command opens a
+# lightweight session channel on it instead of paying a new TCP+SSH handshake.
+
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterator, List, Optional, Set
+
+from . import telemetry
+
+if TYPE_CHECKING:
+    # paramiko is the slowest import in the agent; it is loaded on first SSH use so the
+    # agent starts (and answers discovery) without it.
+    import paramiko
+
+
+class SSHCommandError(Exception):
+    """Raised when a remote command exits with a non-zero status."""
+
+    def __init__(self, pod_id: str, command: str, result: Dict[str, Any]):
+        super().__init__(f"Command on {pod_id} exited with {result['exit_status']}: {command}")
+        self.pod_id = pod_id
+        self.command = command
+        self.result = result
+
+
+class _PodConnection:
+    def __init__(self, pod_id: str, host: str, port: int, username: str, auth: Dict[str, Any], max_channels: int):
+        self.pod_id = pod_id
+        self.host = host
+        self.port = port
+        self.username = username
+        self.auth = auth
+        self.client: Optional["paramiko.SSHClient"] = None
+        self.lock = threading.Lock()
+        # OpenSSH's default MaxSessions is 10; stay under it per transport.
+        self.channels = threading.BoundedSemaphore(max_channels)
+        self.sessions: Set["paramiko.Channel"] = set()  # open_session channels holding a slot
+        self.in_use = 0
+        self.last_used = time.monotonic()
+        self.connects = 0
+
+    def transport(self) -> Optional["paramiko.Transport"]:
+        return self.client.get_transport() if self.client is not None else None
+
+    def is_active(self) -> bool:
+        transport = self.transport()
+        return transport is not None and transport.is_active()
+
+    def close(self):
+        if self.client is not None:
+            self.client.close()
+            self.client = None
+
+
+class SSHPool:
+    """Keeps one multiplexed SSH transport per pod, with keepalive, idle eviction and reconnect.
+
+    While pods are registered a background thread closes idle transports every
+    ``evict_interval`` seconds (default: a quarter of ``idle_ttl``, at most a minute).
+    """
+
+    def __init__(self, keepalive: int = 30, idle_ttl: float = 300.0, max_channels: int = 8,
+                 connect_timeout: float = 15.0, max_workers: int = 16, evict_interval: Optional[float] = None):
+        self.keepalive = keepalive
+        self.idle_ttl = idle_ttl
+        self.max_channels = max_channels
+        self.connect_timeout = connect_timeout
+        self.evict_interval = evict_interval if evict_interval is not None else min(idle_ttl / 4, 60.0)
+        self._pods: Dict[str, _PodConnection] = {}
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="instag-ssh")
+        self._evictor: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+
+    def register(self, pod_id: str, host: str, port: int = 22, username: str = "root", **auth):
+        """Record how to reach a pod; auth accepts paramiko connect kwargs (key_filename, pkey, password)."""
+        with self._lock:
+            conn = self._pods.get(pod_id)
+            if conn is not None and (conn.host, conn.port, conn.username, conn.auth) == (host, int(port), username, auth):
+                return
+            if conn is not None:
+                conn.close()
+            self._pods[pod_id] = _PodConnection(pod_id, host, int(port), username, auth, self.max_channels)
+            self._stopping.clear()
+            if self._evictor is None:
+                self._evictor = threading.Thread(target=self._evict_periodically, name="instag-ssh-evict",
+                                                 daemon=True)
+                self._evictor.start()
+
+    def unregister(self, pod_id: str):
+        """Forget a terminated pod and close its transport."""
+        with self._lock:
+            conn = self._pods.pop(pod_id, None)
+        if conn is not None:
+            with conn.lock:
+                conn.close()
+
+    def has(self, pod_id: str) -> bool:
+        return pod_id in self._pods
+
+    def run(self, pod_id: str, command: str, timeout: Optional[float] = None, check: bool = True,
+            on_output: Optional[Callable[[bytes, bool], None]] = None) -> Dict[str, Any]:
+        """Run a command on a fresh channel of the pod's pooled transport.
+
+        on_output(data, is_stderr) is called with output as it arrives, for live progress.
+        """
+        import paramiko
+        conn = self._conn(pod_id)
+        with conn.channels:
+            with conn.lock:
+                conn.in_use += 1
+            try:
+                try:
+                    channel = self._open_channel(conn)
+                except (paramiko.SSHException, OSError, EOFError):
+                    # The transport died between uses (pod restart, NAT timeout); reconnect once.
+                    # A socket closed under paramiko surfaces as EOFError.
+                    with conn.lock:
+                        conn.close()
+                    channel = self._open_channel(conn)
+                with telemetry.timed(telemetry.SSH_COMMAND_SECONDS):
+                    result = self._exec(channel, command, timeout, on_output)
+            finally:
+                with conn.lock:
+                    conn.in_use -= 1
+                    conn.last_used = time.monotonic()
+        result["command"] = command
+        if check and result["exit_status"] != 0:
+            raise SSHCommandError(pod_id, command, result)
+        return result
+
+    @contextmanager
+    def sftp(self, pod_id: str) -> Iterator["paramiko.SFTPClient"]:
+        """Open an SFTP session as one more channel of the pod's pooled transport."""
+        import paramiko
+        conn = self._conn(pod_id)
+        with conn.channels:
+            with conn.lock:
+                conn.in_use += 1
+            try:
+                try:
+                    client = paramiko.SFTPClient.from_transport(self._transport(conn))
+                except (paramiko.SSHException, OSError, EOFError):
+                    with conn.lock:
+                        conn.close()
+                    client = paramiko.SFTPClient.from_transport(self._transport(conn))
+                try:
+                    yield client
+                finally:
+                    client.close()
+            finally:
+                with conn.lock:
+                    conn.in_use -= 1
+                    conn.last_used = time.monotonic()
+
+    def open_session(self, pod_id: str, command: str) -> "paramiko.Channel":
+        """Start a long-running command (a resident worker) on its own channel of the pooled transport.
+
+        The caller streams stdin/stdout over the returned channel and hands it back to
+        close_session; while it is open the transport is never evicted as idle.
+        """
+        import paramiko
+        conn = self._conn(pod_id)
+        # The session holds one of the transport's max_channels slots until close_session.
+        conn.channels.acquire()
+        try:
+            try:
+                channel = self._open_channel(conn)
+            except (paramiko.SSHException, OSError, EOFError):
+                with conn.lock:
+                    conn.close()
+                channel = self._open_channel(conn)
+            channel.exec_command(command)
+        except BaseException:
+            conn.channels.release()
+            raise
+        with conn.lock:
+            conn.in_use += 1
+            conn.sessions.add(channel)
+        return channel
+
+    def close_session(self, pod_id: str, channel: "paramiko.Channel"):
+        channel.close()
+        conn = self._pods.get(pod_id)
+        if conn is None:
+            return
+        with conn.lock:
+            # Ignore channels this connection did not open (e.g. the pod was re-registered).
+            if channel not in conn.sessions:
+                return
+            conn.sessions.discard(channel)
+            conn.in_use -= 1
+            conn.last_used = time.monotonic()
+        conn.channels.release()
+
+    def run_many(self, pod_id: str, commands: List[str], timeout: Optional[float] = None,
+                 check: bool = True) -> List[Dict[str, Any]]:
+        """Run independent commands concurrently as parallel channels of one transport."""
+        futures = [self._executor.submit(self.run, pod_id, command, timeout, check) for command in commands]
+        return [future.result() for future in futures]
+
+    def evict_idle(self) -> int:
+        """Close transports that have not been used for idle_ttl seconds; returns how many were closed."""
+        now = time.monotonic()
+        evicted = 0
+        for conn in list(self._pods.values()):
+            with conn.lock:
+                if conn.client is not None and conn.in_use == 0 and now - conn.last_used > self.idle_ttl:
+                    conn.close()
+                    evicted += 1
+        return evicted
+
+    def stats(self) -> Dict[str, Dict[str, Any]]:
+        return {
+            pod_id: {"active": conn.is_active(), "in_use": conn.in_use, "connects": conn.connects}
+            for pod_id, conn in self._pods.items()
+        }
+
+    def close(self, pod_id: Optional[str] = None):
+        """Close one pod's transport, or every transport (and the eviction thread) when pod_id is None."""
+        if pod_id is None:
+            self._stopping.set()
+            conns = list(self._pods.values())
+        else:
+            conns = [self._pods[pod_id]] if pod_id in self._pods else []
+        for conn in conns:
+            with conn.lock:
+                conn.close()
+
+    def _conn(self, pod_id: str) -> _PodConnection:
+        conn = self._pods.get(pod_id)
+        if conn is None:
+            raise KeyError(f"No SSH endpoint registered for pod {pod_id}")
+        self.evict_idle()
+        return conn
+
+    def _evict_periodically(self):
+        # Runs until close() or until no pods are left; register() starts it again.
+        while True:
+            stopping = self._stopping.wait(self.evict_interval)
+            if not stopping:
+                self.evict_idle()
+            with self._lock:
+                if self._stopping.is_set() or not self._pods:
+                    self._evictor = None
+                    return
+
+    def _transport(self, conn: _PodConnection) -> "paramiko.Transport":
+        with conn.lock:
+            if not conn.is_active():
+                conn.close()
+                with telemetry.timed(telemetry.SSH_CONNECT_SECONDS):
+                    conn.client = self._connect(conn)
+                conn.connects += 1
+            return conn.transport()
+
+    def _open_channel(self, conn: _PodConnection) -> "paramiko.Channel":
+        return self._transport(conn).open_session(timeout=self.connect_timeout)
+
+    def _connect(self, conn: _PodConnection) -> "paramiko.SSHClient":
+        import paramiko
+        client = paramiko.SSHClient()
+        # RunPod pods are ephemeral and their host keys change on every deploy.
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        # Channel traffic is many small request/reply packets; without TCP_NODELAY
+        # Nagle plus delayed ACKs adds tens of milliseconds to every command.
+        sock = socket.create_connection((conn.host, conn.port), timeout=self.connect_timeout)
+        try:
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            client.connect(conn.host, port=conn.port, username=conn.username, sock=sock, timeout=self.connect_timeout,
+                           banner_timeout=self.connect_timeout, auth_timeout=self.connect_timeout,
+                           allow_agent=False, look_for_keys=False, **conn.auth)
+        except BaseException:
+            # Bad auth or a banner timeout: paramiko does not close a socket it was handed.
+            client.close()
+            sock.close()
+            raise
+        client.get_transport().set_keepalive(self.keepalive)
+        return client
+
+    @staticmethod
+    def _exec(channel: "paramiko.Channel", command: str, timeout: Optional[float],
+              on_output: Optional[Callable[[bytes, bool], None]] = None) -> Dict[str, Any]:
+        stdout, stderr = [], []
+        deadline = time.monotonic() + timeout if timeout else None
+        try:
+            # Progress bars (tqdm) write to stderr only; poll it more often when someone is listening.
+            channel.settimeout(0.2 if on_output else 1.0)
+            on_output = on_output or (lambda data, is_stderr: None)
+            channel.exec_command(command)
+            # Block on stdout (wakes as soon as data or EOF arrives) and drain
+            # stderr alongside it so neither stream can fill the SSH window.
+            while True:
+                try:
+                    data = channel.recv(32768)
+                except socket.timeout:
+                    data = None
+                while channel.recv_stderr_ready():
+                    stderr.append(channel.recv_stderr(32768))
+                    on_output(stderr[-1], True)
+                if data == b"":
+                    break
+                if data:
+                    stdout.append(data)
+                    on_output(data, False)
+                # Checked on every pass, so a command that keeps printing still times out.
+                if deadline is not None and time.monotonic() > deadline:
+                    raise socket.timeout(f"Command timed out after {timeout}s: {command}")
+            while True:
+                data = channel.recv_stderr(32768)
+                if not data:
+                    break
+                stderr.append(data)
+                on_output(data, True)
+            exit_status = channel.recv_exit_status()
+        finally:
+            channel.close()
+        return {
+            "exit_status": exit_status,
+            "stdout": b"".join(stdout).decode(errors="replace"),
+            "stderr": b"".join(stderr).decode(errors="replace"),
+        }
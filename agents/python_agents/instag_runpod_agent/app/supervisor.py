@@ -0,0 +1,82 @@
+# Multi-process launcher for the agent (python -m app.main with INSTAG_WORKERS > 1).
+# uvicorn --workers binds its listening socket without IPPROTO_TCP, so asyncio never
+# enables TCP_NODELAY on accepted connections and small replies wait ~40 ms for
+# delayed ACKs. This launcher binds the socket itself, shares it with every worker
+# process and restarts workers that exit; workers share task state through the
+# TaskStore (INSTAG_TASK_DB), so a restarted worker resumes what its predecessor left.
+# Workers share a PROMETHEUS_MULTIPROC_DIR so /metrics on any of them reports all of them.
+
+import glob
+import multiprocessing
+import os
+import signal
+import socket
+import tempfile
+import time
+from typing import Dict, Optional
+
+
+def _worker(app: str, sock: socket.socket):
+    import uvicorn
+    uvicorn.Server(uvicorn.Config(app)).run(sockets=[sock])
+
+
+def _metrics_dir() -> Optional[str]:
+    """An empty multiprocess metrics directory, exported to the workers; None when metrics are off."""
+    try:
+        import prometheus_client  # noqa: F401
+    except ImportError:
+        return None
+    if os.environ.get("INSTAG_METRICS", "1") == "0":
+        return None
+    path = os.environ.get("PROMETHEUS_MULTIPROC_DIR") or tempfile.mkdtemp(prefix="instag-metrics-")
+    os.makedirs(path, exist_ok=True)
+    _clear_metrics(path)  # files left by an earlier run would be summed into this one's counters
+    os.environ["PROMETHEUS_MULTIPROC_DIR"] = path
+    return path
+
+
+def _clear_metrics(path: str):
+    for name in glob.glob(os.path.join(path, "*.db")):
+        os.remove(name)
+
+
+def _worker_exited(pid: int, metrics_dir: Optional[str]):
+    if metrics_dir is not None:
+        from prometheus_client import multiprocess
+        # Drops the dead worker's live gauges; its counters keep counting toward the totals.
+        multiprocess.mark_process_dead(pid, metrics_dir)
+
+
+def serve(app: str, host: str, port: int, workers: int, poll_interval: float = 0.5):
+    """Run ``workers`` uvicorn processes for the app import string until SIGTERM/SIGINT."""
+    metrics_dir = _metrics_dir()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM, socket.IPPROTO_TCP)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.set_inheritable(True)
+    print(f"[supervisor] Serving {app} on {host}:{port} with {workers} workers")
+    context = multiprocessing.get_context("spawn")
+    processes: Dict[int, multiprocessing.Process] = {}
+    stopping = []
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *_: stopping.append(True))
+    while not stopping:
+        for slot in range(workers):
+            process = processes.get(slot)
+            if process is not None and process.is_alive():
+                continue
+            if process is not None:
+                print(f"[supervisor] Worker {process.pid} exited with {process.exitcode}; restarting")
+                _worker_exited(process.pid, metrics_dir)
+            # Spawned children receive the socket with its protocol intact, so asyncio sets TCP_NODELAY.
+            processes[slot] = context.Process(target=_worker, args=(app, sock), name=f"instag-worker-{slot}")
+            processes[slot].start()
+        time.sleep(poll_interval)
+    for process in processes.values():
+        process.terminate()
+    for process in processes.values():
+        process.join(30)
+    sock.close()
+    if metrics_dir is not None:
+        _clear_metrics(metrics_dir)
@@ -0,0 +1,301 @@
+# Durable task and pod-lease store shared by every agent worker process.
+# SQLite in WAL mode, so readers never block the writer and any worker can answer
+# status queries for any task. A task belongs to the worker that inserted or
+# reclaimed it; ownership changes are single UPDATE statements, so two workers can
+# never run the same task. Owners heartbeat their active tasks, and tasks whose
+# owner stopped heartbeating (crash, restart) are reclaimed and resumed.
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, List, Optional
+
+ACTIVE_STATES = ("accepted", "running")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id TEXT PRIMARY KEY,
+    operation TEXT NOT NULL,
+    params TEXT NOT NULL,
+    pod_id TEXT,
+    status TEXT NOT NULL,
+    result TEXT,
+    error TEXT,
+    progress TEXT NOT NULL DEFAULT '[]',
+    trace_id TEXT,
+    owner TEXT,
+    heartbeat_at REAL NOT NULL DEFAULT 0,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    started_at REAL,
+    finished_at REAL
+);
+CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, heartbeat_at);
+CREATE INDEX IF NOT EXISTS tasks_pod ON tasks (pod_id);
+CREATE INDEX IF NOT EXISTS tasks_owner ON tasks (owner);
+CREATE TABLE IF NOT EXISTS pod_leases (
+    pod_id TEXT PRIMARY KEY,
+    task_id TEXT,
+    owner TEXT NOT NULL,
+    gpu_type TEXT,
+    ssh TEXT,
+    leased_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS pod_leases_task ON pod_leases (task_id);
+CREATE TABLE IF NOT EXISTS warm_pods (
+    pod_id TEXT PRIMARY KEY,
+    gpu_type TEXT NOT NULL,
+    state TEXT NOT NULL,
+    ssh TEXT,
+    artifacts TEXT NOT NULL DEFAULT '[]',
+    task_id TEXT,
+    owner TEXT,
+    idle_since REAL NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS roles (
+    name TEXT PRIMARY KEY,
+    owner TEXT NOT NULL,
+    heartbeat_at REAL NOT NULL
+);
+"""
+
+_JSON_COLUMNS = ("params", "result", "progress", "ssh", "artifacts")
+# SSH auth arguments (paramiko connect kwargs) are never written to the database; a task
+# resumed by another worker reconnects with the agent's INSTAG_SSH_KEY_FILE instead.
+_SECRET_KEYS = frozenset({"password", "passphrase", "pkey", "key_filename"})
+
+
+def without_secrets(value: Any) -> Any:
+    """Copy of ``value`` with SSH auth arguments removed at any depth (for storage and logs)."""
+    if isinstance(value, dict):
+        return {k: without_secrets(v) for k, v in value.items() if k not in _SECRET_KEYS}
+    if isinstance(value, list):
+        return [without_secrets(v) for v in value]
+    return value
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class TaskStore:
+    """Tasks and pod leases in one SQLite database, shared by all workers on a host (or a shared volume).
+
+    ``lease_ttl`` is how long an owner may go without heartbeating before its active
+    tasks are reclaimed by another worker.
+    """
+
+    def __init__(self, path: str, lease_ttl: float = 30.0):
+        self.path = path
+        self.lease_ttl = lease_ttl
+        self.host = socket.gethostname()
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._db: Optional[sqlite3.Connection] = None
+        self.worker_id = ""
+        self._connect()
+
+    def create(self, task_id: str, operation: str, params: Dict[str, Any], trace_id: Optional[str] = None) -> bool:
+        """Insert a new task owned by this worker; False when the task_id already exists.
+
+        SSH credentials in ``params`` are dropped; only the worker that accepted the task holds them.
+        """
+        now = time.time()
+        cursor = self._execute(
+            "INSERT OR IGNORE INTO tasks (task_id, operation, params, pod_id, status, trace_id, owner, heartbeat_at,"
+            " created_at) VALUES (?, ?, ?, ?, 'accepted', ?, ?, ?, ?)",
+            (task_id, operation, json.dumps(without_secrets(params), default=str), params.get("pod_id"), trace_id, self.worker_id,
+             now, now))
+        return cursor.rowcount == 1
+
+    def get(self, task_id: str) -> Optional[Dict[str, Any]]:
+        rows = self._query("SELECT * FROM tasks WHERE task_id = ?", (task_id,))
+        return rows[0] if rows else None
+
+    def find(self, status: Optional[str] = None, pod_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        clauses, args = [], []
+        if status is not None:
+            clauses.append("status = ?")
+            args.append(status)
+        if pod_id is not None:
+            clauses.append("pod_id = ?")
+            args.append(pod_id)
+        where = f" WHERE {' AND '.join(clauses)}" if clauses else ""
+        return self._query(f"SELECT * FROM tasks{where} ORDER BY created_at", args)
+
+    def update(self, task_id: str, **fields) -> bool:
+        """Write task fields; ignored (False) unless this worker still owns the task."""
+        for column in _JSON_COLUMNS:
+            if column in fields:
+                fields[column] = json.dumps(fields[column], default=str)
+        assignments = ", ".join(f"{column} = ?" for column in fields)
+        cursor = self._execute(f"UPDATE tasks SET {assignments} WHERE task_id = ? AND owner = ?",
+                               (*fields.values(), task_id, self.worker_id))
+        return cursor.rowcount == 1
+
+    def release(self, task_id: str):
+        """Give up an unfinished task (graceful shutdown) so another worker picks it up immediately."""
+        self._execute("UPDATE tasks SET owner = NULL, heartbeat_at = 0 WHERE task_id = ? AND owner = ?",
+                      (task_id, self.worker_id))
+
+    def heartbeat(self, progress: Optional[Dict[str, List[Dict[str, Any]]]] = None) -> int:
+        """Renew this worker's claim on its active tasks, saving any new progress; returns how many it holds."""
+        now = time.time()
+        with self._lock:
+            db = self._conn()
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                for task_id, events in (progress or {}).items():
+                    db.execute("UPDATE tasks SET progress = ? WHERE task_id = ? AND owner = ?",
+                               (json.dumps(events, default=str), task_id, self.worker_id))
+                held = db.execute("UPDATE tasks SET heartbeat_at = ? WHERE owner = ? AND status IN (?, ?)",
+                                  (now, self.worker_id, *ACTIVE_STATES)).rowcount
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        return held
+
+    def reclaim(self) -> List[Dict[str, Any]]:
+        """Take over active tasks whose owner stopped heartbeating or, on this host, has exited.
+
+        The takeover is a single UPDATE ... RETURNING, so when several workers reclaim
+        at once each task goes to exactly one of them.
+        """
+        owners = self._query("SELECT DISTINCT owner FROM tasks WHERE status IN (?, ?) AND owner IS NOT NULL"
+                             " AND owner != ?", (*ACTIVE_STATES, self.worker_id))
+        dead = [row["owner"] for row in owners if self._owner_exited(row["owner"])]
+        now = time.time()
+        marks = ", ".join("?" * len(dead))
+        dead_clause = f" OR owner IN ({marks})" if dead else ""
+        return self._query(
+            "UPDATE tasks SET owner = ?, heartbeat_at = ?, status = 'accepted', attempts = attempts + 1"
+            " WHERE status IN (?, ?) AND owner IS NOT ?"
+            f" AND (owner IS NULL OR heartbeat_at < ?{dead_clause}) RETURNING *",
+            (self.worker_id, now, *ACTIVE_STATES, self.worker_id, now - self.lease_ttl, *dead), write=True)
+
+    def lease_pod(self, pod_id: str, task_id: Optional[str], gpu_type: Optional[str] = None,
+                  ssh: Optional[Dict[str, Any]] = None):
+        self._execute("INSERT OR REPLACE INTO pod_leases (pod_id, task_id, owner, gpu_type, ssh, leased_at)"
+                      " VALUES (?, ?, ?, ?, ?, ?)",
+                      (pod_id, task_id, self.worker_id, gpu_type, json.dumps(without_secrets(ssh)), time.time()))
+
+    def release_pod(self, pod_id: str):
+        self._execute("DELETE FROM pod_leases WHERE pod_id = ?", (pod_id,))
+
+    def pod_leases(self, task_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        if task_id is None:
+            return self._query("SELECT * FROM pod_leases ORDER BY leased_at")
+        return self._query("SELECT * FROM pod_leases WHERE task_id = ?", (task_id,))
+
+    def save_warm_pod(self, pod: Dict[str, Any]):
+        self._execute("INSERT OR REPLACE INTO warm_pods (pod_id, gpu_type, state, ssh, artifacts, task_id, owner,"
+                      " idle_since, created_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                      (pod["pod_id"], pod["gpu_type"], pod["state"], json.dumps(without_secrets(pod["ssh"])), json.dumps(pod["artifacts"]),
+                       pod["task_id"], pod["owner"], pod["idle_since"], pod["created_at"]))
+
+    def warm_pods(self) -> List[Dict[str, Any]]:
+        return self._query("SELECT * FROM warm_pods ORDER BY created_at")
+
+    def take_warm_pod(self, pod_id: str, state: str, task_id: Optional[str] = None) -> bool:
+        """Move an idle warm pod to ``state``; False when another worker took it first."""
+        cursor = self._execute("UPDATE warm_pods SET state = ?, task_id = ? WHERE pod_id = ? AND state = 'idle'",
+                               (state, task_id, pod_id))
+        return cursor.rowcount == 1
+
+    def delete_warm_pod(self, pod_id: str):
+        self._execute("DELETE FROM warm_pods WHERE pod_id = ?", (pod_id,))
+
+    def acquire_role(self, name: str) -> bool:
+        """Take or renew a role only one worker may hold (e.g. warm pool maintenance).
+
+        The role passes to another worker once its holder stops renewing for ``lease_ttl``
+        seconds or, on this host, has exited.
+        """
+        now = time.time()
+        rows = self._query("SELECT owner FROM roles WHERE name = ?", (name,))
+        dead = rows[0]["owner"] if rows and self._owner_exited(rows[0]["owner"]) else None
+        cursor = self._execute(
+            "INSERT INTO roles (name, owner, heartbeat_at) VALUES (?, ?, ?) ON CONFLICT (name) DO UPDATE SET"
+            " owner = excluded.owner, heartbeat_at = excluded.heartbeat_at"
+            " WHERE roles.owner = excluded.owner OR roles.heartbeat_at < ? OR roles.owner IS ?",
+            (name, self.worker_id, now, now - self.lease_ttl, dead))
+        return cursor.rowcount == 1
+
+    def release_role(self, name: str):
+        self._execute("DELETE FROM roles WHERE name = ? AND owner = ?", (name, self.worker_id))
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _owner_exited(self, owner: str) -> bool:
+        host, _, rest = owner.partition(":")
+        pid = rest.split(":", 1)[0]
+        return host == self.host and pid.isdigit() and not _pid_alive(int(pid))
+
+    def _connect(self):
+        self._pid = os.getpid()
+        # Unique per process start, so a restarted worker with a recycled pid is still a new owner.
+        self.worker_id = f"{self.host}:{self._pid}:{uuid.uuid4().hex[:8]}"
+        # Autocommit; multi-statement writes use explicit BEGIN IMMEDIATE.
+        self._db = sqlite3.connect(self.path, timeout=10.0, isolation_level=None, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        # WAL + NORMAL fsyncs at checkpoints only; a power loss can drop the last commits but never corrupts.
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # SQLite connections must not cross fork(); a forked worker opens its own.
+        if self._db is None or self._pid != os.getpid():
+            self._connect()
+        return self._db
+
+    def _execute(self, sql: str, args: Iterable[Any] = ()) -> sqlite3.Cursor:
+        with self._lock:
+            return self._conn().execute(sql, tuple(args))
+
+    def _query(self, sql: str, args: Iterable[Any] = (), write: bool = False) -> List[Dict[str, Any]]:
+        with self._lock:
+            db = self._conn()
+            if write:
+                db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = [self._decode(row) for row in db.execute(sql, tuple(args)).fetchall()]
+                if write:
+                    db.execute("COMMIT")
+            except BaseException:
+                if write:
+                    db.execute("ROLLBACK")
+                raise
+        return rows
+
+    @staticmethod
+    def _decode(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        for column in _JSON_COLUMNS:
+            if record.get(column) is not None:
+                record[column] = json.loads(record[column])
+        return record
+
+
+def store_from_env() -> Optional[TaskStore]:
+    """TaskStore at INSTAG_TASK_DB; None (in-memory tasks, single worker) when unset."""
+    path = os.environ.get("INSTAG_TASK_DB")
+    if not path:
+        return None
+    return TaskStore(path, lease_ttl=float(os.environ.get("INSTAG_TASK_LEASE_TTL", "30")))
@@ -0,0 +1,223 @@
+# Prometheus metrics and OpenTelemetry trace propagation for the agent.
+# A2A series reuse the Elixir agent's metric names (a2a_messages_total,
+# a2a_request_latency_seconds, ...) so both halves of a workflow land in the same
+# Grafana panels, split by the scrape job. Pool and queue gauges are read from the
+# live objects at scrape time and cost nothing on the hot path. Set
+# INSTAG_METRICS=0 to turn every hook into a no-op.
+# With several worker processes (app/supervisor.py) PROMETHEUS_MULTIPROC_DIR is set:
+# counters and histograms are summed across workers on every scrape, and each worker
+# publishes its gauges there so any worker answers /metrics for all of them.
+# Tracing uses opentelemetry-api when it is installed: W3C traceparent headers are
+# continued on incoming A2A messages and injected into RunPod API calls, and spans
+# are exported over OTLP when opentelemetry-sdk and OTEL_EXPORTER_OTLP_ENDPOINT are set.
+
+import asyncio
+import contextlib
+import os
+import time
+from typing import Any, Callable, Dict, Iterable, Mapping, Optional, Tuple
+
+try:
+    import prometheus_client
+    from prometheus_client.core import GaugeMetricFamily
+except ImportError:  # metrics are optional
+    prometheus_client = None
+
+try:
+    from opentelemetry import propagate, trace
+except ImportError:  # tracing is optional
+    trace = None
+
+ENABLED = prometheus_client is not None and os.environ.get("INSTAG_METRICS", "1") != "0"
+MULTIPROCESS = ENABLED and bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
+
+# Seconds; spans SSH round trips (ms) up to training runs (hours).
+LATENCY_BUCKETS = (.001, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600, 14400)
+SIZE_BUCKETS = (64, 256, 1024, 4096, 16384, 65536, 262144, 1048576)
+
+
+class _Noop:
+    """Stands in for every metric when metrics are disabled."""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def observe(self, value):
+        pass
+
+    def inc(self, amount=1):
+        pass
+
+
+_NOOP = _Noop()
+
+# A registry of our own, so another app in the same process (tests, benchmarks) can define the same a2a_* names.
+REGISTRY = prometheus_client.CollectorRegistry() if ENABLED else None
+if ENABLED and not MULTIPROCESS:
+    # Process metrics describe one process; they are not aggregated in multiprocess mode.
+    prometheus_client.ProcessCollector(registry=REGISTRY)
+
+
+def _histogram(name: str, doc: str, labels: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+    return prometheus_client.Histogram(name, doc, list(labels), buckets=buckets, registry=REGISTRY) if ENABLED else _NOOP
+
+
+def _counter(name: str, doc: str, labels: Iterable[str] = ()):
+    return prometheus_client.Counter(name, doc, list(labels), registry=REGISTRY) if ENABLED else _NOOP
+
+
+A2A_MESSAGES = _counter("a2a_messages", "Total number of A2A messages received", ["type"])
+A2A_ERRORS = _counter("a2a_errors_by_type", "Total number of error responses by type", ["type"])
+A2A_LATENCY = _histogram("a2a_request_latency_seconds", "A2A API request latency (seconds)", ["type"])
+A2A_SIZE = _histogram("a2a_request_size_bytes", "A2A API request size (bytes)", ["type"], buckets=SIZE_BUCKETS)
+
+OPERATION_SECONDS = _histogram("instag_operation_duration_seconds", "Task operation run time", ["operation", "status"])
+QUEUE_WAIT_SECONDS = _histogram("instag_task_queue_wait_seconds", "Time from task acceptance to start", ["operation"])
+SSH_COMMAND_SECONDS = _histogram("instag_ssh_command_seconds", "Remote command round trip over the pooled transport")
+SSH_CONNECT_SECONDS = _histogram("instag_ssh_connect_seconds", "TCP + SSH handshake time for a pod transport")
+RUNPOD_REQUEST_SECONDS = _histogram("instag_runpod_request_seconds", "RunPod REST API call latency", ["method", "status"])
+TRANSFER_BYTES = _counter("instag_transfer_bytes", "Artifact bytes moved over SFTP", ["status"])
+TRANSFER_SECONDS = _histogram("instag_transfer_seconds", "Artifact transfer time per file", ["status"])
+POD_LEASE_SECONDS = _histogram("instag_pod_lease_seconds", "Time to lease a ready pod", ["result"])
+POD_BOOT_SECONDS = _histogram("instag_pod_boot_seconds", "Time from create_pod to an environment-ready warm pod",
+                              ["gpu_type"])
+INFERENCE_BATCH_SIZE = _histogram("instag_inference_batch_size", "Requests per model forward pass",
+                                  buckets=(1, 2, 4, 8, 16, 32))
+
+
+class _Timer:
+    __slots__ = ("metric", "started")
+
+    def __init__(self, metric):
+        self.metric = metric
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.metric.observe(time.perf_counter() - self.started)
+
+
+_NULL = contextlib.nullcontext()
+
+
+def timed(metric):
+    """Context manager observing elapsed seconds into metric; a shared no-op when disabled."""
+    return _Timer(metric) if ENABLED else _NULL
+
+
+GaugeSource = Callable[[], Iterable[Tuple[str, str, Dict[str, str], float]]]
+
+
+class _StateCollector:
+    """Builds gauges at scrape time from registered callbacks returning (name, doc, labels, value)."""
+
+    def __init__(self):
+        self.sources: Dict[str, Tuple[GaugeSource, str]] = {}
+        self._shared: Dict[str, Any] = {}
+
+    def samples(self):
+        for source, mode in list(self.sources.values()):
+            try:
+                yield from ((mode, *sample) for sample in source())
+            except Exception as e:
+                print(f"[telemetry] Gauge source failed: {e!r}")
+
+    def collect(self):
+        families: Dict[str, Any] = {}
+        for _, name, doc, labels, value in self.samples():
+            family = families.get(name)
+            if family is None:
+                family = families[name] = GaugeMetricFamily(name, doc, labels=sorted(labels))
+            family.add_metric([labels[k] for k in sorted(labels)], value)
+        return list(families.values())
+
+    def publish(self):
+        """Write this worker's gauge values to the multiprocess directory."""
+        for mode, name, doc, labels, value in self.samples():
+            gauge = self._shared.get(name)
+            if gauge is None:
+                gauge = self._shared[name] = prometheus_client.Gauge(name, doc, sorted(labels), registry=None,
+                                                                     multiprocess_mode=mode)
+            (gauge.labels(**labels) if labels else gauge).set(value)
+
+
+_state = _StateCollector()
+if ENABLED and not MULTIPROCESS:
+    REGISTRY.register(_state)
+
+
+def register_gauges(key: str, source: GaugeSource, multiprocess_mode: str = "livesum"):
+    """Expose gauges computed by source() on every scrape (replaces an earlier source with the same key).
+
+    ``multiprocess_mode`` combines the workers' values: "livesum" for per-worker state,
+    "livemax" for state every worker reads from the shared store.
+    """
+    _state.sources[key] = (source, multiprocess_mode)
+
+
+async def publish_gauges(interval: float = 5.0):
+    """Keep this worker's gauges current in multiprocess mode; returns at once otherwise."""
+    if not MULTIPROCESS:
+        return
+    while True:
+        _state.publish()
+        await asyncio.sleep(interval)
+
+
+def exposition() -> Tuple[bytes, str]:
+    """Body and content type for the /metrics endpoint."""
+    if not ENABLED:
+        return b"", "text/plain; version=0.0.4; charset=utf-8"
+    if MULTIPROCESS:
+        from prometheus_client import multiprocess
+        _state.publish()  # this worker's gauges are fresh; the others' are at most one interval old
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+    return prometheus_client.generate_latest(REGISTRY), prometheus_client.CONTENT_TYPE_LATEST
+
+
+# Tracing
+
+_tracer = trace.get_tracer("instag_runpod_agent") if trace is not None else None
+
+
+def setup_tracing(service_name: str = "instag_runpod_agent"):
+    """Export spans over OTLP/HTTP (docker-compose.tracing.yml) when the SDK and endpoint are configured."""
+    if trace is None or not os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT"):
+        return
+    try:
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+        from opentelemetry.sdk.resources import Resource
+        from opentelemetry.sdk.trace import TracerProvider
+        from opentelemetry.sdk.trace.export import BatchSpanProcessor
+    except ImportError:
+        print("[telemetry] OTEL_EXPORTER_OTLP_ENDPOINT is set but opentelemetry-sdk/exporter are not installed")
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": service_name}))
+    provider.add_span_processor(BatchSpanProcessor(OTLPSpanExporter()))
+    trace.set_tracer_provider(provider)
+
+
+def span(name: str, carrier: Optional[Mapping[str, str]] = None, **attributes):
+    """Start a span as the current one, continuing the trace in carrier's traceparent header if given."""
+    if _tracer is None:
+        return _NULL
+    context = propagate.extract(carrier) if carrier is not None else None
+    return _tracer.start_as_current_span(name, context=context, attributes=attributes)
+
+
+def inject(headers: Dict[str, str]) -> Dict[str, str]:
+    """Add the current trace context (traceparent) to outgoing request headers."""
+    if trace is not None:
+        propagate.inject(headers)
+    return headers
+
+
+def current_trace_id() -> Optional[str]:
+    if trace is None:
+        return None
+    context = trace.get_current_span().get_span_context()
+    return format(context.trace_id, "032x") if context.is_valid else None
@@ -0,0 +1,219 @@
+# Content-addressed, resumable artifact transfer between the agent and a pod.
+# Files are split into fixed-size chunks hashed with SHA-256; only chunks whose
+# hash differs on the other side are moved, over parallel pipelined SFTP
+# channels of the pod's pooled SSH transport. Uploads land in "<path>.part" and
+# are renamed into place after verification, so an interrupted transfer resumes
+# from the chunks that already made it.
+
+import hashlib
+import json
+import os
+import posixpath
+import shlex
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List
+
+from . import telemetry
+from .ssh_pool import SSHPool
+
+CHUNK_SIZE = 4 * 1024 * 1024
+REMOTE_CACHE_DIR = "/workspace/.instag_transfer_cache"
+
+# Executed on the pod with python3: prints {path: manifest} for every path given.
+# Manifests are cached per (size, mtime) so unchanged multi-GB files are hashed once.
+_REMOTE_MANIFEST = r"""
+import hashlib, json, os, sys
+chunk_size, cache_dir, paths = int(sys.argv[1]), sys.argv[2], sys.argv[3:]
+out = {}
+for path in paths:
+    try:
+        st = os.stat(path)
+    except FileNotFoundError:
+        out[path] = {"exists": False, "size": 0, "chunks": []}
+        continue
+    key = os.path.join(cache_dir, hashlib.sha1(os.path.abspath(path).encode()).hexdigest() + ".json")
+    try:
+        with open(key) as f:
+            cached = json.load(f)
+        if (cached["size"], cached["mtime_ns"], cached["chunk_size"]) == (st.st_size, st.st_mtime_ns, chunk_size):
+            out[path] = cached
+            continue
+    except (OSError, ValueError, KeyError):
+        pass
+    chunks = []
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            chunks.append(hashlib.sha256(block).hexdigest())
+    manifest = {"exists": True, "size": st.st_size, "mtime_ns": st.st_mtime_ns, "chunk_size": chunk_size, "chunks": chunks}
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(key + ".tmp", "w") as f:
+        json.dump(manifest, f)
+    os.replace(key + ".tmp", key)
+    out[path] = manifest
+print(json.dumps(out))
+"""
+
+
+class TransferError(Exception):
+    """Raised when a transferred file does not match its source after the copy."""
+
+
+def local_manifest(path: str, chunk_size: int = CHUNK_SIZE) -> Dict[str, Any]:
+    if not os.path.exists(path):
+        return {"exists": False, "size": 0, "chunks": []}
+    chunks = []
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            chunks.append(hashlib.sha256(block).hexdigest())
+    return {"exists": True, "size": os.path.getsize(path), "chunks": chunks}
+
+
+def _changed_chunks(source: Dict[str, Any], target: Dict[str, Any]) -> List[int]:
+    have = target["chunks"]
+    return [i for i, digest in enumerate(source["chunks"]) if i >= len(have) or have[i] != digest]
+
+
+def _same(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+    return a["exists"] and b["exists"] and a["size"] == b["size"] and a["chunks"] == b["chunks"]
+
+
+def _split(indices: List[int], parts: int) -> List[List[int]]:
+    """Split chunk indices into contiguous runs, one per worker, so each writes sequentially."""
+    size = -(-len(indices) // parts) if indices else 0
+    return [indices[i:i + size] for i in range(0, len(indices), size)] if size else []
+
+
+class ArtifactTransfer:
+    """Moves datasets, BFM files, AU CSVs and checkpoints to and from pods."""
+
+    def __init__(self, pool: SSHPool, chunk_size: int = CHUNK_SIZE, workers: int = 4,
+                 remote_cache_dir: str = REMOTE_CACHE_DIR, stream_window: int = 8):
+        self.pool = pool
+        self.chunk_size = chunk_size
+        self.workers = workers
+        self.remote_cache_dir = remote_cache_dir
+        self.stream_window = stream_window
+        # Files and chunks use separate pools so a file waiting on its chunks can never
+        # occupy the thread those chunks need.
+        self._files = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="instag-transfer-file")
+        self._chunks = ThreadPoolExecutor(max_workers=workers * 4, thread_name_prefix="instag-transfer-chunk")
+
+    def remote_manifests(self, pod_id: str, paths: List[str]) -> Dict[str, Dict[str, Any]]:
+        command = " ".join(["python3", "-c", shlex.quote(_REMOTE_MANIFEST), str(self.chunk_size),
+                            shlex.quote(self.remote_cache_dir)] + [shlex.quote(p) for p in paths])
+        return json.loads(self.pool.run(pod_id, command)["stdout"])
+
+    def upload(self, pod_id: str, local_path: str, remote_path: str) -> Dict[str, Any]:
+        """Upload local_path, sending only chunks the pod does not already hold."""
+        started = time.monotonic()
+        part = remote_path + ".part"
+        source = local_manifest(local_path, self.chunk_size)
+        if not source["exists"]:
+            raise FileNotFoundError(local_path)
+        remote = self.remote_manifests(pod_id, [remote_path, part])
+        if _same(source, remote[remote_path]):
+            return self._stats(remote_path, "present", source, [], started)
+        base = remote[part]
+        if not base["exists"]:
+            # Start the new version from the old one (a server-side copy) so only
+            # changed chunks cross the network.
+            seed = f"cp {shlex.quote(remote_path)} {shlex.quote(part)}" if remote[remote_path]["exists"] else f": > {shlex.quote(part)}"
+            self.pool.run(pod_id, f"mkdir -p {shlex.quote(posixpath.dirname(remote_path) or '.')} && {seed}")
+            base = remote[remote_path]
+        changed = _changed_chunks(source, base)
+        futures = [self._chunks.submit(self._put_chunks, pod_id, local_path, part, run) for run in _split(changed, self.workers)]
+        for future in futures:
+            future.result()
+        with self.pool.sftp(pod_id) as sftp:
+            if base["size"] > source["size"]:
+                sftp.truncate(part, source["size"])
+        if not _same(source, self.remote_manifests(pod_id, [part])[part]):
+            raise TransferError(f"Uploaded {part} on {pod_id} does not match {local_path}")
+        self.pool.run(pod_id, f"mv -f {shlex.quote(part)} {shlex.quote(remote_path)}")
+        return self._stats(remote_path, "uploaded", source, changed, started)
+
+    def download(self, pod_id: str, remote_path: str, local_path: str) -> Dict[str, Any]:
+        """Download remote_path, fetching only chunks missing from the local copy."""
+        started = time.monotonic()
+        part = local_path + ".part"
+        source = self.remote_manifests(pod_id, [remote_path])[remote_path]
+        if not source["exists"]:
+            raise FileNotFoundError(f"{pod_id}:{remote_path}")
+        if _same(source, local_manifest(local_path, self.chunk_size)):
+            return self._stats(local_path, "present", source, [], started)
+        os.makedirs(os.path.dirname(os.path.abspath(local_path)), exist_ok=True)
+        if not os.path.exists(part):
+            if os.path.exists(local_path):
+                with open(local_path, "rb") as src, open(part, "wb") as dst:
+                    for block in iter(lambda: src.read(self.chunk_size), b""):
+                        dst.write(block)
+            else:
+                open(part, "wb").close()
+        changed = _changed_chunks(source, local_manifest(part, self.chunk_size))
+        futures = [self._chunks.submit(self._get_chunks, pod_id, remote_path, part, run, source["size"])
+                   for run in _split(changed, self.workers)]
+        for future in futures:
+            future.result()
+        os.truncate(part, source["size"])
+        if not _same(source, local_manifest(part, self.chunk_size)):
+            raise TransferError(f"Downloaded {part} does not match {pod_id}:{remote_path}")
+        os.replace(part, local_path)
+        return self._stats(local_path, "downloaded", source, changed, started)
+
+    def upload_many(self, pod_id: str, files: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        """Upload [{"local": ..., "remote": ...}] entries concurrently."""
+        futures = [self._files.submit(self.upload, pod_id, f["local"], f["remote"]) for f in files]
+        return [future.result() for future in futures]
+
+    def download_many(self, pod_id: str, files: List[Dict[str, str]]) -> List[Dict[str, Any]]:
+        futures = [self._files.submit(self.download, pod_id, f["remote"], f["local"]) for f in files]
+        return [future.result() for future in futures]
+
+    def stream(self, pod_id: str, remote_path: str, block_size: int = 1024 * 1024) -> Iterator[bytes]:
+        """Yield a remote file block by block with bounded read-ahead (stream_window blocks)."""
+        with self.pool.sftp(pod_id) as sftp:
+            size = sftp.stat(remote_path).st_size
+            with sftp.open(remote_path, "rb") as f:
+                offset = 0
+                while offset < size:
+                    window = [(o, min(block_size, size - o))
+                              for o in range(offset, min(size, offset + block_size * self.stream_window), block_size)]
+                    for block in f.readv(window):
+                        yield block
+                    offset = window[-1][0] + window[-1][1]
+
+    def _put_chunks(self, pod_id: str, local_path: str, remote_path: str, indices: List[int]):
+        with self.pool.sftp(pod_id) as sftp, open(local_path, "rb") as src, sftp.open(remote_path, "r+b") as dst:
+            # Pipelined writes don't wait for each ack; errors surface on close.
+            dst.set_pipelined(True)
+            for i in indices:
+                src.seek(i * self.chunk_size)
+                dst.seek(i * self.chunk_size)
+                dst.write(src.read(self.chunk_size))
+
+    def _get_chunks(self, pod_id: str, remote_path: str, local_path: str, indices: List[int], size: int):
+        with self.pool.sftp(pod_id) as sftp, sftp.open(remote_path, "rb") as src, open(local_path, "r+b") as dst:
+            # readv pipelines the reads; batches of stream_window chunks bound memory use.
+            for start in range(0, len(indices), self.stream_window):
+                batch = indices[start:start + self.stream_window]
+                ranges = [(i * self.chunk_size, min(self.chunk_size, size - i * self.chunk_size)) for i in batch]
+                for i, block in zip(batch, src.readv(ranges)):
+                    dst.seek(i * self.chunk_size)
+                    dst.write(block)
+
+    def _stats(self, path: str, status: str, source: Dict[str, Any], changed: List[int], started: float) -> Dict[str, Any]:
+        elapsed = time.monotonic() - started
+        sent = sum(min(self.chunk_size, source["size"] - i * self.chunk_size) for i in changed)
+        telemetry.TRANSFER_BYTES.labels(status).inc(sent)
+        telemetry.TRANSFER_SECONDS.labels(status).observe(elapsed)
+        return {
+            "path": path,
+            "status": status,
+            "size": source["size"],
+            "chunks_total": len(source["chunks"]),
+            "chunks_sent": len(changed),
+            "bytes_sent": sent,
+            "seconds": elapsed,
+            "bytes_per_second": sent / elapsed if elapsed > 0 else 0.0,
+        }
@@ -0,0 +1,434 @@
+# Warm pod pool and placement scheduler.
+# Keeps a configurable number of booted, environment-ready idle pods per GPU type
+# so short tasks skip pod boot and image pull, and places tasks on pods whose
+# persistent volume already holds the datasets/checkpoints they need.
+# With a TaskStore, pool membership lives in the store so every worker process
+# leases from and returns to the same pool, and only the worker holding the
+# "warm_pool" role replenishes and reaps it. That worker rebuilds membership from
+# the RunPod pod list when it takes the role, so pods booted by a process that
+# died are adopted rather than leaked.
+
+import asyncio
+import contextlib
+import itertools
+import json
+import os
+import time
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional
+
+from . import telemetry
+from .runpod_ops import RunPodClient, pod_spec, shared_client, ssh_endpoint
+from .task_store import TaskStore
+
+BOOTING = "booting"
+IDLE = "idle"
+LEASED = "leased"
+REAPING = "reaping"
+
+# Every pool pod is created with this name prefix; reconciliation only adopts these.
+POD_NAME_PREFIX = "instag-warm-"
+ROLE = "warm_pool"
+
+
+class WarmPod:
+    """A pool-managed pod and what its persistent volume is known to hold."""
+
+    def __init__(self, pod_id: str, gpu_type: str, owner: Optional[str] = None):
+        self.pod_id = pod_id
+        self.gpu_type = gpu_type
+        self.state = BOOTING
+        self.ssh: Optional[Dict[str, Any]] = None
+        self.artifacts: set = set()
+        self.lease_task_id: Optional[str] = None
+        self.owner = owner  # worker booting the pod
+        # Wall-clock times, so they compare across worker processes.
+        self.created_at = time.time()
+        self.idle_since = self.created_at
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "pod_id": self.pod_id,
+            "gpu_type": self.gpu_type,
+            "state": self.state,
+            "ssh": self.ssh,
+            "artifacts": sorted(self.artifacts),
+            "task_id": self.lease_task_id,
+        }
+
+    def to_row(self) -> Dict[str, Any]:
+        return {**self.to_dict(), "owner": self.owner, "idle_since": self.idle_since, "created_at": self.created_at}
+
+    def load(self, row: Dict[str, Any]):
+        self.state = row["state"]
+        self.ssh = row["ssh"]
+        self.artifacts = set(row["artifacts"])
+        self.lease_task_id = row["task_id"]
+        self.owner = row["owner"]
+        self.idle_since = row["idle_since"]
+        self.created_at = row["created_at"]
+
+
+class WarmPool:
+    """Leases warm pods to tasks, replenishes the idle pool and reaps pods idle past their TTL.
+
+    ``targets`` maps a RunPod GPU type id to the number of idle pods to keep ready.
+    ``poll_interval`` is how often surplus idle pods are reaped and the pool refilled.
+    ``prepare`` is awaited once per pod after boot (e.g. InsTaG environment setup)
+    before the pod counts as idle. ``on_terminate`` is called with each pod that leaves
+    the pool (terminated, or found gone), e.g. to drop its SSH connection.
+    After a failed boot, new boots of that GPU type wait ``boot_backoff`` seconds,
+    doubling per consecutive failure up to ``max_backoff``. A lease gives up once
+    ``max_boot_attempts`` boots of its GPU type have failed while it waited, or after
+    ``lease_timeout``.
+    ``store`` shares the pool between worker processes (see the module comment).
+    """
+
+    def __init__(self, client: RunPodClient, targets: Dict[str, int], idle_ttl: float = 1800.0,
+                 poll_interval: float = 5.0, boot_timeout: float = 900.0,
+                 prepare: Optional[Callable[[WarmPod], Awaitable[None]]] = None,
+                 spec_overrides: Optional[Dict[str, Any]] = None, boot_backoff: float = 2.0,
+                 max_backoff: float = 300.0, max_boot_attempts: int = 3, lease_timeout: float = 1800.0,
+                 store: Optional[TaskStore] = None, on_terminate: Optional[Callable[[WarmPod], None]] = None):
+        self.client = client
+        self.targets = dict(targets)
+        self.idle_ttl = idle_ttl
+        self.poll_interval = poll_interval
+        self.boot_timeout = boot_timeout
+        self.prepare = prepare
+        self.on_terminate = on_terminate
+        self.spec_overrides = spec_overrides or {}
+        self.boot_backoff = boot_backoff
+        self.max_backoff = max_backoff
+        self.max_boot_attempts = max_boot_attempts
+        self.lease_timeout = lease_timeout
+        self.store = store
+        # Without a store this process is the whole pool; with one, it maintains the pool only while it holds the role.
+        self.leader = store is None
+        self._failures: Dict[str, int] = {}  # gpu_type -> consecutive failed boots
+        self._failed_boots: Counter = Counter()  # gpu_type -> failed boots ever
+        self._retry_at: Dict[str, float] = {}  # gpu_type -> monotonic time the next boot may start
+        self.pods: Dict[str, WarmPod] = {}
+        self._booting: Dict[str, Any] = {}  # pod name -> (gpu_type, boot task)
+        self._changed = asyncio.Condition()
+        self._maintainer: Optional[asyncio.Task] = None
+        self._names = itertools.count()
+        self._metrics = {"leases": 0, "hits": 0, "misses": 0, "locality_hits": 0,
+                         "provisioned": 0, "reaped": 0, "boot_failures": 0, "adopted": 0}
+        self._ttfc: List[float] = []
+
+    async def start(self):
+        """Fill the pool and start background replenishment/reaping."""
+        if self.store is not None:
+            self.leader = self.store.acquire_role(ROLE)
+        if self.leader:
+            await self._reconcile()
+            self._replenish()
+        self._maintainer = asyncio.get_running_loop().create_task(self._maintain())
+
+    async def stop(self, terminate: bool = False):
+        if self._maintainer is not None:
+            self._maintainer.cancel()
+            await asyncio.gather(self._maintainer, return_exceptions=True)
+        tasks = [task for _, task in self._booting.values()]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if terminate:
+            self._sync()
+            await asyncio.gather(*(self._terminate(pod) for pod in list(self.pods.values())), return_exceptions=True)
+        if self.store is not None and self.leader:
+            # Hand maintenance to another worker straight away instead of after the role expires.
+            self.store.release_role(ROLE)
+            self.leader = False
+
+    async def lease(self, gpu_type: str, artifacts: Iterable[str] = (), task_id: Optional[str] = None,
+                    timeout: Optional[float] = None) -> WarmPod:
+        """Lease a ready pod of gpu_type, preferring one whose volume already holds ``artifacts``.
+
+        Falls back to provisioning a new pod when no idle pod is available; ``timeout``
+        defaults to the pool's ``lease_timeout``.
+        """
+        started = time.monotonic()
+        wanted = set(artifacts)
+        pod = self._claim_idle(gpu_type, wanted, task_id)
+        hit = pod is not None
+        if hit:
+            self._metrics["hits"] += 1
+        else:
+            self._metrics["misses"] += 1
+            pod = await asyncio.wait_for(self._wait_for_pod(gpu_type, wanted, task_id),
+                                         self.lease_timeout if timeout is None else timeout)
+        if wanted and wanted <= pod.artifacts:
+            self._metrics["locality_hits"] += 1
+        self._metrics["leases"] += 1
+        self._ttfc.append(time.monotonic() - started)
+        telemetry.POD_LEASE_SECONDS.labels("hit" if hit else "miss").observe(self._ttfc[-1])
+        del self._ttfc[:-1000]
+        # Taking an idle pod may drop the pool below target; refill in the background.
+        self._replenish()
+        return pod
+
+    async def release(self, pod_id: str, artifacts: Iterable[str] = (), terminate: bool = False):
+        """Return a leased pod to the pool, recording artifacts now present on its volume."""
+        self._sync()
+        pod = self.pods.get(pod_id)
+        if pod is None:
+            return
+        if terminate:
+            await self._terminate(pod)
+            return
+        pod.artifacts.update(artifacts)
+        pod.state = IDLE
+        pod.lease_task_id = None
+        pod.idle_since = time.time()
+        self._save(pod)
+        async with self._changed:
+            self._changed.notify_all()
+
+    def is_managed(self, pod_id: str) -> bool:
+        self._sync()
+        return pod_id in self.pods
+
+    def metrics(self) -> Dict[str, Any]:
+        self._sync()
+        ttfc = sorted(self._ttfc)
+        counts = {BOOTING: 0, IDLE: 0, LEASED: 0}
+        for pod in self.pods.values():
+            if pod.state in counts:
+                counts[pod.state] += 1
+        return {
+            **self._metrics,
+            "hit_rate": self._metrics["hits"] / self._metrics["leases"] if self._metrics["leases"] else 0.0,
+            "time_to_first_command_p50": ttfc[len(ttfc) // 2] if ttfc else None,
+            "time_to_first_command_max": ttfc[-1] if ttfc else None,
+            "pods": counts,
+            "maintainer": self.leader,
+        }
+
+    def _claim_idle(self, gpu_type: str, wanted: set, task_id: Optional[str]) -> Optional[WarmPod]:
+        self._sync()
+        idle = [p for p in self.pods.values() if p.state == IDLE and p.gpu_type == gpu_type]
+        # Most artifacts already on the volume first, then the most recently used pod
+        # so older idle pods age out and get reaped.
+        for pod in sorted(idle, key=lambda p: (len(wanted & p.artifacts), p.idle_since), reverse=True):
+            # Claimed before yielding (and atomically in the store) so no other waiter can take the same pod.
+            if self._take(pod, LEASED, task_id):
+                return pod
+        return None
+
+    def _take(self, pod: WarmPod, state: str, task_id: Optional[str] = None) -> bool:
+        if self.store is not None and not self.store.take_warm_pod(pod.pod_id, state, task_id):
+            return False
+        pod.state = state
+        pod.lease_task_id = task_id
+        return True
+
+    async def _wait_for_pod(self, gpu_type: str, wanted: set, task_id: Optional[str]) -> WarmPod:
+        failed_before = self._failed_boots[gpu_type]
+        async with self._changed:
+            while True:
+                pod = self._claim_idle(gpu_type, wanted, task_id)
+                if pod is not None:
+                    return pod
+                failed = self._failed_boots[gpu_type] - failed_before
+                if failed >= self.max_boot_attempts:
+                    raise RuntimeError(f"No {gpu_type} pod: {failed} boot attempts failed")
+                wait = self.poll_interval
+                if not self._booting_count(gpu_type):
+                    # Nothing is booting: the first attempt, or the boot we were waiting on failed.
+                    delay = self._backoff(gpu_type)
+                    if delay > 0:
+                        wait = min(wait, delay)
+                    else:
+                        self._provision(gpu_type)
+                # Pods released or booted by other workers do not notify us, so also look again every poll.
+                with contextlib.suppress(asyncio.TimeoutError):
+                    await asyncio.wait_for(self._changed.wait(), wait)
+
+    def _backoff(self, gpu_type: str) -> float:
+        """Seconds until a new boot of gpu_type may start after recent failures."""
+        return max(0.0, self._retry_at.get(gpu_type, 0.0) - time.monotonic())
+
+    def _replenish(self):
+        if not self.leader:
+            return
+        self._sync()
+        for gpu_type, target in self.targets.items():
+            if self._backoff(gpu_type) > 0:
+                continue
+            idle = sum(1 for p in self.pods.values() if p.gpu_type == gpu_type and p.state == IDLE)
+            for _ in range(target - idle - self._booting_count(gpu_type)):
+                self._provision(gpu_type)
+
+    def _provision(self, gpu_type: str):
+        name = f"{POD_NAME_PREFIX}{os.getpid()}-{next(self._names)}"
+        task = asyncio.get_running_loop().create_task(self._boot(name, gpu_type))
+        self._booting[name] = (gpu_type, task)
+
+    def _booting_count(self, gpu_type: str) -> int:
+        # Counts boots whose create_pod call is still in flight, not just pods in BOOTING state,
+        # plus pods other workers are booting.
+        local = sum(1 for booting_type, _ in self._booting.values() if booting_type == gpu_type)
+        return local + sum(1 for p in self.pods.values()
+                           if p.state == BOOTING and p.gpu_type == gpu_type and p.owner != self._worker_id())
+
+    def _worker_id(self) -> Optional[str]:
+        return self.store.worker_id if self.store is not None else None
+
+    async def _boot(self, name: str, gpu_type: str, pod: Optional[WarmPod] = None):
+        """Boot a new pod, or with ``pod`` finish bringing up one adopted by reconciliation."""
+        started = time.monotonic()
+        try:
+            if pod is None:
+                created = await self.client.create_pod({**pod_spec(name, gpu_type), **self.spec_overrides})
+                pod = WarmPod(created["id"], gpu_type, owner=self._worker_id())
+                self.pods[pod.pod_id] = pod
+                self._save(pod)
+                self._metrics["provisioned"] += 1
+            # Boot progress comes from the client's shared status poller rather than
+            # one polling loop per booting pod.
+            ready = await self.client.wait_for_pod(pod.pod_id, lambda p: ssh_endpoint(p) is not None,
+                                                   timeout=self.boot_timeout)
+            pod.ssh = ssh_endpoint(ready)
+            self._save(pod)
+            if self.prepare is not None:
+                await self.prepare(pod)
+            pod.state = IDLE
+            pod.idle_since = time.time()
+            self._save(pod)
+            self._failures.pop(gpu_type, None)
+            self._retry_at.pop(gpu_type, None)
+            telemetry.POD_BOOT_SECONDS.labels(gpu_type).observe(time.monotonic() - started)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"[warm_pool] Failed to boot {gpu_type} pod {name}: {e!r}")
+            self._metrics["boot_failures"] += 1
+            self._failed_boots[gpu_type] += 1
+            failures = self._failures[gpu_type] = self._failures.get(gpu_type, 0) + 1
+            self._retry_at[gpu_type] = time.monotonic() + min(self.max_backoff,
+                                                              self.boot_backoff * 2 ** (failures - 1))
+            if pod is not None:
+                await self._terminate(pod)
+        finally:
+            self._booting.pop(name, None)
+            async with self._changed:
+                self._changed.notify_all()
+
+    async def _terminate(self, pod: WarmPod):
+        self._forget(pod)
+        try:
+            await self.client.delete_pod(pod.pod_id)
+        except Exception as e:
+            print(f"[warm_pool] Failed to terminate pod {pod.pod_id}: {e!r}")
+
+    async def _maintain(self):
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            if self.store is not None:
+                was_leader = self.leader
+                self.leader = self.store.acquire_role(ROLE)
+                if self.leader and not was_leader:
+                    print(f"[warm_pool] Took over warm pool maintenance ({self.store.worker_id})")
+                    await self._reconcile()
+            if self.leader:
+                await self._reap()
+                self._replenish()
+
+    async def _reap(self):
+        self._sync()
+        now = time.time()
+        for gpu_type in {p.gpu_type for p in self.pods.values()}:
+            idle = sorted((p for p in self.pods.values() if p.gpu_type == gpu_type and p.state == IDLE),
+                          key=lambda p: p.idle_since)
+            # Keep the target number of idle pods; only the surplus expires.
+            surplus = idle[:max(0, len(idle) - self.targets.get(gpu_type, 0))]
+            for pod in surplus:
+                if now - pod.idle_since > self.idle_ttl and self._take(pod, REAPING):
+                    self._metrics["reaped"] += 1
+                    await self._terminate(pod)
+
+    async def _reconcile(self):
+        """Rebuild membership from RunPod: forget pool pods that no longer exist and adopt
+        pool-named pods that nobody tracks (booted by a process that died)."""
+        try:
+            live = {p["id"]: p for p in await self.client.list_pods()
+                    if (p.get("name") or "").startswith(POD_NAME_PREFIX)}
+        except Exception as e:
+            print(f"[warm_pool] Could not list pods to reconcile the pool: {e!r}")
+            return
+        self._sync()
+        for pod in list(self.pods.values()):
+            if pod.pod_id not in live:
+                self._forget(pod)
+        booting_here = {pod.pod_id for pod in self.pods.values() if pod.owner == self._worker_id()}
+        for pod_id, info in live.items():
+            pod = self.pods.get(pod_id)
+            # A pod still booting past boot_timeout lost the worker that was booting it.
+            stalled = (pod is not None and pod.state == BOOTING and pod_id not in booting_here
+                       and time.time() - pod.created_at > self.boot_timeout)
+            if pod is not None and not stalled:
+                continue
+            gpu_type = pod.gpu_type if pod is not None else _gpu_type(info)
+            pod = WarmPod(pod_id, gpu_type, owner=self._worker_id())
+            self.pods[pod_id] = pod
+            self._save(pod)
+            self._metrics["adopted"] += 1
+            print(f"[warm_pool] Adopting {gpu_type} pod {pod_id} ({info.get('name')})")
+            name = info.get("name") or pod_id
+            self._booting[name] = (gpu_type, asyncio.get_running_loop().create_task(self._boot(name, gpu_type, pod)))
+
+    def _sync(self):
+        """Refresh pool membership from the store, keeping the same WarmPod objects for known pods."""
+        if self.store is None:
+            return
+        known = self.pods
+        self.pods = {}
+        for row in self.store.warm_pods():
+            pod = known.pop(row["pod_id"], None) or WarmPod(row["pod_id"], row["gpu_type"])
+            pod.load(row)
+            self.pods[pod.pod_id] = pod
+        # Pods another worker terminated since the last sync.
+        for pod in known.values():
+            self._terminated(pod)
+
+    def _save(self, pod: WarmPod):
+        if self.store is not None:
+            self.store.save_warm_pod(pod.to_row())
+
+    def _forget(self, pod: WarmPod):
+        self.pods.pop(pod.pod_id, None)
+        if self.store is not None:
+            self.store.delete_warm_pod(pod.pod_id)
+        self._terminated(pod)
+
+    def _terminated(self, pod: WarmPod):
+        if self.on_terminate is not None:
+            try:
+                self.on_terminate(pod)
+            except Exception as e:
+                print(f"[warm_pool] on_terminate failed for pod {pod.pod_id}: {e!r}")
+
+
+def _gpu_type(pod: Dict[str, Any]) -> str:
+    return pod.get("gpuTypeId") or (pod.get("machine") or {}).get("gpuTypeId") or "unknown"
+
+
+def pool_from_env(prepare=None, store: Optional[TaskStore] = None, on_terminate=None) -> Optional[WarmPool]:
+    """Build a WarmPool from INSTAG_WARM_POOL, e.g. '{"NVIDIA GeForce RTX 4090": 2}'; None when unset."""
+    targets = os.environ.get("INSTAG_WARM_POOL")
+    if not targets:
+        return None
+    return WarmPool(
+        shared_client(),
+        json.loads(targets),
+        idle_ttl=float(os.environ.get("INSTAG_WARM_POOL_IDLE_TTL", "1800")),
+        poll_interval=float(os.environ.get("INSTAG_WARM_POOL_POLL_INTERVAL", "5")),
+        boot_backoff=float(os.environ.get("INSTAG_WARM_POOL_BOOT_BACKOFF", "2")),
+        max_boot_attempts=int(os.environ.get("INSTAG_WARM_POOL_MAX_BOOT_ATTEMPTS", "3")),
+        lease_timeout=float(os.environ.get("INSTAG_WARM_POOL_LEASE_TIMEOUT", "1800")),
+        prepare=prepare,
+        store=store,
+        on_terminate=on_terminate,
+    )
@@ -0,0 +1,93 @@
+"""Benchmark one-process-per-request inference against the warm InferenceServer.
+
+Uses the CPU stand-in model (standin_model.py): every request drives the model
+with one of --clips distinct .wav files. The baseline starts a fresh process per
+request (model load + feature extraction every time, like calling
+synthesize_fuse.py); the warm runs keep one resident worker, with and without
+micro-batching, and reuse cached features.
+
+    python bench_inference.py --requests 200 --concurrency 16 --clips 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+from app.inference import InferenceServer, ProcessWorkerBackend
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+STANDIN = [sys.executable, os.path.join(HERE, "standin_model.py")]
+
+
+def write_clips(directory: str, count: int, seconds: float = 2.0):
+    paths = []
+    rng = np.random.default_rng(1)
+    for i in range(count):
+        path = os.path.join(directory, f"clip_{i}.wav")
+        with open(path, "wb") as f:
+            f.write(b"\0" * 44)  # header contents are ignored by the stand-in
+            f.write(rng.integers(-3000, 3000, int(16000 * seconds), dtype=np.int16).tobytes())
+        paths.append(path)
+    return paths
+
+
+async def drive(call, audio, concurrency: int):
+    slots = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(path):
+        async with slots:
+            start = time.perf_counter()
+            await call(path)
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(path) for path in audio))
+    return time.perf_counter() - start, latencies
+
+
+async def process_per_request(path: str):
+    proc = await asyncio.create_subprocess_exec(*STANDIN, "--audio", path, stdout=asyncio.subprocess.PIPE)
+    stdout, _ = await proc.communicate()
+    return json.loads(stdout)
+
+
+def report(label: str, elapsed: float, latencies):
+    ms = np.array(latencies) * 1000
+    print(f"{label:<28} {len(ms):>5} reqs  {len(ms) / elapsed:8.1f} req/s  p50 {np.percentile(ms, 50):8.1f} ms"
+          f"  p99 {np.percentile(ms, 99):8.1f} ms")
+
+
+async def warm(label: str, audio, concurrency: int, max_batch: int, cache_dir: str):
+    server = InferenceServer(lambda key: ProcessWorkerBackend(STANDIN + ["--serve", "--feature-cache", cache_dir]),
+                             max_batch=max_batch, max_wait=0.005)
+    elapsed, latencies = await drive(lambda path: server.infer("standin", {"audio": path}), audio, concurrency)
+    report(label, elapsed, latencies)
+    stats = server.stats()["workers"]["standin"]
+    print(f"{'':<28} {stats['batches']} forward passes, {stats['requests'] / stats['batches']:.1f} clips/pass")
+    await server.close()
+
+
+async def main(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        clips = write_clips(tmp, args.clips)
+        audio = [clips[i % len(clips)] for i in range(args.requests)]
+
+        elapsed, latencies = await drive(process_per_request, audio, args.concurrency)
+        report("process-per-request", elapsed, latencies)
+        await warm("warm worker (no batching)", audio, args.concurrency, 1, os.path.join(tmp, "features-1"))
+        await warm("warm worker (micro-batched)", audio, args.concurrency, args.max_batch, os.path.join(tmp, "features-2"))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--clips", type=int, default=8, help="distinct driving audio files")
+    parser.add_argument("--max-batch", type=int, default=8)
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,59 @@
+"""Benchmark connect-per-command SSH against the pooled SSHPool.
+
+Uses the in-process SSH stand-in (ssh_standin.py), which answers every exec
+request by echoing the command after --work-ms of simulated remote work.
+
+    python bench_ssh_pool.py --commands 60 --work-ms 20
+"""
+import argparse
+import time
+
+import paramiko
+
+from app.ssh_pool import SSHPool
+from ssh_standin import PASSWORD, USERNAME, StandInServer, serve
+
+
+def connect_per_command(port: int, commands):
+    for command in commands:
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+        client.connect("127.0.0.1", port=port, username=USERNAME, password=PASSWORD,
+                       allow_agent=False, look_for_keys=False)
+        _, stdout, _ = client.exec_command(command)
+        stdout.read()
+        stdout.channel.recv_exit_status()
+        client.close()
+
+
+def report(label: str, n: int, elapsed: float):
+    print(f"{label:<28} {n:>5} cmds  {elapsed:8.3f}s  {n / elapsed:9.1f} cmds/s  {elapsed / n * 1000:8.2f} ms/cmd")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commands", type=int, default=60)
+    parser.add_argument("--work-ms", type=float, default=20.0, help="simulated runtime of each remote command")
+    args = parser.parse_args()
+    StandInServer.work_seconds = args.work_ms / 1000
+
+    port = serve()
+    commands = [f"python step_{i}.py" for i in range(args.commands)]
+
+    start = time.perf_counter()
+    connect_per_command(port, commands)
+    report("connect-per-command", len(commands), time.perf_counter() - start)
+
+    pool = SSHPool()
+    pool.register("bench-pod", "127.0.0.1", port, USERNAME, password=PASSWORD)
+    start = time.perf_counter()
+    for command in commands:
+        pool.run("bench-pod", command)
+    report("pooled (sequential)", len(commands), time.perf_counter() - start)
+
+    start = time.perf_counter()
+    pool.run_many("bench-pod", commands)
+    report("pooled (concurrent)", len(commands), time.perf_counter() - start)
+
+    print(f"pool stats: {pool.stats()}")
+    pool.close()
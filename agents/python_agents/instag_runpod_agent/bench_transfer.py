@@ -0,0 +1,84 @@
+"""Benchmark the artifact transfer engine against plain sequential copies.
+
+Uses the in-process SSH stand-in (ssh_standin.py), which runs commands and
+serves SFTP on the local filesystem, so every byte still goes through SSH.
+
+    python bench_transfer.py --size-mb 256
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from app.ssh_pool import SSHPool
+from app.transfer import ArtifactTransfer
+from ssh_standin import PASSWORD, USERNAME, StandInServer, serve
+
+
+def report(label: str, nbytes: int, moved: int, elapsed: float):
+    print(f"{label:<34} {elapsed:8.3f}s  {nbytes / elapsed / 1e6:9.1f} MB/s effective  {moved / 1e6:9.2f} MB moved")
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--workers", type=int, default=4)
+    args = parser.parse_args()
+    StandInServer.run_commands = True
+
+    work = tempfile.mkdtemp(prefix="instag-bench-")
+    local, remote = os.path.join(work, "local.bin"), os.path.join(work, "pod", "checkpoint.pth")
+    size = args.size_mb * 1024 * 1024
+    with open(local, "wb") as f:
+        f.write(os.urandom(size))
+
+    pool = SSHPool()
+    pool.register("bench-pod", "127.0.0.1", serve(), USERNAME, password=PASSWORD)
+    engine = ArtifactTransfer(pool, workers=args.workers, remote_cache_dir=os.path.join(work, "cache"))
+    try:
+        _, elapsed = timed(lambda: shutil.copyfile(local, os.path.join(work, "copy.bin")))
+        report("local shutil.copyfile", size, size, elapsed)
+
+        os.makedirs(os.path.dirname(remote))
+        with pool.sftp("bench-pod") as sftp:
+            _, elapsed = timed(lambda: sftp.put(local, os.path.join(work, "pod", "sequential.bin")))
+        report("sftp put (sequential)", size, size, elapsed)
+
+        stats, elapsed = timed(lambda: engine.upload("bench-pod", local, remote))
+        report(f"engine upload, cold ({args.workers} channels)", size, stats["bytes_sent"], elapsed)
+
+        stats, elapsed = timed(lambda: engine.upload("bench-pod", local, remote))
+        report("engine upload, unchanged", size, stats["bytes_sent"], elapsed)
+
+        with open(local, "r+b") as f:
+            f.seek(size // 2)
+            f.write(os.urandom(16 * 1024))
+        stats, elapsed = timed(lambda: engine.upload("bench-pod", local, remote))
+        report("engine upload, 16 KiB changed", size, stats["bytes_sent"], elapsed)
+
+        # Simulate an upload interrupted halfway: the .part holds the first half.
+        os.remove(remote)
+        with open(local, "rb") as src, open(remote + ".part", "wb") as dst:
+            dst.write(src.read(size // 2))
+        stats, elapsed = timed(lambda: engine.upload("bench-pod", local, remote))
+        report("engine upload, resumed at 50%", size, stats["bytes_sent"], elapsed)
+
+        with pool.sftp("bench-pod") as sftp:
+            _, elapsed = timed(lambda: sftp.get(remote, os.path.join(work, "sequential-download.bin")))
+        report("sftp get (sequential)", size, size, elapsed)
+
+        stats, elapsed = timed(lambda: engine.download("bench-pod", remote, os.path.join(work, "download.bin")))
+        report(f"engine download, cold ({args.workers} channels)", size, stats["bytes_sent"], elapsed)
+
+        streamed, elapsed = timed(lambda: sum(len(block) for block in engine.stream("bench-pod", remote)))
+        report("engine stream (bounded read-ahead)", size, streamed, elapsed)
+    finally:
+        pool.close()
+        shutil.rmtree(work)
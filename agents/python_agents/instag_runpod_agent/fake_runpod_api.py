@@ -0,0 +1,74 @@
+"""In-memory stand-in for the RunPod REST API pods endpoints.
+
+Pods report ``desiredStatus: RUNNING`` with an SSH port mapping once
+``boot_seconds`` have passed since creation. Use it in-process through
+``httpx.ASGITransport(app=create_app())`` or run it standalone:
+
+    uvicorn fake_runpod_api:app --port 5090
+    RUNPOD_API_URL=http://localhost:5090/v1 uvicorn app.main:app --port 5002
+"""
+import itertools
+import time
+from collections import Counter
+
+from fastapi import FastAPI, HTTPException
+
+
+def create_app(boot_seconds: float = 0.05) -> FastAPI:
+    api = FastAPI(title="Fake RunPod API")
+    api.state.pods = {}
+    api.state.requests = Counter()
+    api.state.reject_creates = False  # set to answer every create with 400, like a bad spec
+    ids = itertools.count(1)
+    ports = itertools.count(20000)
+
+    def view(pod):
+        running = pod["desiredStatus"] == "RUNNING" and time.monotonic() - pod["_created"] >= boot_seconds
+        public = {k: v for k, v in pod.items() if not k.startswith("_")}
+        if running:
+            public.update(publicIp="127.0.0.1", portMappings={"22": pod["_ssh_port"]})
+        else:
+            public.update(publicIp=None, portMappings={})
+        return public
+
+    @api.get("/v1/pods")
+    def list_pods():
+        api.state.requests["list"] += 1
+        return [view(pod) for pod in api.state.pods.values()]
+
+    @api.get("/v1/pods/{pod_id}")
+    def get_pod(pod_id: str):
+        api.state.requests["get"] += 1
+        pod = api.state.pods.get(pod_id)
+        if pod is None:
+            raise HTTPException(status_code=404, detail="pod not found")
+        return view(pod)
+
+    @api.post("/v1/pods")
+    def create_pod(spec: dict):
+        api.state.requests["create"] += 1
+        if api.state.reject_creates:
+            raise HTTPException(status_code=400, detail="invalid pod spec")
+        pod_id = f"fakepod{next(ids)}"
+        api.state.pods[pod_id] = {
+            "id": pod_id,
+            "name": spec.get("name"),
+            "imageName": spec.get("imageName"),
+            "gpuTypeId": (spec.get("gpuTypeIds") or [None])[0],
+            "desiredStatus": "RUNNING",
+            "_created": time.monotonic(),
+            "_ssh_port": next(ports),
+        }
+        return view(api.state.pods[pod_id])
+
+    @api.delete("/v1/pods/{pod_id}")
+    def delete_pod(pod_id: str):
+        api.state.requests["delete"] += 1
+        if api.state.pods.pop(pod_id, None) is None:
+            raise HTTPException(status_code=404, detail="pod not found")
+        return None
+
+    return api
+
+
+app = create_app(boot_seconds=5.0)
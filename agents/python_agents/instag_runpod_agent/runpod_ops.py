@@ -1,19 +0,0 @@
-# Placeholder for runpod_ops.py
-# This file will contain functions for interacting with the RunPod API.
-
-# Example function (actual implementation would require RunPod SDK or API calls)
-def get_pods():
-    # This is a simplified example. In a real scenario, you'd interact with the RunPod API.
-    print("Fetching list of pods...")
-    # Mock data for now
-    pods = [
-        {"id": "pod1", "name": "MyPod1", "status": "Running"},
-        {"id": "pod2", "name": "MyPod2", "status": "Stopped"}
-    ]
-    return pods
-
-if __name__ == '__main__':
-    # Example usage (optional)
-    pods_data = get_pods()
-    print(pods_data)
-
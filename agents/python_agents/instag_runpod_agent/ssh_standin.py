@@ -0,0 +1,180 @@
+"""In-process paramiko SSH server that stands in for a RunPod pod in benchmarks.
+
+It accepts password auth, answers exec requests either by echoing the command
+(after ``work_seconds`` of simulated work) or by running it locally through
+``/bin/sh`` when ``run_commands`` is set (streaming its output as it runs), and serves SFTP on the local
+filesystem so transfers can be measured end to end.
+"""
+import errno
+import os
+import socket
+import subprocess
+import threading
+import time
+
+import paramiko
+
+USERNAME = "root"
+PASSWORD = "bench"
+
+
+class StandInServer(paramiko.ServerInterface):
+    work_seconds = 0.0
+    run_commands = False
+
+    def check_auth_password(self, username, password):
+        if username == USERNAME and password == PASSWORD:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def get_allowed_auths(self, username):
+        return "password"
+
+    def check_channel_request(self, kind, chanid):
+        if kind == "session":
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED
+
+    def check_channel_exec_request(self, channel, command):
+        def reply():
+            if self.run_commands:
+                # Relay output as it is produced, like sshd, so live progress can be observed.
+                proc = subprocess.Popen(["/bin/sh", "-c", command.decode()], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+                errors = threading.Thread(target=_relay, args=(proc.stderr, channel.sendall_stderr, proc))
+                errors.start()
+                _relay(proc.stdout, channel.sendall, proc)
+                errors.join()
+                status = proc.wait()
+                if channel.closed:
+                    return
+            else:
+                time.sleep(self.work_seconds)
+                channel.sendall(b"ok: " + command + b"\n")
+                status = 0
+            # Send EOF instead of closing: a close could overtake the server's exec
+            # reply, and the client closes the channel itself once it has the status.
+            channel.send_exit_status(status)
+            channel.shutdown_write()
+        threading.Thread(target=reply, daemon=True).start()
+        return True
+
+
+def _relay(pipe, send, proc):
+    try:
+        for block in iter(lambda: os.read(pipe.fileno(), 32768), b""):
+            send(block)
+    except OSError:
+        proc.kill()  # the client closed the channel (e.g. a command timeout), like sshd hanging up
+    finally:
+        pipe.close()
+
+
+class _LocalHandle(paramiko.SFTPHandle):
+    def stat(self):
+        try:
+            return paramiko.SFTPAttributes.from_stat(os.fstat(self.readfile.fileno()))
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    def chattr(self, attr):
+        return _LocalSFTP._chattr(self.filename, attr)
+
+
+class _LocalSFTP(paramiko.SFTPServerInterface):
+    """SFTP subsystem backed directly by the local filesystem."""
+
+    def _wrap(self, fn, *args):
+        try:
+            return fn(*args)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+
+    @staticmethod
+    def _chattr(path, attr):
+        try:
+            if attr.st_size is not None:
+                os.truncate(path, attr.st_size)
+            if attr.st_mode is not None:
+                os.chmod(path, attr.st_mode)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        return paramiko.SFTP_OK
+
+    def list_folder(self, path):
+        def listing():
+            return [paramiko.SFTPAttributes.from_stat(os.lstat(os.path.join(path, name)), name)
+                    for name in os.listdir(path)]
+        return self._wrap(listing)
+
+    def stat(self, path):
+        return self._wrap(lambda: paramiko.SFTPAttributes.from_stat(os.stat(path)))
+
+    def lstat(self, path):
+        return self._wrap(lambda: paramiko.SFTPAttributes.from_stat(os.lstat(path)))
+
+    def open(self, path, flags, attr):
+        try:
+            fd = os.open(path, flags | getattr(os, "O_BINARY", 0), attr.st_mode or 0o644)
+        except OSError as e:
+            return paramiko.SFTPServer.convert_errno(e.errno)
+        if flags & os.O_WRONLY:
+            mode = "ab" if flags & os.O_APPEND else "wb"
+        elif flags & os.O_RDWR:
+            mode = "a+b" if flags & os.O_APPEND else "r+b"
+        else:
+            mode = "rb"
+        handle = _LocalHandle(flags)
+        handle.filename = path
+        handle.readfile = handle.writefile = os.fdopen(fd, mode)
+        return handle
+
+    def remove(self, path):
+        return self._wrap(lambda: os.remove(path) or paramiko.SFTP_OK)
+
+    def rename(self, oldpath, newpath):
+        if os.path.exists(newpath):
+            return paramiko.SFTPServer.convert_errno(errno.EEXIST)
+        return self._wrap(lambda: os.rename(oldpath, newpath) or paramiko.SFTP_OK)
+
+    def posix_rename(self, oldpath, newpath):
+        return self._wrap(lambda: os.replace(oldpath, newpath) or paramiko.SFTP_OK)
+
+    def mkdir(self, path, attr):
+        return self._wrap(lambda: os.mkdir(path) or paramiko.SFTP_OK)
+
+    def rmdir(self, path):
+        return self._wrap(lambda: os.rmdir(path) or paramiko.SFTP_OK)
+
+    def chattr(self, path, attr):
+        return self._chattr(path, attr)
+
+
+def serve(host_key: paramiko.PKey = None) -> int:
+    """Start the stand-in pod on an ephemeral port and return the port."""
+    host_key = host_key or paramiko.RSAKey.generate(2048)
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(100)
+
+    def handle(client):
+        client.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        transport = paramiko.Transport(client)
+        transport.add_server_key(host_key)
+        transport.set_subsystem_handler("sftp", paramiko.SFTPServer, _LocalSFTP)
+        transport.start_server(server=StandInServer())
+        # paramiko only holds channels weakly; keep accepted ones alive until the client closes them.
+        channels = set()
+        while transport.is_active():
+            channel = transport.accept(1.0)
+            channels = {c for c in channels if not c.closed}
+            if channel is not None:
+                channels.add(channel)
+
+    def accept_loop():
+        while True:
+            client, _ = sock.accept()
+            threading.Thread(target=handle, args=(client,), daemon=True).start()
+
+    threading.Thread(target=accept_loop, daemon=True).start()
+    return sock.getsockname()[1]
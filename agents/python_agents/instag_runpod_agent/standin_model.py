@@ -0,0 +1,86 @@
+"""CPU stand-in for an InsTaG model in inference benchmarks.
+
+It mimics the cost structure of synthesize_fuse.py without a GPU: a fixed model
+load (checkpoint read + weight allocation), audio feature extraction from the
+.wav, and a forward pass whose cost is a fixed per-call overhead plus a small
+per-clip term, so batching several clips into one call is cheaper than running
+them one by one.
+
+One-shot mode (one process per request, like calling synthesize_fuse.py):
+    python standin_model.py --audio clip.wav
+Resident mode (speaks the app.inference worker protocol on stdin/stdout):
+    python standin_model.py --serve --feature-cache /tmp/features
+"""
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from app.inference import FeatureCache
+
+FEATURE_DIM = 29  # DeepSpeech logits per frame
+HIDDEN = 256
+
+
+def load_model(args) -> np.ndarray:
+    time.sleep(args.load_ms / 1000)
+    return np.random.default_rng(0).standard_normal(args.weights_mb * 1024 * 1024 // 4, dtype=np.float32)
+
+
+def make_extractor(args):
+    def extract(path: str) -> np.ndarray:
+        time.sleep(args.extract_ms / 1000)
+        with open(path, "rb") as f:
+            samples = np.frombuffer(f.read()[44:], dtype=np.int16).astype(np.float32)
+        # 20 ms frames at 16 kHz, magnitude spectrum folded down to FEATURE_DIM bins.
+        frames = samples[: len(samples) // 320 * 320].reshape(-1, 320)
+        spectrum = np.abs(np.fft.rfft(frames, axis=1))[:, : FEATURE_DIM * 5]
+        return spectrum.reshape(len(frames), FEATURE_DIM, 5).mean(axis=2).astype(np.float32)
+    return extract
+
+
+def forward(args, weights: np.ndarray, batch) -> list:
+    time.sleep((args.batch_ms + args.item_ms * len(batch)) / 1000)
+    projection = weights[: FEATURE_DIM * HIDDEN].reshape(FEATURE_DIM, HIDDEN)
+    return [{"frames": int(len(features)), "checksum": float(np.tanh(np.asarray(features) @ projection).mean())}
+            for features in batch]
+
+
+def serve(args):
+    weights = load_model(args)
+    cache = FeatureCache(args.feature_cache)
+    extract = make_extractor(args)
+    print(json.dumps({"ready": True, "memory_bytes": int(weights.nbytes)}), flush=True)
+    for line in sys.stdin:
+        try:
+            requests = json.loads(line)["batch"]
+            features = [cache.get(r["audio"], r.get("audio_extractor", "deepspeech"), extract) for r in requests]
+            reply = {"results": forward(args, weights, features)}
+        except Exception as e:
+            reply = {"error": repr(e)}
+        print(json.dumps(reply), flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--serve", action="store_true")
+    parser.add_argument("--audio")
+    parser.add_argument("--feature-cache", default="/tmp/instag_standin_features")
+    parser.add_argument("--load-ms", type=float, default=400)
+    parser.add_argument("--weights-mb", type=int, default=64)
+    parser.add_argument("--extract-ms", type=float, default=40)
+    parser.add_argument("--batch-ms", type=float, default=30)
+    parser.add_argument("--item-ms", type=float, default=4)
+    args = parser.parse_args()
+    if args.serve:
+        serve(args)
+        return
+    weights = load_model(args)
+    features = make_extractor(args)(args.audio)
+    print(json.dumps(forward(args, weights, [features])[0]))
+
+
+if __name__ == "__main__":
+    main()
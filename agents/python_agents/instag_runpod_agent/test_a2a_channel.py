@@ -0,0 +1,145 @@
+import asyncio
+import json
+import threading
+
+import httpx
+import msgpack
+from fastapi.testclient import TestClient
+
+from app import a2a_protocol, main
+from app.jobs import JobEngine, report_progress
+
+
+def _message(type_, **payload):
+    return {"type": type_, "sender": "xcs", "recipient": "instag", "payload": payload}
+
+
+def test_validator_matches_elixir_a2a_message():
+    validate = a2a_protocol.compile_validator(extra_types=["agent_discovery_request"])
+    assert validate(_message("task_request")) is None
+    assert validate(_message("agent_discovery_request")) is None
+    assert validate({"type": "task_request", "payload": {}}) == "Missing required fields: sender, recipient"
+    assert validate({**_message("task_request"), "type": "bogus"}) == (
+        'Invalid type: "bogus". Allowed types: [:task_request, :result, :status_update, :agent_discovery,'
+        ' :negotiation, :agent_discovery_request]')
+    assert validate({**_message("task_request"), "payload": [1]}) == "Invalid payload: must be an object"
+    assert validate("task_request") == "Message must be an object"
+
+
+def test_batch_runs_messages_in_order_over_json_and_msgpack(monkeypatch):
+    async def scenario():
+        def op(params):
+            return {"status": "success", "n": params["n"]}
+
+        monkeypatch.setattr(main, "jobs", JobEngine())
+        monkeypatch.setitem(main.OPERATIONS, "channel_op", op)
+        batch = [
+            {**_message("task_request", task_id="batch-1", operation="channel_op", params={"n": 1}), "ref": 7},
+            {"type": "task_request", "payload": {}},
+            _message("status_update", task_id="batch-1"),
+        ]
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://agent") as client:
+            as_json = (await client.post("/api/a2a/batch", json=batch)).json()
+            await main.jobs.wait("batch-1", timeout=5)
+            packed = await client.post("/api/a2a/batch", content=msgpack.packb(batch[2:]),
+                                       headers={"content-type": "application/msgpack",
+                                                "accept": "application/msgpack"})
+            not_a_list = await client.post("/api/a2a/batch", json={"type": "task_request"})
+            # A message that passes validation but fails in dispatch only fails itself.
+            broken = (await client.post("/api/a2a/batch", json=[
+                _message("task_request", task_id="batch-bad", operation="channel_op", params=None),
+                _message("agent_discovery"),
+            ])).json()
+        await main.jobs.shutdown()
+        return as_json, packed, not_a_list, broken
+
+    as_json, packed, not_a_list, broken = asyncio.run(scenario())
+    assert [r["status"] for r in as_json[:2]] == ["accepted", "error"]
+    assert as_json[0]["ref"] == 7 and as_json[0]["task_id"] == "batch-1"
+    assert as_json[1]["error"] == "Missing required fields: sender, recipient"
+    assert as_json[2]["task_id"] == "batch-1"
+    assert packed.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(packed.content)[0]["result"] == {"status": "success", "n": 1}
+    assert not_a_list.status_code == 400
+    assert broken[0]["status"] == "error" and broken[0]["task_id"] == "batch-bad"
+    assert broken[1]["type"] == "agent_discovery_response"
+
+
+def test_channel_multiplexes_tasks_and_pushes_their_updates(monkeypatch):
+    release = threading.Event()
+
+    def op(params):
+        report_progress({"stage": "working", "n": params["n"]})
+        release.wait(5)
+        return {"status": "success", "n": params["n"]}
+
+    monkeypatch.setattr(main, "jobs", JobEngine())
+    monkeypatch.setitem(main.OPERATIONS, "channel_op", op)
+    with TestClient(main.app) as client:
+        with client.websocket_connect("/api/a2a/ws", subprotocols=["a2a.msgpack", "a2a.json"]) as ws:
+            assert ws.accepted_subprotocol == "a2a.msgpack"
+            ws.send_bytes(msgpack.packb([
+                _message("task_request", task_id="ws-1", operation="channel_op", params={"n": 1}),
+                _message("task_request", task_id="ws-2", operation="channel_op", params={"n": 2}),
+                {**_message("negotiate"), "ref": "bad"},
+            ]))
+            frames = []
+            while len([f for f in frames if f.get("type") == "status_update"]) < 2:
+                frames.append(msgpack.unpackb(ws.receive_bytes()))
+                if len([f for f in frames if f.get("type") == "task_progress"]) == 2:
+                    release.set()
+        with client.websocket_connect("/api/a2a/ws") as ws:
+            assert ws.accepted_subprotocol is None
+            ws.send_text(json.dumps(_message("task_request", task_id="ws-bad", operation="channel_op", params=None)))
+            broken = json.loads(ws.receive_text())
+            # The channel survives the failed message.
+            ws.send_text(json.dumps(_message("status_update", task_id="ws-1")))
+            status = json.loads(ws.receive_text())
+
+    assert [f["status"] for f in frames[:3]] == ["accepted", "accepted", "error"]
+    assert frames[2]["ref"] == "bad" and frames[2]["error"].startswith('Invalid type: "negotiate"')
+    progress = {f["task_id"]: f["payload"]["n"] for f in frames if f["type"] == "task_progress"}
+    assert progress == {"ws-1": 1, "ws-2": 2}
+    finals = {f["task_id"]: f for f in frames if f["type"] == "status_update"}
+    assert finals["ws-1"]["result"]["n"] == 1 and finals["ws-2"]["status"] == "completed"
+    assert broken["status"] == "error" and broken["task_id"] == "ws-bad"
+    assert status["task_id"] == "ws-1" and status["status"] == "completed"
+
+
+def test_post_without_task_id_gets_a_fresh_task_and_bad_params_get_an_error(monkeypatch):
+    async def scenario():
+        monkeypatch.setattr(main, "jobs", JobEngine())
+        monkeypatch.setitem(main.OPERATIONS, "channel_op", lambda params: {"status": "success", "n": params["n"]})
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://agent") as client:
+            first = (await client.post("/api/a2a", json=_message("task_request", operation="channel_op",
+                                                                 params={"n": 1}))).json()
+            second = (await client.post("/api/a2a", json=_message("task_request", operation="channel_op",
+                                                                  params={"n": 2}))).json()
+            results = [(await main.jobs.wait(r["task_id"], timeout=5)).result for r in (first, second)]
+            null_params = await client.post("/api/a2a", json=_message("task_request", task_id="p-1",
+                                                                      operation="channel_op", params=None))
+            list_payload = await client.post("/api/a2a", json={**_message("task_request"), "payload": [1]})
+        await main.jobs.shutdown()
+        return first, second, results, null_params, list_payload
+
+    first, second, results, null_params, list_payload = asyncio.run(scenario())
+    assert first["task_id"] != second["task_id"]
+    assert [r["n"] for r in results] == [1, 2]
+    assert null_params.status_code == 200 and null_params.json() == {
+        "type": "task_response", "task_id": "p-1", "status": "error", "error": "Invalid params: must be an object"}
+    assert list_payload.status_code == 200 and list_payload.json()["status"] == "error"
+
+
+def test_logged_payload_leaves_out_ssh_credentials(monkeypatch, capsys):
+    async def scenario():
+        monkeypatch.setattr(main, "jobs", JobEngine())
+        monkeypatch.setitem(main.OPERATIONS, "channel_op", lambda params: {"status": "success"})
+        ssh = {"host": "10.0.0.5", "username": "root", "password": "hunter2", "key_filename": "/keys/id"}
+        await main.dispatch_a2a_message(_message("task_request", task_id="log-1", operation="channel_op",
+                                                 params={"ssh": ssh}))
+        await main.jobs.wait("log-1", timeout=5)
+        await main.jobs.shutdown()
+
+    asyncio.run(scenario())
+    out = capsys.readouterr().out
+    assert "10.0.0.5" in out and "hunter2" not in out and "/keys/id" not in out
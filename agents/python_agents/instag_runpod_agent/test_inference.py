@@ -0,0 +1,147 @@
+import asyncio
+import shutil
+
+import numpy as np
+
+from app.inference import FeatureCache, InferenceServer, WorkerError
+
+
+class FakeBackend:
+    def __init__(self, memory_bytes: int):
+        self.memory_bytes = memory_bytes
+        self.batches = []
+        self.closed = False
+
+    async def load(self):
+        await asyncio.sleep(0.01)
+
+    def alive(self):
+        return not self.closed
+
+    async def infer_batch(self, requests):
+        self.batches.append(len(requests))
+        await asyncio.sleep(0.01)
+        return [{"audio": r["audio"]} for r in requests]
+
+    async def close(self):
+        self.closed = True
+
+
+def test_concurrent_requests_share_one_load_and_are_batched():
+    backends = []
+
+    def factory(key):
+        backends.append(FakeBackend(100))
+        return backends[-1]
+
+    async def scenario():
+        server = InferenceServer(factory, max_batch=8, max_wait=0.05)
+        results = await asyncio.gather(*(server.infer("model-a", {"audio": f"{i}.wav"}) for i in range(16)))
+        await server.close()
+        return results
+
+    results = asyncio.run(scenario())
+    assert [r["audio"] for r in results] == [f"{i}.wav" for i in range(16)]
+    assert len(backends) == 1
+    assert backends[0].batches == [8, 8]
+    assert backends[0].closed
+
+
+def test_idle_models_are_evicted_under_memory_budget():
+    backends = {}
+
+    def factory(key):
+        backends[key] = FakeBackend(600)
+        return backends[key]
+
+    async def scenario():
+        server = InferenceServer(factory, memory_budget=1000, max_wait=0)
+        await server.infer("model-a", {"audio": "a.wav"})
+        await server.infer("model-b", {"audio": "b.wav"})
+        loaded = set(server.workers)
+        await server.infer("model-a", {"audio": "a.wav"})
+        stats = server.stats()
+        await server.close()
+        return loaded, stats
+
+    loaded, stats = asyncio.run(scenario())
+    assert loaded == {"model-b"}
+    assert set(stats["workers"]) == {"model-a"} and stats["evictions"] == 2
+    assert backends["model-b"].closed
+
+
+def test_worker_collecting_a_batch_is_not_evicted():
+    def factory(key):
+        return FakeBackend(600)
+
+    async def scenario():
+        server = InferenceServer(factory, memory_budget=1000, max_wait=0.2)
+        await server.infer("model-a", {"audio": "warm.wav"})
+        pending = asyncio.ensure_future(server.infer("model-a", {"audio": "a.wav"}))
+        await asyncio.sleep(0.05)  # model-a is now waiting for more requests to batch
+        await server.infer("model-b", {"audio": "b.wav"})
+        result = await asyncio.wait_for(pending, 2)
+        await server.close()
+        return result
+
+    assert asyncio.run(scenario()) == {"audio": "a.wav"}
+
+
+def test_unloading_fails_requests_in_the_batch_being_collected():
+    async def scenario():
+        server = InferenceServer(lambda key: FakeBackend(100), max_wait=0.5)
+        await server.infer("model-a", {"audio": "warm.wav"})
+        pending = asyncio.ensure_future(server.infer("model-a", {"audio": "a.wav"}))
+        await asyncio.sleep(0.05)
+        await server.close()
+        return await asyncio.wait_for(asyncio.gather(pending, return_exceptions=True), 2)
+
+    (error,) = asyncio.run(scenario())
+    assert isinstance(error, WorkerError)
+
+
+class ShortBackend(FakeBackend):
+    async def infer_batch(self, requests):
+        if any(r["audio"] == "hang.wav" for r in requests):
+            await asyncio.sleep(60)
+        return [{"audio": r["audio"]} for r in requests[:1]]  # drops every result after the first
+
+
+def test_short_or_late_batches_fail_every_request():
+    async def scenario():
+        backends = []
+        server = InferenceServer(lambda key: backends.append(ShortBackend(100)) or backends[-1], max_wait=0.05,
+                                 batch_timeout=0.2)
+        short = await asyncio.wait_for(asyncio.gather(
+            *(server.infer("model-a", {"audio": f"{i}.wav"}) for i in range(3)), return_exceptions=True), 2)
+        late = await asyncio.wait_for(asyncio.gather(server.infer("model-a", {"audio": "hang.wav"}),
+                                                     return_exceptions=True), 2)
+        after = await server.infer("model-a", {"audio": "next.wav"})
+        await server.close()
+        return short, late, after, backends
+
+    short, late, after, backends = asyncio.run(scenario())
+    assert all(isinstance(e, WorkerError) and "1 results for 3 requests" in str(e) for e in short)
+    assert isinstance(late[0], WorkerError) and "did not answer" in str(late[0])
+    # The timed-out backend was closed and replaced by a fresh worker.
+    assert after == {"audio": "next.wav"} and len(backends) == 2 and backends[0].closed
+
+
+def test_feature_cache_is_keyed_by_content(tmp_path):
+    audio = tmp_path / "clip.wav"
+    audio.write_bytes(b"RIFF" + bytes(range(256)) * 64)
+    shutil.copy(audio, tmp_path / "renamed.wav")
+    calls = []
+
+    def extract(path):
+        calls.append(path)
+        return np.arange(12, dtype=np.float32).reshape(4, 3)
+
+    cache = FeatureCache(str(tmp_path / "features"))
+    first = cache.get(str(audio), "deepspeech", extract)
+    again = FeatureCache(str(tmp_path / "features")).get(str(tmp_path / "renamed.wav"), "deepspeech", extract)
+    cache.get(str(audio), "hubert", extract)
+
+    assert len(calls) == 2
+    assert isinstance(again, np.memmap)
+    assert np.array_equal(first, again)
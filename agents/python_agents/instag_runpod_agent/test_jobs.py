@@ -0,0 +1,68 @@
+import asyncio
+import threading
+
+from fastapi.testclient import TestClient
+
+from app.jobs import JobEngine
+from app.main import app
+
+
+def test_task_request_is_accepted_and_polled_to_completion():
+    with TestClient(app) as client:
+        r = client.post("/api/a2a", json={"type": "task_request", "payload": {
+            "task_id": "job-t1", "operation": "instag_setup_environment", "params": {"pod_id": "pod1"}}})
+        assert r.json() == {"type": "task_response", "task_id": "job-t1", "status": "accepted"}
+
+        for _ in range(100):
+            status = client.post("/api/a2a", json={"type": "status_update", "payload": {"task_id": "job-t1"}}).json()
+            if status["status"] == "completed":
+                break
+            threading.Event().wait(0.01)
+        assert status["status"] == "completed"
+        assert client.get("/api/tasks/job-t1").json()["result"]["status"] == "success"
+        assert client.get("/api/tasks/missing").status_code == 404
+
+
+def test_per_pod_limit_bounds_concurrency():
+    running = {"now": 0, "peak": 0}
+    lock = threading.Lock()
+    release = threading.Event()
+
+    def op(params):
+        with lock:
+            running["now"] += 1
+            running["peak"] = max(running["peak"], running["now"])
+        release.wait(1)
+        with lock:
+            running["now"] -= 1
+        return {"ok": True}
+
+    async def scenario():
+        engine = JobEngine(max_workers=8, per_pod_limit=2)
+        for i in range(6):
+            engine.submit(f"t{i}", "op", op, {"pod_id": "pod1"})
+        await asyncio.sleep(0.1)
+        assert engine.stats()["running"] == 2
+        release.set()
+        for i in range(6):
+            assert (await engine.wait(f"t{i}", timeout=2)).status == "completed"
+        await engine.shutdown()
+
+    asyncio.run(scenario())
+    assert running["peak"] == 2
+
+
+def test_failed_operation_reports_error():
+    def op(params):
+        raise RuntimeError("ssh unreachable")
+
+    async def scenario():
+        engine = JobEngine()
+        engine.submit("t-err", "op", op, {})
+        job = await engine.wait("t-err", timeout=2)
+        await engine.shutdown()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.status == "error"
+    assert job.error == "ssh unreachable"
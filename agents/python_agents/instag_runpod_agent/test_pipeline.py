@@ -0,0 +1,70 @@
+import time
+
+import pytest
+
+from app.pipeline import LocalBackend, PipelineError, PreprocessPipeline, build_dataset_dag
+
+VIDEOS = ["may", "macron", "obama"]
+
+
+def stub_dataset(tmp_path, stage_seconds=0.2):
+    for video in VIDEOS:
+        (tmp_path / "data" / "pretrain" / video).mkdir(parents=True)
+        (tmp_path / "data" / "pretrain" / video / f"{video}.mp4").write_bytes(video.encode() * 100)
+    nodes = build_dataset_dag(VIDEOS, audio_extractor="deepspeech")
+    for node in nodes:
+        # Stub stage: take a little time and record that it ran.
+        node.command = f"sleep {stage_seconds} && echo {node.id} >> ran.log"
+    return nodes
+
+
+def test_independent_stages_overlap_within_slot_limits(tmp_path):
+    nodes = stub_dataset(tmp_path)
+    events = []
+    start = time.monotonic()
+    summary = PreprocessPipeline(LocalBackend(str(tmp_path)), cpu_slots=4, gpu_slots=2, on_progress=events.append).run(nodes)
+    elapsed = time.monotonic() - start
+
+    assert set(summary["stages"].values()) == {"completed"}
+    assert len((tmp_path / "ran.log").read_text().splitlines()) == len(nodes) == 9
+    # Serial execution would take 9 x 0.2s; the DAG needs about three rounds.
+    assert elapsed < 1.2
+    assert events[-1]["done"] == events[-1]["total"] == 9
+    started = [e for e in events if e["status"] == "started"]
+    assert started[0]["stage"] == "process"
+
+
+def test_rerun_skips_stages_with_matching_markers_and_reruns_changed_inputs(tmp_path):
+    nodes = stub_dataset(tmp_path, stage_seconds=0)
+    pipeline = PreprocessPipeline(LocalBackend(str(tmp_path)))
+    pipeline.run(nodes)
+    assert set(pipeline.run(nodes)["stages"].values()) == {"skipped"}
+
+    (tmp_path / "data" / "pretrain" / "may" / "may.mp4").write_bytes(b"new take")
+    stages = pipeline.run(nodes)["stages"]
+    assert {k for k, v in stages.items() if v == "completed"} == {"may/process", "may/teeth_mask", "may/audio_deepspeech"}
+
+
+def test_failed_stage_blocks_only_its_dependents(tmp_path):
+    nodes = stub_dataset(tmp_path, stage_seconds=0)
+    next(n for n in nodes if n.id == "macron/process").command = "echo face tracking failed >&2; exit 1"
+    with pytest.raises(PipelineError) as excinfo:
+        PreprocessPipeline(LocalBackend(str(tmp_path))).run(nodes)
+    stages = excinfo.value.summary["stages"]
+    assert stages["macron/process"] == "failed"
+    assert stages["macron/teeth_mask"] == stages["macron/audio_deepspeech"] == "blocked"
+    assert stages["may/audio_deepspeech"] == "completed"
+    assert "face tracking failed" in excinfo.value.summary["errors"]["macron/process"]
+
+
+def test_stages_that_can_never_run_fail_the_pipeline(tmp_path):
+    with pytest.raises(ValueError):
+        PreprocessPipeline(LocalBackend(str(tmp_path)), gpu_slots=0)
+    nodes = stub_dataset(tmp_path, stage_seconds=0)
+    pipeline = PreprocessPipeline(LocalBackend(str(tmp_path)))
+    pipeline.slots["gpu"] = 0  # a resource with no slots at all
+    with pytest.raises(PipelineError) as excinfo:
+        pipeline.run(nodes)
+    summary = excinfo.value.summary
+    assert set(summary["stages"]) == {n.id for n in nodes}
+    assert all(summary["stages"][n.id] == "blocked" for n in nodes if n.resource == "gpu")
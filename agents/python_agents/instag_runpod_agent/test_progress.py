@@ -0,0 +1,95 @@
+import asyncio
+import json
+import time
+
+import httpx
+
+from app import main
+from app.jobs import JobEngine, report_progress
+from app.progress import Broadcaster, LogProgressParser, parse_progress
+from app.ssh_pool import SSHPool
+from ssh_standin import PASSWORD, USERNAME, StandInServer, serve
+
+BAR = "Training progress:  45%|████▌     | 4500/10000 [01:23<01:42, 53.51it/s, Loss=0.0123457]"
+
+
+def test_parse_training_output():
+    assert parse_progress(BAR) == {"type": "log_progress", "stage": "Training progress", "iteration": 4500,
+                                   "total": 10000, "progress": 45, "elapsed_seconds": 83, "eta_seconds": 102,
+                                   "loss": 0.0123457}
+    assert parse_progress("[ITER 7000] Saving Gaussians") == {"type": "log_progress", "iteration": 7000,
+                                                              "message": "Saving Gaussians"}
+    assert parse_progress("Loading cameras") is None
+
+
+def test_parser_splits_carriage_returns_and_multibyte_chunks():
+    events = []
+    parser = LogProgressParser(events.append, min_interval=0)
+    data = ("\r" + BAR + "\r" + BAR.replace("4500/", "4600/") + "\n").encode()
+    for i in range(0, len(data), 7):  # splits the █ characters across chunks
+        parser.feed(data[i:i + 7], stderr=True)
+    parser.close()
+    assert [e["iteration"] for e in events] == [4500, 4600]
+
+
+def test_slow_subscriber_keeps_only_latest_events():
+    async def scenario():
+        events = Broadcaster(maxsize=4)
+        slow = events.subscribe()
+        for i in range(100):
+            events.publish({"iteration": i})
+        events.close()
+        received = []
+        while (event := await slow.get()) is not None:
+            received.append(event["iteration"])
+        return received, slow.dropped
+
+    received, dropped = asyncio.run(scenario())
+    assert received == [97, 98, 99]
+    assert dropped == 97  # 96 overflowed while publishing, 1 made room for the end marker
+
+
+def test_stream_fans_out_live_progress_to_every_subscriber(monkeypatch):
+    async def scenario():
+        gate = asyncio.Event()
+
+        async def op(params):
+            await gate.wait()
+            for i in range(3):
+                report_progress(parse_progress(BAR.replace("4500/", f"{i}/")))
+                await asyncio.sleep(0.01)
+            return {"status": "success"}
+
+        monkeypatch.setattr(main, "jobs", JobEngine())
+        monkeypatch.setitem(main.OPERATIONS, "test_training", op)
+        request = {"type": "task_request", "payload": {"task_id": "stream-1", "operation": "test_training", "stream": True}}
+        follow = {"type": "status_update", "payload": {"task_id": "stream-1", "stream": True}}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://agent") as client:
+            first = asyncio.create_task(client.post("/api/a2a", json=request))
+            await asyncio.sleep(0.05)
+            second = asyncio.create_task(client.post("/api/a2a", json=follow))
+            await asyncio.sleep(0.05)
+            gate.set()
+            return await first, await second
+
+    for response in asyncio.run(scenario()):
+        assert response.headers["content-type"] == "application/x-ndjson"
+        frames = [json.loads(line) for line in response.text.splitlines()]
+        progress = [f["payload"]["iteration"] for f in frames if f["type"] == "task_progress"]
+        assert progress == [0, 1, 2]
+        assert frames[-1]["type"] == "status_update" and frames[-1]["status"] == "completed"
+
+
+def test_ssh_output_is_delivered_while_the_command_runs():
+    StandInServer.run_commands = True
+    pool = SSHPool()
+    pool.register("pod", "127.0.0.1", serve(), USERNAME, password=PASSWORD)
+    arrivals = []
+    try:
+        started = time.monotonic()
+        pool.run("pod", "printf 'step 1\\r' >&2; sleep 1; printf 'step 2\\n'",
+                 on_output=lambda data, is_stderr: arrivals.append((time.monotonic() - started, data, is_stderr)))
+    finally:
+        pool.close()
+    assert arrivals[0][1:] == (b"step 1\r", True)
+    assert arrivals[-1][0] - arrivals[0][0] > 0.3
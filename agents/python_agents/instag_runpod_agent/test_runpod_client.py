@@ -0,0 +1,102 @@
+import asyncio
+
+import httpx
+
+from app.runpod_ops import RunPodClient, pod_spec, ssh_endpoint
+from fake_runpod_api import create_app
+
+
+def make_client(api, **kwargs):
+    return RunPodClient(api_key="test", base_url="http://fake/v1", transport=httpx.ASGITransport(app=api), **kwargs)
+
+
+def test_concurrent_identical_requests_are_coalesced_and_cached():
+    api = create_app()
+
+    async def scenario():
+        client = make_client(api, cache_ttl=60)
+        pod = await client.create_pod(pod_spec("p", "NVIDIA GeForce RTX 4090"))
+        results = await asyncio.gather(*(client.get_pod(pod["id"]) for _ in range(200)))
+        await client.get_pod(pod["id"])
+        await client.close()
+        return pod, results
+
+    pod, results = asyncio.run(scenario())
+    assert all(r["id"] == pod["id"] for r in results)
+    assert api.state.requests["get"] == 1
+
+
+def test_stale_entries_are_served_while_revalidating_and_invalidated_on_delete():
+    api = create_app()
+
+    async def scenario():
+        client = make_client(api, cache_ttl=0.0, stale_ttl=60)
+        pod = await client.create_pod(pod_spec("p", "NVIDIA GeForce RTX 4090"))
+        await client.list_pods()
+        stale = await client.list_pods()  # served from cache, refresh started in background
+        await asyncio.sleep(0.05)
+        await client.delete_pod(pod["id"])
+        after_delete = await client.list_pods()
+        await client.close()
+        return stale, after_delete
+
+    stale, after_delete = asyncio.run(scenario())
+    assert len(stale) == 1
+    assert after_delete == []
+    assert api.state.requests["list"] == 3
+
+
+def test_waiters_share_one_status_poller():
+    api = create_app(boot_seconds=0.1)
+
+    async def scenario():
+        client = make_client(api, poll_interval=0.02)
+        pods = [await client.create_pod(pod_spec(f"p{i}", "NVIDIA GeForce RTX 4090")) for i in range(50)]
+        ready = await asyncio.gather(*(
+            client.wait_for_pod(p["id"], lambda pod: ssh_endpoint(pod) is not None, timeout=5) for p in pods))
+        await client.close()
+        return ready
+
+    ready = asyncio.run(scenario())
+    assert all(ssh_endpoint(pod) for pod in ready)
+    assert api.state.requests["get"] == 0
+    assert api.state.requests["list"] < 20
+
+
+class _SlowListTransport(httpx.AsyncBaseTransport):
+    """Answers GET /pods with the inventory as it was when the request arrived, 0.2s later."""
+
+    def __init__(self, app):
+        self.inner = httpx.ASGITransport(app=app)
+
+    async def handle_async_request(self, request):
+        response = await self.inner.handle_async_request(request)
+        if request.method == "GET" and request.url.path == "/v1/pods":
+            await asyncio.sleep(0.2)
+        return response
+
+
+def test_pod_created_during_a_poll_is_not_reported_gone():
+    api = create_app(boot_seconds=0.3)
+
+    async def scenario():
+        client = RunPodClient(api_key="test", base_url="http://fake/v1", transport=_SlowListTransport(api),
+                              poll_interval=0.01)
+        ready = lambda pod: ssh_endpoint(pod) is not None
+        first = await client.create_pod(pod_spec("p0", "NVIDIA GeForce RTX 4090"))
+        waiting = asyncio.ensure_future(client.wait_for_pod(first["id"], ready, timeout=5))
+        await asyncio.sleep(0.05)  # the poller's GET /pods is now in flight, without the next pod
+        second = await client.create_pod(pod_spec("p1", "NVIDIA GeForce RTX 4090"))
+        booted = await client.wait_for_pod(second["id"], ready, timeout=5)
+        await waiting
+        del api.state.pods[second["id"]]
+        try:
+            await client.wait_for_pod(second["id"], lambda pod: False, timeout=5)
+        except LookupError as e:
+            gone = str(e)
+        await client.close()
+        return second, booted, gone
+
+    second, booted, gone = asyncio.run(scenario())
+    assert booted["id"] == second["id"]
+    assert gone == f"Pod {second['id']} no longer exists"
@@ -0,0 +1,113 @@
+import socket
+import threading
+import time
+
+from app.ssh_pool import SSHPool
+from ssh_standin import PASSWORD, USERNAME, StandInServer, serve
+
+StandInServer.run_commands = True
+
+
+def make_pool(**kwargs):
+    pool = SSHPool(**kwargs)
+    pool.register("pod", "127.0.0.1", serve(), USERNAME, password=PASSWORD)
+    return pool
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not reached in time")
+        time.sleep(0.02)
+
+
+def test_idle_transport_sends_keepalives(monkeypatch):
+    seen = []
+    monkeypatch.setattr(StandInServer, "check_global_request", lambda self, kind, msg: seen.append(kind) or False,
+                        raising=False)
+    pool = make_pool(keepalive=1)
+    try:
+        pool.run("pod", "true")
+        wait_until(lambda: "keepalive@lag.net" in seen)
+        assert pool.stats()["pod"]["active"]
+    finally:
+        pool.close()
+
+
+def test_idle_transports_are_evicted_in_the_background_and_reconnect_on_use():
+    pool = make_pool(idle_ttl=0.1, evict_interval=0.05)
+    try:
+        pool.run("pod", "true")
+        # Nothing touches the pool here: only the background evictor can close the transport.
+        wait_until(lambda: not pool.stats()["pod"]["active"])
+        assert pool.run("pod", "echo again")["stdout"] == "again\n"
+        assert pool.stats()["pod"]["connects"] == 2
+        pool.unregister("pod")
+        assert not pool.has("pod") and pool.stats() == {}
+    finally:
+        pool.close()
+
+
+def test_run_reconnects_after_the_transport_dies():
+    pool = make_pool()
+    try:
+        pool.run("pod", "true")
+        transport = pool._pods["pod"].transport()
+        transport.sock.close()  # the pod restarted or a NAT dropped the connection
+        assert pool.run("pod", "echo back")["stdout"] == "back\n"
+        assert pool.stats()["pod"] == {"active": True, "in_use": 0, "connects": 2}
+    finally:
+        pool.close()
+
+
+def test_sessions_and_commands_share_the_channel_bound():
+    pool = make_pool(max_channels=2)
+    done = threading.Event()
+    try:
+        sessions = [pool.open_session("pod", "sleep 5") for _ in range(2)]
+        waiter = threading.Thread(target=lambda: pool.run("pod", "true") and done.set(), daemon=True)
+        waiter.start()
+        # Both slots are held by resident sessions, so the command waits for one of them.
+        assert not done.wait(0.3)
+        assert pool.stats()["pod"]["in_use"] == 2
+        pool.close_session("pod", sessions[0])
+        assert done.wait(5)
+        pool.close_session("pod", sessions[0])  # closing twice does not free a second slot
+        pool.close_session("pod", sessions[1])
+        assert pool.stats()["pod"]["in_use"] == 0
+    finally:
+        pool.close()
+
+
+def test_timeout_applies_to_commands_that_keep_printing():
+    pool = make_pool()
+    try:
+        started = time.monotonic()
+        try:
+            pool.run("pod", "while true; do echo tick; sleep 0.01; done", timeout=0.5)
+        except socket.timeout as e:
+            error = str(e)
+        elapsed = time.monotonic() - started
+    finally:
+        pool.close()
+    assert error.startswith("Command timed out after 0.5s") and elapsed < 3
+
+
+def test_failed_connect_closes_its_socket(monkeypatch):
+    import paramiko
+
+    opened = []
+    create_connection = socket.create_connection
+    monkeypatch.setattr(socket, "create_connection",
+                        lambda *args, **kwargs: opened.append(create_connection(*args, **kwargs)) or opened[-1])
+    pool = SSHPool()
+    pool.register("pod", "127.0.0.1", serve(), USERNAME, password="wrong")
+    try:
+        try:
+            pool.run("pod", "true")
+        except paramiko.AuthenticationException:
+            pass
+    finally:
+        pool.close()
+    assert len(opened) == 2 and all(sock.fileno() == -1 for sock in opened)  # first try and the reconnect
@@ -0,0 +1,176 @@
+import asyncio
+import os
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+import httpx
+
+from app.jobs import JobEngine
+from app.task_store import TaskStore
+
+# A real agent worker: the stock app plus one slow operation that hangs while HANG is set.
+WORKER = """
+import os, sys, time
+import uvicorn
+from app import main
+
+def slow_op(params):
+    if os.environ.get("HANG"):
+        time.sleep(60)
+    return {"status": "success", "pid": os.getpid()}
+
+main.OPERATIONS["test_slow_op"] = slow_op
+uvicorn.run(main.app, host="127.0.0.1", port=int(sys.argv[1]), log_level="warning")
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def _start_worker(db: str, hang: bool):
+    port = _free_port()
+    env = {**os.environ, "INSTAG_TASK_DB": db, "HANG": "1" if hang else ""}
+    process = subprocess.Popen([sys.executable, "-c", WORKER, str(port)], env=env,
+                               cwd=os.path.dirname(os.path.abspath(__file__)))
+    url = f"http://127.0.0.1:{port}"
+    for _ in range(200):
+        try:
+            httpx.get(url + "/", timeout=1)
+            return process, url
+        except httpx.TransportError:
+            time.sleep(0.05)
+    process.kill()
+    raise RuntimeError("worker did not start")
+
+
+def _wait_for(predicate, timeout=10.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        value = predicate()
+        if value:
+            return value
+        time.sleep(0.05)
+    raise AssertionError("timed out")
+
+
+def test_killed_worker_task_is_resumed_after_restart(tmp_path):
+    db = str(tmp_path / "tasks.db")
+    first, url = _start_worker(db, hang=True)
+    try:
+        reply = httpx.post(url + "/api/a2a", json={"type": "task_request", "payload": {
+            "task_id": "kill-1", "operation": "test_slow_op", "params": {}}}).json()
+        assert reply["status"] == "accepted"
+        store = TaskStore(db)
+        _wait_for(lambda: store.get("kill-1")["status"] == "running")
+        first.send_signal(signal.SIGKILL)
+        first.wait()
+    finally:
+        first.kill()
+
+    second, url = _start_worker(db, hang=False)
+    try:
+        status = _wait_for(lambda: (s := httpx.get(url + "/api/tasks/kill-1").json())["status"] == "completed" and s)
+    finally:
+        second.terminate()
+        second.wait()
+    assert status["result"]["pid"] == second.pid
+    row = store.get("kill-1")
+    assert row["status"] == "completed" and row["attempts"] == 1
+    assert row["owner"].split(":")[1] == str(second.pid)
+
+
+def test_task_submitted_to_two_workers_runs_once(tmp_path):
+    db = str(tmp_path / "tasks.db")
+    calls = []
+
+    def op(params):
+        calls.append(threading.get_ident())
+        time.sleep(0.2)
+        return {"status": "success"}
+
+    async def scenario():
+        # Two engines with their own connections behave like two uvicorn worker processes.
+        a = JobEngine(store=TaskStore(db), follow_interval=0.05)
+        b = JobEngine(store=TaskStore(db), follow_interval=0.05)
+        owner = a.submit("dup-1", "op", op, {})
+        follower = b.submit("dup-1", "op", op, {})
+        await asyncio.gather(a.wait("dup-1", timeout=5), b.wait("dup-1", timeout=5))
+        await a.shutdown()
+        await b.shutdown()
+        return owner, follower
+
+    owner, follower = asyncio.run(scenario())
+    assert len(calls) == 1
+    assert owner.status == follower.status == "completed"
+    assert follower.result == {"status": "success"}
+
+
+def test_concurrent_reclaims_never_hand_a_task_to_two_workers(tmp_path):
+    db = str(tmp_path / "tasks.db")
+    dead = TaskStore(db)
+    for i in range(200):
+        dead.create(f"t{i}", "op", {})
+    dead._execute("UPDATE tasks SET heartbeat_at = 0")  # its owner stopped heartbeating
+    workers = [TaskStore(db) for _ in range(4)]
+    claimed = [[] for _ in workers]
+    barrier = threading.Barrier(len(workers))
+
+    def reclaim(i):
+        barrier.wait()
+        claimed[i] = [row["task_id"] for row in workers[i].reclaim()]
+
+    threads = [threading.Thread(target=reclaim, args=(i,)) for i in range(len(workers))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    everything = [task_id for ids in claimed for task_id in ids]
+    assert sorted(everything) == sorted(f"t{i}" for i in range(200))
+    assert {row["owner"] for row in dead.find()} <= {w.worker_id for w in workers}
+
+
+def test_resumed_task_fails_when_its_pod_is_gone(tmp_path):
+    db = str(tmp_path / "tasks.db")
+    dead = TaskStore(db)
+    dead.create("gone-1", "op", {"pod_id": "pod-gone"})
+    dead._execute("UPDATE tasks SET heartbeat_at = 0")
+
+    async def reconcile(job):
+        raise RuntimeError(f"Pod {job.pod_id} no longer exists")
+
+    async def scenario():
+        engine = JobEngine(store=TaskStore(db), resolve=lambda name: lambda params: {"status": "success"},
+                           reconcile=reconcile)
+        await engine.start()
+        job = await engine.wait("gone-1", timeout=5)
+        await engine.shutdown()
+        return job
+
+    job = asyncio.run(scenario())
+    assert job.status == "error" and "pod-gone" in job.error
+    assert dead.get("gone-1")["status"] == "error"
+
+
+def test_ssh_credentials_are_never_written_to_the_database(tmp_path):
+    db = str(tmp_path / "tasks.db")
+    store = TaskStore(db)
+    ssh = {"host": "10.0.0.5", "port": 2201, "username": "root", "password": "hunter2", "key_filename": "/keys/id"}
+    store.create("t-secret", "instag_run_training", {"pod_id": "p1", "ssh": ssh, "training_params": {"iters": 10}})
+    store.lease_pod("p1", "t-secret", "RTX", ssh)
+    store.save_warm_pod({"pod_id": "p2", "gpu_type": "RTX", "state": "idle", "ssh": ssh, "artifacts": [],
+                         "task_id": None, "owner": None, "idle_since": 0, "created_at": 0})
+    with open(db, "rb") as f:
+        raw = f.read()
+    with open(db + "-wal", "rb") as f:
+        raw += f.read()
+    assert b"hunter2" not in raw and b"/keys/id" not in raw
+    endpoint = {"host": "10.0.0.5", "port": 2201, "username": "root"}
+    assert store.get("t-secret")["params"] == {"pod_id": "p1", "ssh": endpoint, "training_params": {"iters": 10}}
+    assert store.pod_leases("t-secret")[0]["ssh"] == endpoint
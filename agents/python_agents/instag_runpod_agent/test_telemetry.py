@@ -0,0 +1,103 @@
+import asyncio
+import glob
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+
+from app import main
+from app.jobs import JobEngine
+from app.runpod_ops import RunPodClient
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+TRACEPARENT = "00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01"
+
+
+def test_metrics_endpoint_exposes_a2a_and_pool_series(monkeypatch):
+    async def scenario():
+        async def op(params):
+            return {"status": "success"}
+
+        monkeypatch.setattr(main, "jobs", JobEngine())
+        monkeypatch.setitem(main.OPERATIONS, "test_op", op)
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://agent") as client:
+            await client.post("/api/a2a", json={"type": "task_request",
+                                                "payload": {"task_id": "metrics-1", "operation": "test_op"}})
+            await main.jobs.wait("metrics-1", timeout=5)
+            await client.post("/api/a2a", json={"type": "no_such_type", "payload": {}})
+            return await client.get("/metrics")
+
+    response = asyncio.run(scenario())
+    assert response.status_code == 200
+    text = response.text
+    assert 'a2a_messages_total{type="task_request"}' in text
+    assert 'a2a_errors_by_type_total{type="other"}' in text
+    assert 'a2a_request_latency_seconds_bucket{le="0.001",type="task_request"}' in text
+    assert 'instag_operation_duration_seconds_count{operation="test_op",status="completed"} 1.0' in text
+    assert 'instag_tasks{status="completed"} 1.0' in text
+    assert "instag_ssh_channels_in_use" in text
+
+
+def test_traceparent_is_continued_into_runpod_calls(monkeypatch):
+    seen = []
+
+    def runpod(request):
+        seen.append(request.headers.get("traceparent"))
+        return httpx.Response(200, json=[])
+
+    async def scenario():
+        client = RunPodClient(api_key="test", transport=httpx.MockTransport(runpod))
+
+        async def op(params):
+            return await client.list_pods()
+
+        monkeypatch.setattr(main, "jobs", JobEngine())
+        monkeypatch.setitem(main.OPERATIONS, "list_pods", op)
+        try:
+            async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://agent") as http:
+                await http.post("/api/a2a", headers={"traceparent": TRACEPARENT},
+                                json={"type": "task_request", "payload": {"task_id": "trace-1", "operation": "list_pods"}})
+                await main.jobs.wait("trace-1", timeout=5)
+                return (await http.get("/api/tasks/trace-1")).json()
+        finally:
+            await client.close()
+
+    status = asyncio.run(scenario())
+    assert status["status"] == "completed"
+    assert status["trace_id"] == TRACEPARENT.split("-")[1]
+    # Same trace id as the caller's; the span id differs once an SDK tracer records child spans.
+    assert seen and seen[0].split("-")[1] == TRACEPARENT.split("-")[1]
+
+
+def test_metrics_add_up_across_supervised_workers(tmp_path):
+    port = _free_port()
+    metrics_dir = tmp_path / "metrics"
+    env = {**os.environ, "INSTAG_TASK_DB": str(tmp_path / "tasks.db"), "PROMETHEUS_MULTIPROC_DIR": str(metrics_dir)}
+    supervisor = subprocess.Popen(
+        [sys.executable, "-c", f"from app.supervisor import serve; serve('app.main:app', '127.0.0.1', {port}, 2)"],
+        env=env, cwd=os.path.dirname(os.path.abspath(__file__)))
+    url = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(200):
+            if len(glob.glob(str(metrics_dir / "gauge_livesum_*.db"))) == 2:
+                break
+            time.sleep(0.05)
+        assert len(glob.glob(str(metrics_dir / "gauge_livesum_*.db"))) == 2  # both workers publish
+        for _ in range(20):
+            # A new connection per request, so the kernel spreads them over both workers.
+            httpx.post(url + "/api/a2a", json={"type": "agent_discovery_request", "payload": {}})
+        scrapes = [httpx.get(url + "/metrics").text for _ in range(6)]
+    finally:
+        supervisor.terminate()
+        supervisor.wait(30)
+    for text in scrapes:
+        assert 'a2a_messages_total{type="agent_discovery_request"} 20.0' in text
+        assert "instag_tasks" in text
@@ -0,0 +1,78 @@
+import os
+
+import pytest
+
+from app import instag_ops
+from app.ssh_pool import SSHPool
+from app.transfer import ArtifactTransfer
+from ssh_standin import PASSWORD, USERNAME, StandInServer, serve
+
+StandInServer.run_commands = True
+
+
+def make_engine(tmp_path):
+    pool = SSHPool()
+    pool.register("pod", "127.0.0.1", serve(), USERNAME, password=PASSWORD)
+    return pool, ArtifactTransfer(pool, chunk_size=1024, workers=3, remote_cache_dir=str(tmp_path / "cache"))
+
+
+def test_upload_sends_only_changed_chunks_and_resumes(tmp_path):
+    local, remote = tmp_path / "au.csv", str(tmp_path / "pod" / "data" / "au.csv")
+    data = bytearray(os.urandom(10 * 1024 + 100))
+    local.write_bytes(data)
+    pool, engine = make_engine(tmp_path)
+    try:
+        assert engine.upload("pod", str(local), remote)["chunks_sent"] == 11
+        assert engine.upload("pod", str(local), remote)["status"] == "present"
+
+        data[5000:5010] = b"x" * 10
+        local.write_bytes(data[:-50])
+        stats = engine.upload("pod", str(local), remote)
+        assert stats["chunks_sent"] == 2  # the edited chunk and the shortened tail
+        assert open(remote, "rb").read() == bytes(data[:-50])
+
+        os.remove(remote)
+        with open(remote + ".part", "wb") as f:
+            f.write(bytes(data[:4096]))
+        assert engine.upload("pod", str(local), remote)["chunks_sent"] == 7
+        assert open(remote, "rb").read() == bytes(data[:-50])
+        assert not os.path.exists(remote + ".part")
+    finally:
+        pool.close()
+
+
+def test_download_and_stream_round_trip(tmp_path):
+    remote, local = tmp_path / "model.pth", str(tmp_path / "out" / "model.pth")
+    data = os.urandom(20 * 1024 + 7)
+    remote.write_bytes(data)
+    pool, engine = make_engine(tmp_path)
+    try:
+        assert engine.download("pod", str(remote), local)["chunks_sent"] == 21
+        assert open(local, "rb").read() == data
+        assert engine.download("pod", str(remote), local)["status"] == "present"
+        assert b"".join(engine.stream("pod", str(remote), block_size=4096)) == data
+    finally:
+        pool.close()
+
+
+def test_artifact_ops_keep_local_paths_under_the_artifact_dir(tmp_path, monkeypatch):
+    root, remote = tmp_path / "artifacts", tmp_path / "pod" / "model.pth"
+    root.mkdir()
+    remote.parent.mkdir()
+    remote.write_bytes(b"weights")
+    os.symlink(tmp_path, root / "up")
+    monkeypatch.setattr(instag_ops, "ARTIFACT_DIR", str(root))
+    ssh = {"host": "127.0.0.1", "port": serve(), "username": USERNAME, "password": PASSWORD}
+    try:
+        for local in ["/etc/passwd", "../secret", "out/../../secret", "up/pod/model.pth", ""]:
+            with pytest.raises(ValueError):
+                instag_ops.download_artifacts("pod", [{"local": local, "remote": str(remote)}], ssh=ssh)
+            with pytest.raises(ValueError):
+                instag_ops.upload_artifacts("pod", [{"local": local, "remote": "x"}], ssh=ssh)
+        with pytest.raises(ValueError):
+            instag_ops.setup_instag_environment("pod", bfm_path="/root/01_MorphableModel.mat")
+        result = instag_ops.download_artifacts("pod", [{"local": "out/model.pth", "remote": str(remote)}], ssh=ssh)
+    finally:
+        instag_ops.ssh_pool.close()
+    assert result["status"] == "success"
+    assert (root / "out" / "model.pth").read_bytes() == b"weights"
@@ -0,0 +1,199 @@
+import asyncio
+import time
+
+import httpx
+
+from app import main
+from app.jobs import JobEngine
+from app.runpod_ops import RunPodClient
+from app.task_store import TaskStore
+from app.warm_pool import WarmPool
+from fake_runpod_api import create_app
+
+GPU = "NVIDIA GeForce RTX 4090"
+
+
+def make_pool(api, **kwargs):
+    client = RunPodClient(api_key="test", base_url="http://fake/v1", transport=httpx.ASGITransport(app=api),
+                          poll_interval=0.01)
+    return WarmPool(client, {GPU: 1}, poll_interval=0.01, **kwargs)
+
+
+async def wait_idle(pool, count):
+    for _ in range(500):
+        if pool.metrics()["pods"]["idle"] >= count:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"pool never reached {count} idle pods: {pool.metrics()}")
+
+
+def test_lease_hits_warm_pod_and_pool_replenishes():
+    api = create_app(boot_seconds=0.05)
+
+    async def scenario():
+        pool = make_pool(api)
+        await pool.start()
+        await wait_idle(pool, 1)
+        pod = await pool.lease(GPU)
+        assert pod.ssh == {"host": "127.0.0.1", "port": pod.ssh["port"], "username": "root"}
+        await wait_idle(pool, 1)  # replenished in the background
+        metrics = pool.metrics()
+        await pool.stop(terminate=True)
+        await pool.client.close()
+        return metrics
+
+    metrics = asyncio.run(scenario())
+    assert metrics["hits"] == 1 and metrics["misses"] == 0 and metrics["hit_rate"] == 1.0
+    assert metrics["pods"] == {"booting": 0, "idle": 1, "leased": 1}
+    assert api.state.pods == {}
+
+
+def test_cold_lease_provisions_and_release_prefers_data_locality():
+    api = create_app(boot_seconds=0.05)
+
+    async def scenario():
+        pool = make_pool(api)
+        pool.targets = {GPU: 0}
+        first = await pool.lease(GPU, timeout=5)
+        second = await pool.lease(GPU, timeout=5)
+        await pool.release(first.pod_id)
+        await pool.release(second.pod_id, artifacts=["data/pretrain/may"])
+        again = await pool.lease(GPU, artifacts=["data/pretrain/may"])
+        metrics = pool.metrics()
+        await pool.stop(terminate=True)
+        await pool.client.close()
+        return second, again, metrics
+
+    second, again, metrics = asyncio.run(scenario())
+    assert again.pod_id == second.pod_id
+    assert metrics["misses"] == 2 and metrics["hits"] == 1 and metrics["locality_hits"] == 1
+
+
+def test_surplus_idle_pods_are_reaped_after_ttl():
+    api = create_app(boot_seconds=0.0)
+
+    async def scenario():
+        terminated = []
+        pool = make_pool(api, idle_ttl=0.05, on_terminate=lambda pod: terminated.append(pod.pod_id))
+        pool.targets = {GPU: 0}
+        pod = await pool.lease(GPU, timeout=5)
+        await pool.release(pod.pod_id)
+        await pool.start()
+        for _ in range(100):
+            if not pool.pods:
+                break
+            await asyncio.sleep(0.01)
+        await pool.stop()
+        await pool.client.close()
+        return pool.metrics(), terminated, pod
+
+    metrics, terminated, pod = asyncio.run(scenario())
+    assert metrics["reaped"] == 1
+    assert terminated == [pod.pod_id]  # so the agent can drop the pod's SSH connection
+    assert api.state.pods == {}
+
+
+def test_failed_boots_back_off_and_fail_the_lease():
+    api = create_app(boot_seconds=0.0)
+    api.state.reject_creates = True
+
+    async def scenario():
+        pool = make_pool(api, boot_backoff=0.05, max_boot_attempts=3)
+        await pool.start()  # replenishment fails too and must back off as well
+        started = time.monotonic()
+        try:
+            await pool.lease(GPU, timeout=5)
+        except RuntimeError as e:
+            error = str(e)
+        elapsed = time.monotonic() - started
+        await pool.stop()
+        await pool.client.close()
+        return error, elapsed
+
+    error, elapsed = asyncio.run(scenario())
+    assert "3 boot attempts" in error
+    # Backoff 0.05, 0.1, 0.2 ... between boots instead of thousands of create_pod calls.
+    assert elapsed >= 0.1
+    assert api.state.requests["create"] <= 6
+
+
+def test_workers_share_one_pool_through_the_store(tmp_path):
+    api = create_app(boot_seconds=0.0)
+    db = str(tmp_path / "tasks.db")
+
+    async def scenario():
+        # Two pools with their own store connections behave like two worker processes.
+        a = make_pool(api, store=TaskStore(db))
+        b = make_pool(api, store=TaskStore(db))
+        await a.start()
+        await b.start()
+        await wait_idle(a, 1)
+        await asyncio.sleep(0.1)  # several maintenance rounds on both
+        booted = len(api.state.pods)
+        pod = await b.lease(GPU, task_id="task-1", timeout=5)
+        leased = a.metrics()["pods"]["leased"], a.pods[pod.pod_id].lease_task_id
+        managed = a.is_managed(pod.pod_id)
+        await a.release(pod.pod_id, artifacts=["data/pretrain/may"])
+        again = await b.lease(GPU, artifacts=["data/pretrain/may"], timeout=5)
+        roles = (a.leader, b.leader)
+        await a.stop(terminate=True)
+        await b.stop()
+        await a.client.close()
+        await b.client.close()
+        return booted, pod, leased, managed, again, roles
+
+    booted, pod, leased, managed, again, roles = asyncio.run(scenario())
+    assert booted == 1  # one idle pod for the target of 1, not one per worker
+    assert leased == (1, "task-1") and managed
+    assert again.pod_id == pod.pod_id and "data/pretrain/may" in again.artifacts
+    assert sorted(roles) == [False, True]
+
+
+def test_restarted_pool_adopts_warm_pods_and_forgets_deleted_ones(tmp_path):
+    api = create_app(boot_seconds=0.0)
+    db = str(tmp_path / "tasks.db")
+
+    async def scenario():
+        first = make_pool(api)  # no store: its pods are lost with the process
+        await first.start()
+        await wait_idle(first, 1)
+        await first.stop()
+        orphan = next(iter(api.state.pods))
+        store = TaskStore(db)
+        store.save_warm_pod({"pod_id": "gone", "gpu_type": GPU, "state": "idle", "ssh": None, "artifacts": [],
+                             "task_id": None, "owner": None, "idle_since": 0, "created_at": 0})
+        restarted = make_pool(api, store=store)
+        await restarted.start()
+        await wait_idle(restarted, 1)
+        await asyncio.sleep(0.05)
+        pods = set(restarted.pods)
+        metrics = restarted.metrics()
+        await restarted.stop(terminate=True)
+        await restarted.client.close()
+        await first.client.close()
+        return orphan, pods, metrics
+
+    orphan, pods, metrics = asyncio.run(scenario())
+    assert pods == {orphan}
+    assert metrics["adopted"] == 1 and metrics["provisioned"] == 0
+    assert api.state.pods == {}
+
+
+def test_provision_pod_leases_for_the_task(monkeypatch):
+    api = create_app(boot_seconds=0.0)
+
+    async def scenario():
+        pool = make_pool(api)
+        monkeypatch.setattr(main, "warm_pool", pool)
+        monkeypatch.setattr(main, "jobs", JobEngine())
+        main.jobs.submit("task-7", "provision_pod", main.provision_pod_op, {"gpu_type": GPU, "timeout": 5})
+        job = await main.jobs.wait("task-7", timeout=5)
+        pod = pool.pods[job.result["pod_id"]]
+        leased_for = pod.lease_task_id
+        await main.jobs.shutdown()
+        await pool.stop(terminate=True)
+        await pool.client.close()
+        return job, leased_for
+
+    job, leased_for = asyncio.run(scenario())
+    assert job.status == "completed" and leased_for == "task-7"
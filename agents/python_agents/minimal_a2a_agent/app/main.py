@@ -1,17 +1,65 @@
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket
 from fastapi.responses import StreamingResponse, JSONResponse
-from typing import AsyncGenerator
+from typing import Any, AsyncGenerator, Dict, Mapping, Optional
 import asyncio
+import contextlib
+import json
+import os
+import time
+
+try:
+    import prometheus_client
+except ImportError:  # metrics are optional
+    prometheus_client = None
+try:
+    from opentelemetry import propagate, trace
+except ImportError:  # tracing is optional
+    trace = None
+try:
+    import msgpack
+except ImportError:  # msgpack encoding is optional
+    msgpack = None
 
 app = FastAPI(title="Minimal Python A2A Agent")
 
+# Same series as the Elixir agent (A2aAgentWebWeb.Metrics); the scrape job tells them apart.
+METRICS = prometheus_client is not None and os.environ.get("A2A_METRICS", "1") != "0"
+A2A_MESSAGE_TYPES = {"task_request", "task_chunk", "agent_event", "agent_discovery_request"}
+if METRICS:
+    REGISTRY = prometheus_client.CollectorRegistry()
+    prometheus_client.ProcessCollector(registry=REGISTRY)
+    A2A_MESSAGES = prometheus_client.Counter("a2a_messages", "Total number of A2A messages received", ["type"],
+                                             registry=REGISTRY)
+    A2A_ERRORS = prometheus_client.Counter("a2a_errors_by_type", "Total number of error responses by type", ["type"],
+                                           registry=REGISTRY)
+    A2A_LATENCY = prometheus_client.Histogram("a2a_request_latency_seconds", "A2A API request latency (seconds)",
+                                              ["type"], registry=REGISTRY)
+    A2A_SIZE = prometheus_client.Histogram("a2a_request_size_bytes", "A2A API request size (bytes)", ["type"],
+                                           buckets=(64, 256, 1024, 4096, 16384, 65536, 262144, 1048576),
+                                           registry=REGISTRY)
+TRACER = trace.get_tracer("minimal_a2a_agent") if trace is not None else None
+
+# Batch and channel messages are checked like A2aAgentWebWeb.A2AMessage (same fields, types
+# and error strings), extended with this agent's own types; the sets are built once.
+REQUIRED_FIELDS = ("type", "sender", "recipient", "payload")
+ELIXIR_TYPES = ("task_request", "result", "status_update", "agent_discovery", "negotiation")
+ALLOWED_TYPES = frozenset(ELIXIR_TYPES) | A2A_MESSAGE_TYPES
+ALLOWED_LISTING = "[" + ", ".join(f":{t}" for t in (*ELIXIR_TYPES, *sorted(A2A_MESSAGE_TYPES - set(ELIXIR_TYPES)))) + "]"
+MAX_BATCH = int(os.environ.get("A2A_MAX_BATCH", "1000"))
+
+# Wire encodings by WebSocket subprotocol: name -> (media type, binary frames, dumps, loads).
+CODECS = {"a2a.json": ("application/json", False, lambda value: json.dumps(value, separators=(",", ":")), json.loads)}
+if msgpack is not None:
+    CODECS["a2a.msgpack"] = ("application/msgpack", True, msgpack.packb, msgpack.unpackb)
+
 AGENT_CARD = {
     "id": "pyagent1",
     "name": "Python Agent",
     "version": "0.1.0",
     "description": "Minimal Python A2A agent",
     "capabilities": ["task_request", "agent_discovery"],
-    "endpoints": {"a2a": "/api/a2a", "agent_card": "/api/agent_card"},
+    "endpoints": {"a2a": "/api/a2a", "a2a_batch": "/api/a2a/batch", "a2a_ws": "/api/a2a/ws",
+                  "agent_card": "/api/agent_card"},
     "authentication": None
 }
 
@@ -25,40 +73,214 @@ def register_agent_card(card: dict):
     """Accept and echo agent card registration (stub for demo)."""
     return {"status": "ok", "card": card}
 
-async def stream_task_progress() -> AsyncGenerator[bytes, None]:
-    """Simulate streaming task progress events."""
+def ndjson(message: Dict[str, Any]) -> bytes:
+    """Encode one message as a line of newline-delimited JSON."""
+    return (json.dumps(message, separators=(",", ":")) + "\n").encode()
+
+async def task_events(task_id: str) -> AsyncGenerator[Dict[str, Any], None]:
+    """Simulate task progress events."""
     for i in range(5):
-        yield (f'{ {"type": "task_progress", "progress": i*20} }\n').encode()
+        yield {"type": "task_progress", "task_id": task_id, "payload": {"progress": i * 20}}
         await asyncio.sleep(0.5)
-    yield b'{"type": "result", "payload": {"result": "done"}}\n'
+    yield {"type": "result", "task_id": task_id, "payload": {"result": "done"}}
+
+async def chunk_events(task_id: Optional[str] = None) -> AsyncGenerator[Dict[str, Any], None]:
+    """Simulate a chunked result; task_id tags the frames when several share a channel."""
+    tag = {"task_id": task_id} if task_id is not None else {}
+    for i in range(3):
+        yield {"type": "task_chunk", **tag, "chunk": f"partial_{i}"}
+        await asyncio.sleep(0.3)
+    yield {"type": "result", **tag, "payload": {"result": "final from chunk"}}
+
+async def stream_ndjson(events: AsyncGenerator[Dict[str, Any], None]) -> AsyncGenerator[bytes, None]:
+    async for event in events:
+        yield ndjson(event)
+
+def validate_message(message: Any) -> Optional[str]:
+    """Error string for a message A2aAgentWebWeb.A2AMessage would reject, else None."""
+    if not isinstance(message, dict):
+        return "Message must be an object"
+    missing = [field for field in REQUIRED_FIELDS if field not in message]
+    if missing:
+        return f"Missing required fields: {', '.join(missing)}"
+    if not isinstance(message["type"], str) or message["type"] not in ALLOWED_TYPES:
+        return f"Invalid type: {json.dumps(message['type'])}. Allowed types: {ALLOWED_LISTING}"
+    if message["payload"] is not None and not isinstance(message["payload"], dict):
+        return "Invalid payload: must be an object"
+    return None
+
+def error_reply(message: Any, error: str) -> Dict[str, Any]:
+    reply = {"type": "error", "status": "error", "error": error}
+    if isinstance(message, dict):
+        payload = message.get("payload")
+        if isinstance(payload, dict) and "task_id" in payload:
+            reply["task_id"] = payload["task_id"]
+        if "ref" in message:
+            reply["ref"] = message["ref"]
+    return reply
+
+def codec_for_media_type(content_type: Optional[str]) -> Optional[str]:
+    media_type = (content_type or "application/json").split(";")[0].strip().lower()
+    if media_type in ("application/msgpack", "application/x-msgpack") and "a2a.msgpack" in CODECS:
+        return "a2a.msgpack"
+    return "a2a.json" if media_type in ("application/json", "*/*", "") else None
+
+def message_label(body: Any) -> str:
+    msg_type = body.get("type") if isinstance(body, dict) else None
+    return msg_type if isinstance(msg_type, str) and msg_type in A2A_MESSAGE_TYPES else "other"
+
+def trace_span(label: str, headers: Mapping[str, str]):
+    # Continue the caller's W3C trace (traceparent header) when OpenTelemetry is installed.
+    if TRACER is None:
+        return contextlib.nullcontext()
+    return TRACER.start_as_current_span(f"a2a {label}", context=propagate.extract(headers))
+
+def record_message(label: str, size: int, started: float, error: bool):
+    if METRICS:
+        A2A_MESSAGES.labels(label).inc()
+        A2A_SIZE.labels(label).observe(size)
+        A2A_LATENCY.labels(label).observe(time.perf_counter() - started)
+        if error:
+            A2A_ERRORS.labels(label).inc()
+
+@app.get("/metrics")
+def metrics():
+    """Prometheus exposition of the A2A message metrics."""
+    if not METRICS:
+        return Response(status_code=404)
+    return Response(prometheus_client.generate_latest(REGISTRY), media_type=prometheus_client.CONTENT_TYPE_LATEST)
 
 @app.post("/api/a2a")
 async def a2a_endpoint(request: Request):
     """Accept A2A messages and stream responses if requested. Handles task_request, task_chunk, agent_event, and errors."""
+    started = time.perf_counter()
     body = await request.json()
+    label = message_label(body)
+    with trace_span(label, request.headers):
+        response = await handle_message(body)
+    record_message(label, int(request.headers.get("content-length") or 0), started, response.status_code >= 400)
+    return response
+
+async def handle_message(body: Any) -> Response:
     # Strict error check FIRST
-    if "type" not in body or not isinstance(body.get("type"), str):
+    if not isinstance(body, dict) or not isinstance(body.get("type"), str):
         print(f"[error] Missing or invalid 'type' field in message: {body}")
         return JSONResponse({"status": "error", "error": "Missing or invalid 'type' field"}, status_code=400)
     msg_type = body["type"]
-    payload = body.get("payload", {})
+    payload = body.get("payload") or {}
 
     # Streaming for task_request
     if msg_type == "task_request" and payload.get("stream", False):
-        return StreamingResponse(stream_task_progress(), media_type="application/json")
+        return StreamingResponse(stream_ndjson(task_events(payload.get("task_id"))), media_type="application/x-ndjson")
     # Always stream for task_chunk (even if no stream param)
     if msg_type == "task_chunk":
-        async def chunk_stream():
-            for i in range(3):
-                chunk = {"type": "task_chunk", "chunk": f"partial_{i}"}
-                yield (f"{chunk}\n").encode()
-                await asyncio.sleep(0.3)
-            result = {"type": "result", "payload": {"result": "final from chunk"}}
-            yield (f"{result}\n").encode()
-        return StreamingResponse(chunk_stream(), media_type="application/json")
+        return StreamingResponse(stream_ndjson(chunk_events()), media_type="application/x-ndjson")
+    return JSONResponse(reply_for(body))
+
+def reply_for(body: Dict[str, Any]) -> Dict[str, Any]:
+    """The immediate (non-streamed) reply to a message with a valid type."""
+    msg_type = body["type"]
+    payload = body.get("payload") or {}
     if msg_type == "agent_event":
         # Log and acknowledge
         print(f"[agent_event] {payload}")
-        return JSONResponse({"status": "ok", "type": "agent_event", "event": payload})
+        return {"status": "ok", "type": "agent_event", "event": payload}
     # Default: echo
-    return JSONResponse({"status": "ok", "type": msg_type, "echo": body})
+    return {"status": "ok", "type": msg_type, "echo": body}
+
+def batch_reply(message: Any, headers: Mapping[str, str], size: int) -> Dict[str, Any]:
+    started = time.perf_counter()
+    label = message_label(message)
+    error = validate_message(message)
+    if error is None and message["type"] == "task_chunk":
+        error = "task_chunk replies are streamed; send it on /api/a2a/ws"
+    if error is not None:
+        reply = error_reply(message, error)
+    else:
+        with trace_span(label, headers):
+            reply = reply_for(message)
+        if "ref" in message:
+            reply["ref"] = message["ref"]
+    record_message(label, size, started, reply["status"] == "error")
+    return reply
+
+@app.post("/api/a2a/batch")
+async def a2a_batch(request: Request):
+    """A JSON (or msgpack) array of messages in, their replies in order out. Nothing is streamed."""
+    codec = codec_for_media_type(request.headers.get("content-type"))
+    if codec is None:
+        raise HTTPException(status_code=415, detail="Send application/json or application/msgpack")
+    body = await request.body()
+    try:
+        messages = CODECS[codec][3](body)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Undecodable batch: {e}")
+    if not isinstance(messages, list):
+        raise HTTPException(status_code=400, detail="A batch must be an array of messages")
+    if len(messages) > MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_BATCH} messages per batch")
+    size = len(body) // max(len(messages), 1)
+    replies = [batch_reply(message, request.headers, size) for message in messages]
+    media_type, _, dumps, _ = CODECS[codec_for_media_type(request.headers.get("accept")) or "a2a.json"]
+    return Response(dumps(replies), media_type=media_type)
+
+def channel_events(message: Dict[str, Any]) -> Optional[AsyncGenerator[Dict[str, Any], None]]:
+    """Events the channel pushes for a valid message; None when its reply is all there is."""
+    payload = message["payload"] or {}
+    if message["type"] == "task_chunk":
+        return chunk_events(payload.get("task_id"))
+    if message["type"] == "task_request" and payload.get("stream"):
+        return task_events(payload.get("task_id"))
+    return None
+
+@app.websocket("/api/a2a/ws")
+async def a2a_channel(websocket: WebSocket):
+    """One connection, many tasks: every message gets its reply, and task_request (payload.stream)
+    and task_chunk push their events as frames tagged with the task_id. The subprotocol picks
+    the encoding: "a2a.msgpack" (binary frames) or "a2a.json"."""
+    offered = [p.strip() for p in websocket.headers.get("sec-websocket-protocol", "").split(",") if p.strip()]
+    codec = next((name for name in offered if name in CODECS), None)
+    await websocket.accept(subprotocol=codec)
+    _, binary, dumps, loads = CODECS[codec or "a2a.json"]
+    outbox: asyncio.Queue = asyncio.Queue(256)
+    pushes = set()
+
+    async def writer():
+        while True:
+            frame = dumps(await outbox.get())
+            await (websocket.send_bytes(frame) if binary else websocket.send_text(frame))
+
+    async def push(events):
+        async for event in events:
+            await outbox.put(event)
+
+    sender = asyncio.get_running_loop().create_task(writer())
+    try:
+        while True:
+            frame = await websocket.receive()
+            if frame["type"] == "websocket.disconnect":
+                break
+            data = frame.get("bytes") if frame.get("bytes") is not None else frame.get("text")
+            try:
+                decoded = loads(data)
+            except Exception as e:
+                await outbox.put(error_reply(None, f"Undecodable frame: {e}"))
+                continue
+            for message in decoded if isinstance(decoded, list) else [decoded]:
+                started = time.perf_counter()
+                events = channel_events(message) if validate_message(message) is None else None
+                if events is None:
+                    await outbox.put(batch_reply(message, websocket.headers, len(data)))
+                    continue
+                reply = {"status": "accepted", "type": message["type"], "task_id": (message["payload"] or {}).get("task_id")}
+                if "ref" in message:
+                    reply["ref"] = message["ref"]
+                await outbox.put(reply)
+                record_message(message["type"], len(data), started, False)
+                task = asyncio.get_running_loop().create_task(push(events))
+                pushes.add(task)
+                task.add_done_callback(pushes.discard)
+    finally:
+        for task in (sender, *pushes):
+            task.cancel()
+        await asyncio.gather(sender, *pushes, return_exceptions=True)
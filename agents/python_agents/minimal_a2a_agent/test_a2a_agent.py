@@ -0,0 +1,102 @@
+import json
+
+import msgpack
+from fastapi.testclient import TestClient
+
+from app import main
+
+client = TestClient(main.app)
+
+
+def _message(type_, **payload):
+    return {"type": type_, "sender": "xcs", "recipient": "pyagent1", "payload": payload}
+
+
+def _count(name, label):
+    return main.REGISTRY.get_sample_value(name, {"type": label}) or 0.0
+
+
+def test_ndjson_streams_for_streaming_task_request_and_task_chunk():
+    with client.stream("POST", "/api/a2a", json=_message("task_request", task_id="t1", stream=True)) as response:
+        assert response.headers["content-type"] == "application/x-ndjson"
+        events = [json.loads(line) for line in response.iter_lines() if line]
+    assert [e["payload"]["progress"] for e in events[:-1]] == [0, 20, 40, 60, 80]
+    assert events[-1] == {"type": "result", "task_id": "t1", "payload": {"result": "done"}}
+
+    with client.stream("POST", "/api/a2a", json=_message("task_chunk")) as response:
+        chunks = [json.loads(line) for line in response.iter_lines() if line]
+    assert [c.get("chunk") for c in chunks] == ["partial_0", "partial_1", "partial_2", None]
+    assert chunks[-1]["payload"] == {"result": "final from chunk"}
+
+    echo = client.post("/api/a2a", json=_message("task_request", task_id="t2"))
+    assert echo.json()["echo"]["payload"] == {"task_id": "t2"}
+    assert client.post("/api/a2a", json=[_message("task_request")]).status_code == 400
+    assert client.post("/api/a2a", json={"type": 7}).status_code == 400
+
+
+def test_batch_replies_in_order_over_json_and_msgpack(monkeypatch):
+    batch = [
+        {**_message("task_request", task_id="b1"), "ref": 1},
+        {"type": "task_request", "payload": {}, "ref": 2},
+        _message("task_chunk", task_id="b3"),
+        {**_message("agent_event", kind="ping"), "payload": None},
+        "not a message",
+    ]
+    replies = client.post("/api/a2a/batch", json=batch).json()
+    assert replies[0]["status"] == "ok" and replies[0]["ref"] == 1
+    assert replies[1] == {"type": "error", "status": "error", "error": "Missing required fields: sender, recipient",
+                          "ref": 2}
+    assert replies[2]["status"] == "error" and replies[2]["task_id"] == "b3"
+    assert replies[3] == {"status": "ok", "type": "agent_event", "event": {}}
+    assert replies[4]["error"] == "Message must be an object"
+
+    packed = client.post("/api/a2a/batch", content=msgpack.packb(batch[:1]),
+                         headers={"content-type": "application/msgpack", "accept": "application/msgpack"})
+    assert packed.headers["content-type"] == "application/msgpack"
+    assert msgpack.unpackb(packed.content)[0]["echo"]["payload"] == {"task_id": "b1"}
+
+    assert client.post("/api/a2a/batch", json=batch[0]).status_code == 400
+    assert client.post("/api/a2a/batch", content=b"[", headers={"content-type": "application/json"}).status_code == 400
+    assert client.post("/api/a2a/batch", content=b"[]", headers={"content-type": "text/plain"}).status_code == 415
+    monkeypatch.setattr(main, "MAX_BATCH", 2)
+    assert client.post("/api/a2a/batch", json=batch).status_code == 413
+
+
+def test_channel_multiplexes_streams_and_survives_bad_messages():
+    with client.websocket_connect("/api/a2a/ws", subprotocols=["a2a.msgpack", "a2a.json"]) as ws:
+        assert ws.accepted_subprotocol == "a2a.msgpack"
+        ws.send_bytes(msgpack.packb([
+            {**_message("task_request", task_id="w1", stream=True), "ref": "a"},
+            _message("task_chunk", task_id="w2"),
+            {**_message("negotiate"), "ref": "bad"},
+            {**_message("task_request"), "payload": None},
+        ]))
+        frames = []
+        while len([f for f in frames if f.get("type") == "result"]) < 2:
+            frames.append(msgpack.unpackb(ws.receive_bytes()))
+    assert frames[0] == {"status": "accepted", "type": "task_request", "task_id": "w1", "ref": "a"}
+    assert frames[1]["status"] == "accepted" and frames[1]["task_id"] == "w2"
+    assert frames[2]["ref"] == "bad" and frames[2]["error"].startswith('Invalid type: "negotiate"')
+    assert frames[3]["status"] == "ok" and frames[3]["echo"]["payload"] is None
+    progress = [f["payload"]["progress"] for f in frames if f["type"] == "task_progress"]
+    assert progress == [0, 20, 40, 60, 80]
+    assert [f["chunk"] for f in frames if "chunk" in f] == ["partial_0", "partial_1", "partial_2"]
+    assert {f["task_id"] for f in frames if f["type"] == "result"} == {"w1", "w2"}
+
+    with client.websocket_connect("/api/a2a/ws") as ws:
+        assert ws.accepted_subprotocol is None
+        ws.send_text("{")
+        assert json.loads(ws.receive_text())["error"].startswith("Undecodable frame")
+        ws.send_text(json.dumps(_message("agent_event", kind="ping")))
+        assert json.loads(ws.receive_text())["event"] == {"kind": "ping"}
+
+
+def test_metrics_count_messages_and_errors_by_type():
+    before = _count("a2a_messages_total", "agent_event"), _count("a2a_errors_by_type_total", "other")
+    client.post("/api/a2a", json=_message("agent_event", kind="ping"))
+    client.post("/api/a2a/batch", json=[_message("agent_event"), {"type": "bogus"}])
+    response = client.get("/metrics")
+    assert response.status_code == 200 and response.headers["content-type"].startswith("text/plain")
+    assert "a2a_request_latency_seconds_bucket" in response.text
+    assert _count("a2a_messages_total", "agent_event") - before[0] == 2
+    assert _count("a2a_errors_by_type_total", "other") - before[1] == 1